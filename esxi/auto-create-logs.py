@@ -2,19 +2,23 @@
 #
 # Written by Manuel Moser (moserm)
 
-import threading, subprocess
-import select, os, sys, datetime, urllib.request
+import threading
+import os, re, sys, time, datetime, urllib.request
 from argparse import ArgumentParser
 
+import esxilogfunctions
+
 
 # Parsing command-line arguments
 parser = ArgumentParser()
 
 argGrpMain = parser.add_argument_group('Required parameters')
-argGrpMain.add_argument('-m', '--logmessage', metavar='LOGMESSAGE', dest='logmsg', nargs='?', required=True,
-	help='log message to listen for')
-argGrpMain.add_argument('-f', '--logfile', metavar='/path/to/logfile/', dest='logFile', nargs='?', required=True,
-	help='log file to listen on')
+argGrpMain.add_argument('-m', '--logmessage', metavar=('LOGMESSAGE', 'HITS SECONDS'), dest='logmsg', nargs='+', action='append', default=list(),
+	help='log message to listen for, optionally followed by the number of hits within a number of seconds needed to trigger, e.g. -m "H:0x8" 5 60. Can be specified multiple times, at least one -m or -e is required')
+argGrpMain.add_argument('-e', '--regex', metavar=('REGEX', 'HITS SECONDS'), dest='regex', nargs='+', action='append', default=list(),
+	help='regular expression to listen for, optionally followed by the number of hits within a number of seconds needed to trigger. Can be specified multiple times')
+argGrpMain.add_argument('-f', '--logfile', metavar='/path/to/logfile/', dest='logFiles', nargs='+', required=True,
+	help='log files to listen on, the log messages and regular expressions are looked for in all of them')
 argGrpMain.add_argument('-w', '--workingdir', metavar='WORKINGDIR', dest='workingDir', nargs='?', required=True,
 	help='working directory to save the vm-support bundle in')
 
@@ -107,33 +111,56 @@ def write_script_log(message):
 	return True
 
 
-def listen_on(filename):
-	tsk = subprocess.Popen(['tail', '-f', '-n', '0', filename], stdout=subprocess.PIPE, bufsize=1)
-	
-	pobj = select.poll()
-	pobj.register(tsk.stdout, select.POLLIN)
-		
-	i = 0
-	while True:
-		evt = pobj.poll(-1)
-		if not evt:
-			print('timeout...')
-		
-		elif select.POLLIN == evt[0][1]:
-			lineUnchomped = tsk.stdout.readline()
-			line = lineUnchomped.decode('utf-8').rstrip('\n')
-			i += 1
-			if line.find(args.logmsg) != -1:
+def get_log_matcher():
+	'''Return a LogMatcher with a LogPattern for each log message (-m) and regular expression (-e) with its number of hits and seconds, exits on invalid ones'''
+
+	logPatterns = list()
+	for values, isRegex in [(values, False) for values in args.logmsg] + [(values, True) for values in args.regex]:
+		if len(values) not in (1, 3):
+			sys.exit('Specify the log message or regular expression either alone or followed by the number of hits and seconds: ' + ' '.join(values))
+
+		try:
+			hits = int(values[1]) if len(values) == 3 else 1
+			seconds = float(values[2]) if len(values) == 3 else 0
+		except ValueError:
+			sys.exit('Invalid number of hits or seconds: ' + ' '.join(values))
+		if hits < 1 or seconds < 0:
+			sys.exit('Invalid number of hits or seconds: ' + ' '.join(values))
+
+		try:
+			logPatterns.append(esxilogfunctions.LogPattern(pattern=values[0], isRegex=isRegex, hits=hits, seconds=seconds))
+		except re.error as e:
+			sys.exit('Invalid regular expression {}: {}'.format(values[0], e))
+
+	try:
+		return esxilogfunctions.LogMatcher(patterns=logPatterns)
+	except re.error as e:
+		sys.exit('The regular expressions can\'t be combined: {}'.format(e))
+
+
+def listen_on(filenames, matcher):
+	'''Follow the log files in-process and trigger the collection once any of the log messages or regular expressions reached its number of hits.
+	The appended lines are read in large chunks and searched for all of them at once with a single regular expression before decoding them, and log rotations are followed'''
+
+	followers = [esxilogfunctions.LogFollower(logFile=filename) for filename in filenames]
+
+	for follower, chunk in esxilogfunctions.iter_log_chunks(followers=followers):
+		timestamp = time.time()
+		for logPattern, line in matcher.iter_matches(chunk=chunk):
+			if logPattern.add_hit(timestamp):
+				write_script_log('Found "{pattern}" {hits} time(s) in {logfile}, last time in line: {line}'.format(pattern=logPattern.pattern, hits=len(logPattern.hitTimes), logfile=follower.logFile, line=line))
 				trigger_collection(line)
-		else:
-			break
 
 	return True
 
 
 def main():
-	if not os.path.isfile(args.logFile):
-		sys.exit('Specified log file does not exist: ' + args.logFile)
+	if not args.logmsg and not args.regex:
+		sys.exit('No log message (-m) or regular expression (-e) was specified')
+
+	for logFile in args.logFiles:
+		if not os.path.isfile(logFile):
+			sys.exit('Specified log file does not exist: ' + logFile)
 
 	if not os.path.isdir(args.workingDir):
 		sys.exit('Specified directory does not exist: ' + args.workingDir)
@@ -141,7 +168,7 @@ def main():
 	if args.rhosts and not args.password:
 		sys.exit('No root password was specified for the remote hosts')
 
-	listen_on(args.logFile)
+	listen_on(args.logFiles, get_log_matcher())
 	return True
 
 
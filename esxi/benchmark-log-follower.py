@@ -0,0 +1,162 @@
+#!/bin/python3
+#
+# Benchmark for following a busy log file as done by auto-create-logs.py, replaying a synthetic vmkernel.log at a high rate with log rotations.
+# Compares the in-process LogFollower of esxilogfunctions.py with the "tail -f" subprocess auto-create-logs.py used before.
+#
+# Written by Manuel Moser (moserm)
+
+import os, time, shutil, select, resource, tempfile, subprocess, multiprocessing
+from argparse import ArgumentParser
+
+import esxilogfunctions
+
+
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-r', '--rate', metavar='LINES', dest='rate', type=int, default=100000,
+	help='number of lines written to the synthetic log per second. Default value is 100000')
+parser.add_argument('-s', '--seconds', metavar='SECONDS', dest='seconds', type=float, default=5,
+	help='number of seconds to write the synthetic log for. Default value is 5')
+parser.add_argument('-m', '--match-every', metavar='N', dest='matchEvery', type=int, default=10000,
+	help='every Nth line contains the log message looked for. Default value is 10000')
+parser.add_argument('--rotate', metavar='SECONDS', dest='rotate', type=float, default=2,
+	help='rotate the synthetic log every SECONDS, 0 to not rotate it. Default value is 2')
+
+args = parser.parse_args()
+
+
+# General variables
+logMessage = 'mark: BENCHMARK'
+logLine = '2024-01-01T00:00:00.000Z cpu{cpu}:{world})LSOM: LSOMEventNotify:{n}: Throttled the log rate of the disk group, {msg}\n'
+
+
+#
+## Functions
+#
+def write_log(logFile: str, rate: int, seconds: float, matchEvery: int, rotate: float):
+	'''Append lines to the synthetic log at the specified rate in batches every 10ms, rotating it by renaming and creating a new file'''
+
+	batchLines = max(1, rate // 100)
+	lineIdx = 0
+	timeStart = time.time()
+	timeRotated = timeStart
+	f = open(logFile, 'a')
+
+	while time.time() - timeStart < seconds:
+		lines = list()
+		for i in range(batchLines):
+			lineIdx += 1
+			lines.append(logLine.format(cpu=lineIdx % 64, world=lineIdx % 100000, n=lineIdx, msg=logMessage if lineIdx % matchEvery == 0 else 'nothing to see here'))
+		f.write(''.join(lines))
+		f.flush()
+
+		if rotate and time.time() - timeRotated >= rotate:
+			f.close()
+			os.replace(logFile, logFile + '.1')
+			f = open(logFile, 'a')
+			timeRotated = time.time()
+
+		time.sleep(max(0, timeStart + lineIdx / rate - time.time()))
+
+	f.close()
+	return True
+
+
+def follow_tail(logFile: str, writer) -> int:
+	'''Follow the log with "tail -f" and decode and search every line, as auto-create-logs.py used to do
+	Return:
+		number of lines with the log message found'''
+
+	tsk = subprocess.Popen(['tail', '-f', '-n', '0', logFile], stdout=subprocess.PIPE)
+	pobj = select.poll()
+	pobj.register(tsk.stdout, select.POLLIN)
+
+	matches = 0
+	while True:
+		# Keep reading until the writer is done and tail has nothing left for a second
+		if not pobj.poll(1000) and not writer.is_alive():
+			break
+
+		line = tsk.stdout.readline().decode('utf-8').rstrip('\n')
+		if line.find(logMessage) != -1:
+			matches += 1
+
+	tsk.kill()
+	tsk.wait()
+	return matches
+
+
+def follow_native(logFile: str, writer) -> int:
+	'''Follow the log with the LogFollower of esxilogfunctions.py
+	Return:
+		number of lines with the log message found'''
+
+	follower = esxilogfunctions.LogFollower(logFile=logFile)
+	pattern = logMessage.encode('utf-8')
+
+	matches = 0
+	timeIdle = None
+	while True:
+		chunk = follower.read()
+		if chunk:
+			matches += sum(1 for line in esxilogfunctions.find_lines(chunk=chunk, pattern=pattern))
+			timeIdle = None
+			continue
+
+		if not writer.is_alive():
+			# Also wait for the remaining lines (and a rotation) a second after the writer is done
+			timeIdle = timeIdle or time.time()
+			if time.time() - timeIdle > 1:
+				break
+		time.sleep(follower.pollInterval)
+
+	follower.close()
+	return matches
+
+
+def run_follower(name: str, function, logDir: str) -> bool:
+	'''Replay the synthetic log while following it and print the CPU time used (including the one of child processes) and the lines with the log message found'''
+
+	logFile = os.path.join(logDir, name.split()[0] + '.log')
+	open(logFile, 'w').close()
+
+	writer = multiprocessing.Process(target=write_log, kwargs={'logFile': logFile, 'rate': args.rate, 'seconds': args.seconds, 'matchEvery': args.matchEvery, 'rotate': args.rotate})
+
+	childrenStart = resource.getrusage(resource.RUSAGE_CHILDREN)
+	cpuStart = time.process_time()
+	writer.start()
+	matches = function(logFile, writer)
+	cpu = time.process_time() - cpuStart
+	writer.join()
+	childrenEnd = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+	# The CPU time of the writer is part of the one of the child processes, it's about the same for both runs
+	children = childrenEnd.ru_utime + childrenEnd.ru_stime - childrenStart.ru_utime - childrenStart.ru_stime
+	expected = int(args.rate * args.seconds) // args.matchEvery
+	print('{:<35} {:>7.2f}s CPU, {:>7.2f}s CPU incl. child processes (writer), {:>6} of ~{} log messages found'.format(name, cpu, cpu + children, matches, expected))
+
+	return True
+
+
+def main():
+	logDir = tempfile.mkdtemp(prefix='benchmark-log-follower-')
+	print('Writing {} lines/s for {}s, {}\n'.format(args.rate, args.seconds, 'rotating every {}s'.format(args.rotate) if args.rotate else 'without rotating'))
+
+	try:
+		if shutil.which('tail'):
+			run_follower('tail -f with readline() per line', follow_tail, logDir)
+		else:
+			print('tail not found, skipping the run with tail -f')
+		run_follower('LogFollower', follow_native, logDir)
+	finally:
+		shutil.rmtree(logDir, ignore_errors=True)
+
+	return True
+
+
+#
+## Main
+#
+if __name__ == '__main__':
+	main()
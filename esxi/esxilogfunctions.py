@@ -0,0 +1,251 @@
+#!/bin/python3
+#
+# Written by Manuel Moser (moserm)
+
+import os, re, time
+from collections import deque
+
+
+#
+## General variables
+#
+logChunkSize = 1024 * 1024		# Number of bytes read at once from the log file
+logPollInterval = 0.25			# Number of seconds to wait for new lines when the end of the log file is reached
+# Regular expressions with (inline) flags, backreferences, named groups or group conditions can't be combined into one, e.g. "(?i)" is only valid at the start and "\1" or "(?(1)...)" refer to another group once combined.
+# Escaped backslashes may be taken for one of these as well, which is harmless: such patterns are just scanned for separately
+regexNotCombinable = re.compile(rb'\(\?[aiLmsux-]|\(\?P[<=]|\(\?\(|\\[1-9g]')
+
+
+#
+## Classes
+#
+class LogFollower:
+	'''Follows a log file like "tail -F -n 0" in-process: reads the lines appended to it in large chunks and continues with the new file after a log rotation.
+	A rotation (the log file replaced by a new one) is detected by the inode, a truncation by the size getting smaller than what was read already.
+	In both cases the new content is read from the start, after the remaining lines of the old file.
+	logFile: path to the log file
+	rotations: number of rotations and truncations detected'''
+
+	def __init__(self, logFile: str, chunkSize: int = logChunkSize, pollInterval: float = logPollInterval, fromStart: bool = False):
+		'''Arguments:
+			logFile: path to the log file
+			chunkSize: number of bytes read at once
+			pollInterval: number of seconds to wait for new lines when the end of the log file is reached
+			fromStart: read the lines already in the log file as well, by default only the ones appended from now on'''
+
+		self.logFile = logFile
+		self.chunkSize = chunkSize
+		self.pollInterval = pollInterval
+		self.rotations = 0
+		self.f = None
+		self.inode = None
+		self.position = 0
+		self.remainder = b''
+		self.open(fromStart=fromStart)
+
+	def open(self, fromStart: bool) -> bool:
+		'''(Re-)open the log file, at its end or at the start'''
+
+		try:
+			f = open(self.logFile, 'rb')
+		except OSError:
+			return False
+
+		self.close()
+		self.f = f
+		stat = os.fstat(f.fileno())
+		self.inode = (stat.st_dev, stat.st_ino)
+		self.position = 0 if fromStart else stat.st_size
+		f.seek(self.position)
+		return True
+
+	def close(self):
+		if self.f is not None:
+			self.f.close()
+			self.f = None
+
+	def check_rotation(self) -> bool:
+		'''Check whether the log file was rotated or truncated and if so, continue at the start of the new content.
+		Only called at the end of the file that's read, so the lines still written to the old file before the rotation are not lost.
+		Return:
+			True if the log file was rotated or truncated'''
+
+		try:
+			stat = os.stat(self.logFile)
+		except OSError:
+			# While the log file is rotated it may not exist for a moment
+			return False
+
+		if self.f is None or (stat.st_dev, stat.st_ino) != self.inode:
+			if not self.open(fromStart=True):
+				return False
+		elif stat.st_size < self.position:
+			self.f.seek(0)
+			self.position = 0
+		else:
+			return False
+
+		self.rotations += 1
+		return True
+
+	def read(self) -> bytes:
+		'''Return the complete lines appended since the last call (about chunkSize bytes at most), b'' if there are none.
+		An incomplete line at the end is kept until the rest of it is written, unless it's longer than chunkSize or the log file was rotated in the meantime.'''
+
+		data = self.f.read(self.chunkSize) if self.f is not None else b''
+		if not data:
+			remainder = self.remainder
+			if not self.check_rotation():
+				return b''
+
+			self.remainder = b''
+			if remainder:
+				return remainder + b'\n'
+
+			data = self.f.read(self.chunkSize)
+			if not data:
+				return b''
+
+		self.position += len(data)
+		end = data.rfind(b'\n')
+		if end == -1:
+			self.remainder += data
+			if len(self.remainder) < self.chunkSize:
+				return b''
+			data, self.remainder = self.remainder, b''
+			return data + b'\n'
+
+		chunk = self.remainder + data[:end + 1] if self.remainder else data[:end + 1]
+		self.remainder = data[end + 1:]
+		return chunk
+
+
+class LogPattern:
+	'''Log message or regular expression to look for, with the number of hits needed to trigger
+	pattern: log message or regular expression as specified
+	regex: compiled regular expression for the log message or regular expression, on bytes
+	hits: number of hits needed to trigger
+	seconds: time window the hits need to be within, 0 for no time window
+	hitTimes: times of the last hits, the ones outside of the time window are dropped'''
+
+	def __init__(self, pattern: str, isRegex: bool = False, hits: int = 1, seconds: float = 0):
+		'''Raise:
+			re.error if the regular expression is invalid'''
+
+		self.pattern = pattern
+		self.regex = re.compile(pattern.encode('utf-8') if isRegex else re.escape(pattern.encode('utf-8')), re.MULTILINE)
+		self.hits = hits
+		self.seconds = seconds
+		self.hitTimes = deque()
+
+	def add_hit(self, timestamp: float) -> bool:
+		'''Record a hit and return whether there were enough hits within the time window to trigger'''
+
+		self.hitTimes.append(timestamp)
+		if self.seconds:
+			while timestamp - self.hitTimes[0] > self.seconds:
+				self.hitTimes.popleft()
+
+		return len(self.hitTimes) >= self.hits
+
+
+class LogMatcher:
+	'''Combined matcher for several LogPattern. The chunks of lines are scanned with a single compiled regular expression made of all of them,
+	only the (few) matching lines are then checked against each pattern to tell which ones they contain.
+	Regular expressions that can't be combined (see regexNotCombinable) scan the chunks on their own
+	patterns: list with the LogPattern
+	scanRegexes: list with the compiled regular expressions the chunks are scanned with'''
+
+	def __init__(self, patterns: list):
+		'''Raise:
+			re.error if the combined regular expression is invalid'''
+
+		self.patterns = patterns
+		self.scanRegexes = [pattern.regex for pattern in patterns if regexNotCombinable.search(pattern.regex.pattern)]
+
+		combinable = [pattern.regex.pattern for pattern in patterns if not regexNotCombinable.search(pattern.regex.pattern)]
+		if combinable:
+			self.scanRegexes.insert(0, re.compile(b'|'.join(b'(?:' + regex + b')' for regex in combinable), re.MULTILINE))
+
+	def iter_matches(self, chunk: bytes):
+		'''Generator that yields the lines of a chunk matching any of the patterns
+		Arguments:
+			chunk: bytes with complete lines
+		Yield:
+			(LogPattern, <decoded line without the newline>) for every pattern a line matches'''
+
+		if len(self.scanRegexes) == 1:
+			lineSpans = iter_line_spans(chunk=chunk, pattern=self.scanRegexes[0])
+		else:
+			lineSpans = sorted(set(lineSpan for regex in self.scanRegexes for lineSpan in iter_line_spans(chunk=chunk, pattern=regex)))
+
+		for start, end in lineSpans:
+			line = chunk[start:end]
+			decodedLine = None
+			for pattern in self.patterns:
+				if pattern.regex.search(line):
+					decodedLine = decodedLine or line.decode('utf-8', 'replace')
+					yield pattern, decodedLine
+
+
+#
+## Functions
+#
+def iter_line_spans(chunk: bytes, pattern):
+	'''Generator that yields the start and end of the lines of a chunk that contain a pattern. The chunk is searched at the bytes level
+	Arguments:
+		chunk: bytes with complete lines
+		pattern: bytes to look for or a compiled regular expression on bytes
+	Yield:
+		(<start>, <end>) of the line, without the newline'''
+
+	isRegex = not isinstance(pattern, bytes)
+	position = 0
+	while True:
+		if isRegex:
+			match = pattern.search(chunk, position)
+			found = match.start() if match else -1
+		else:
+			found = chunk.find(pattern, position)
+		if found == -1:
+			return
+
+		start = chunk.rfind(b'\n', 0, found) + 1
+		end = chunk.find(b'\n', found)
+		if end == -1:
+			end = len(chunk)
+
+		yield start, end
+		position = end + 1
+
+
+def find_lines(chunk: bytes, pattern):
+	'''Generator that yields the lines of a chunk that contain a pattern. The chunk is searched at the bytes level and only the matching lines are decoded
+	Arguments:
+		chunk: bytes with complete lines
+		pattern: bytes to look for or a compiled regular expression on bytes
+	Yield:
+		decoded line without the newline'''
+
+	for start, end in iter_line_spans(chunk=chunk, pattern=pattern):
+		yield chunk[start:end].decode('utf-8', 'replace')
+
+
+def iter_log_chunks(followers: list, pollInterval: float = logPollInterval):
+	'''Generator that yields the chunks with complete lines appended to any of several log files, indefinitely. It only sleeps when none of them has new lines
+	Arguments:
+		followers: list with a LogFollower for each log file
+		pollInterval: number of seconds to wait for new lines
+	Yield:
+		(LogFollower, <bytes with one or more complete lines>)'''
+
+	while True:
+		idle = True
+		for follower in followers:
+			chunk = follower.read()
+			if chunk:
+				idle = False
+				yield follower, chunk
+
+		if idle:
+			time.sleep(pollInterval)
@@ -0,0 +1,134 @@
+#!/bin/python3
+#
+# Benchmark for the memory used by the CMMDS model of vsancmmdsfunctions, compared to the nested dictionaries vsan-objects-overview.py used to keep, using a synthetic CMMDS dump
+#
+# Written by Manuel Moser (moserm)
+
+import os, re, gc, shutil, tempfile, time, tracemalloc
+from argparse import ArgumentParser
+
+import vsancmmdsfunctions
+import vsansimulation
+
+
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-o', '--objects', metavar='N', dest='objects', type=int, default=100000,
+	help='number of vSAN objects in the synthetic cluster. Default value is 100000')
+parser.add_argument('-v', '--vms', metavar='N', dest='vms', type=int, default=25000,
+	help='number of VMs (DOM_NAME entries) in the synthetic cluster. Default value is 25000')
+parser.add_argument('-H', '--hosts', metavar='N', dest='hosts', type=int, default=16,
+	help='number of hosts in the synthetic cluster. Default value is 16')
+
+args = parser.parse_args()
+
+
+# General variables
+regexKeyValue = re.compile(r'"([^"]+)": ["]{0,1}([^",\}]+)')
+
+
+#
+## Functions
+#
+def load_nested_dicts(cmmdsDump: str) -> dict:
+	'''Parse a CMMDS dump into nested dictionaries keyed by the UUID strings, as vsan-objects-overview.py used to do
+	Return:
+		{'objects': objects['<uuid>']['owner|objClass|groupUuid|components'], 'domNames': domNames['<groupUuid>'], 'hosts': hosts['<uuid>'], 'devices': devices['<uuid>']['deviceId|hostUuid']}'''
+
+	objects = dict()
+	domNames = dict()
+	hosts = dict()
+	devices = dict()
+
+	for cmmdsEntry in vsancmmdsfunctions.iter_cmmds_entries(cmmdsDump=cmmdsDump):
+		if cmmdsEntry['type'] == 'DOM_OBJECT':
+			domObject = objects.setdefault(cmmdsEntry['uuid'], {'components': dict()})
+			domObject['owner'] = cmmdsEntry['owner']
+			componentType = 'Component'
+			componentState = 0
+			componentUuid = None
+			staleCsn = False
+
+			for key, value in regexKeyValue.findall(cmmdsEntry['content']):
+				if key == 'groupUuid':
+					domObject['groupUuid'] = value
+				elif key == 'objClass':
+					domObject['objClass'] = value
+				elif key == 'type':
+					componentType = value
+				elif key == 'componentState':
+					componentState = value
+				elif key == 'staleCsn':
+					staleCsn = True
+				elif key == 'componentUuid':
+					componentUuid = value
+				elif key == 'diskUuid' and componentUuid is not None:
+					domObject['components'][componentUuid] = {'type': componentType, 'componentState': componentState, 'stale': staleCsn, 'diskUuid': value}
+					componentState = 0
+					staleCsn = False
+
+			domObject.setdefault('groupUuid', 'Not found')
+			domObject.setdefault('objClass', 0)
+		elif cmmdsEntry['type'] == 'DOM_NAME':
+			domNames[cmmdsEntry['uuid']] = vsancmmdsfunctions.decode_cmmds_entry(cmmdsEntry).name
+		elif cmmdsEntry['type'] == 'HOSTNAME':
+			hosts[cmmdsEntry['uuid']] = vsancmmdsfunctions.decode_cmmds_entry(cmmdsEntry).hostname
+		elif cmmdsEntry['type'] == 'DISK':
+			devices[cmmdsEntry['uuid']] = {'hostUuid': cmmdsEntry['owner'], 'deviceId': vsancmmdsfunctions.decode_cmmds_entry(cmmdsEntry).deviceId}
+
+	return {'objects': objects, 'domNames': domNames, 'hosts': hosts, 'devices': devices}
+
+
+def measure(name: str, function, baseline: int = None) -> int:
+	'''Run a function and print the memory still allocated for its result afterwards
+	Arguments:
+		name: description of the run
+		function: function building the structure to measure
+		baseline: memory of the structure to compare with
+	Return:
+		number of bytes allocated for the result'''
+
+	gc.collect()
+	tracemalloc.start()
+	timeStart = time.time()
+	result = function()
+	duration = time.time() - timeStart
+	gc.collect()
+	size = tracemalloc.get_traced_memory()[0]
+	tracemalloc.stop()
+	del result
+
+	comparison = ' ({:.0f}%)'.format(size * 100 / baseline) if baseline else ''
+	print('{:<40} {:>8.1f} MB{:<7} in {:>6.2f}s'.format(name, size / 1048576, comparison, duration))
+	return size
+
+
+def main():
+	cluster = vsansimulation.SyntheticCluster(objects=args.objects, vms=args.vms, hosts=args.hosts)
+	fd, cmmdsDump = tempfile.mkstemp(prefix='benchmark-cmmds-memory-', suffix='.txt')
+	os.close(fd)
+	cacheDir = tempfile.mkdtemp(prefix='benchmark-cmmds-memory-cache-')
+
+	try:
+		cluster.write_cmmds_dump(cmmdsDump=cmmdsDump)
+		print('Synthetic cluster with {} objects, {} VMs and {} hosts, CMMDS dump of {:.1f} MB'.format(args.objects, args.vms, args.hosts, os.path.getsize(cmmdsDump) / 1048576))
+		print('(the time measured includes the overhead of tracing the memory allocations)\n')
+
+		baseline = measure('Nested dictionaries', lambda: load_nested_dicts(cmmdsDump=cmmdsDump))
+		measure('CMMDS model, parsed', lambda: vsancmmdsfunctions.load_cmmds_dump(cmmdsDump=cmmdsDump), baseline)
+
+		vsancmmdsfunctions.save_cmmds_cache(cmmdsDump=cmmdsDump, cmmdsModel=vsancmmdsfunctions.load_cmmds_dump(cmmdsDump=cmmdsDump), cacheDir=cacheDir)
+		measure('CMMDS model, from the snapshot cache', lambda: vsancmmdsfunctions.load_cmmds_dump(cmmdsDump=cmmdsDump, useCache=True, cacheDir=cacheDir), baseline)
+	finally:
+		shutil.rmtree(cacheDir, ignore_errors=True)
+		os.remove(cmmdsDump)
+
+	return True
+
+
+#
+## Main
+#
+if __name__ == '__main__':
+	main()
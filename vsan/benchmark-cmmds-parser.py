@@ -0,0 +1,114 @@
+#!/bin/python3
+#
+# Benchmark for parsing CMMDS dumps into the CMMDS model of vsancmmdsfunctions and for its snapshot cache, using a synthetic CMMDS dump
+#
+# Written by Manuel Moser (moserm)
+
+import sys, os, shutil, tempfile, time
+from argparse import ArgumentParser
+
+import vsancmmdsfunctions
+import vsansimulation
+
+
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-e', '--entries', metavar='N', dest='entries', type=int, default=500000,
+	help='approximate number of entries of the synthetic CMMDS dump. Default value is 500000')
+parser.add_argument('-c', '--cmmds', metavar='cmmds.txt', dest='cmmds', default=None,
+	help='path to write the synthetic CMMDS dump to, it\'s kept after the benchmark. By default a temporary file is used and removed afterwards')
+parser.add_argument('-j', '--jobs', metavar='N', dest='jobs', type=int, default=os.cpu_count(),
+	help='number of worker processes for decoding the entries in parallel. Default value is the number of CPUs')
+
+args = parser.parse_args()
+
+
+#
+## Functions
+#
+def run_pass(name: str, cmmdsDump: str, function) -> float:
+	'''Run one pass over the CMMDS dump and print the number of entries per second
+	Arguments:
+		name: name of the pass
+		cmmdsDump: path to the CMMDS dump
+		function: function called for every CMMDS entry'''
+
+	entries = 0
+	timeStart = time.time()
+	for cmmdsEntry in vsancmmdsfunctions.iter_cmmds_entries(cmmdsDump=cmmdsDump):
+		function(cmmdsEntry)
+		entries += 1
+	duration = time.time() - timeStart
+
+	print('{:<40} {:>10} entries in {:>7.2f}s = {:>10.0f} entries/s'.format(name, entries, duration, entries / duration))
+	return duration
+
+
+def decode_text(cmmdsEntry: dict):
+	'''Decode a CMMDS entry with the precompiled patterns only, as used for content that isn't valid JSON'''
+
+	if cmmdsEntry['type'] == 'DOM_OBJECT':
+		return vsancmmdsfunctions.decode_dom_object_text(uuid=cmmdsEntry['uuid'], owner=cmmdsEntry['owner'], content=cmmdsEntry['content'])
+	if cmmdsEntry['type'] == 'DOM_NAME':
+		return vsancmmdsfunctions.decode_dom_name_text(uuid=cmmdsEntry['uuid'], content=cmmdsEntry['content'])
+	return None
+
+
+def main():
+	# Roughly 4 DOM_OBJECT entries per VM, plus up to 64 hosts with 8 disks each
+	hosts = max(1, min(64, args.entries // 10000))
+	objects = int(args.entries * 0.8)
+	vms = max(1, args.entries - objects - hosts * 9)
+	cluster = vsansimulation.SyntheticCluster(objects=objects, vms=vms, hosts=hosts, disksPerHost=8)
+
+	if args.cmmds:
+		cmmdsDump = args.cmmds
+	else:
+		fd, cmmdsDump = tempfile.mkstemp(prefix='benchmark-cmmds-', suffix='.txt')
+		os.close(fd)
+
+	cacheDir = tempfile.mkdtemp(prefix='benchmark-cmmds-cache-')
+
+	try:
+		print('Writing synthetic CMMDS dump with {} entries to {} ...'.format(len(cluster), cmmdsDump))
+		cluster.write_cmmds_dump(cmmdsDump=cmmdsDump)
+		print('Size of the CMMDS dump: {:.1f} MB\n'.format(os.path.getsize(cmmdsDump) / 1048576))
+
+		run_pass('Read entries (iter_cmmds_entries)', cmmdsDump, lambda cmmdsEntry: None)
+		run_pass('Decode content with patterns', cmmdsDump, decode_text)
+		run_pass('Decode content (decode_cmmds_entry)', cmmdsDump, vsancmmdsfunctions.decode_cmmds_entry)
+
+		cmmdsModel = vsancmmdsfunctions.CmmdsModel()
+		run_pass('Build model (CmmdsModel.load)', cmmdsDump, lambda cmmdsEntry: cmmdsModel.load((cmmdsEntry,)))
+		print('\nModel: {} objects, {} names, {} hosts, {} disks\n'.format(len(cmmdsModel.objects), len(cmmdsModel.domNames), len(cmmdsModel.hosts), len(cmmdsModel.disks)))
+
+		parallelModel = vsancmmdsfunctions.CmmdsModel()
+		timeStart = time.time()
+		parallelModel.load_parallel(vsancmmdsfunctions.iter_cmmds_entries(cmmdsDump=cmmdsDump), jobs=args.jobs)
+		duration = time.time() - timeStart
+		print('{:<40} {:>10} entries in {:>7.2f}s = {:>10.0f} entries/s\n'.format('Build model with {} worker processes'.format(args.jobs), len(cluster), duration, len(cluster) / duration))
+
+		timeStart = time.time()
+		vsancmmdsfunctions.save_cmmds_cache(cmmdsDump=cmmdsDump, cmmdsModel=cmmdsModel, cacheDir=cacheDir)
+		print('{:<40} {:>7.2f}s, {:.1f} MB'.format('Write snapshot cache', time.time() - timeStart, os.path.getsize(vsancmmdsfunctions.get_cmmds_cache_file(cmmdsDump=cmmdsDump, cacheDir=cacheDir)) / 1048576))
+
+		cachedModel = vsancmmdsfunctions.CmmdsModel()
+		timeStart = time.time()
+		if not vsancmmdsfunctions.load_cmmds_cache(cmmdsDump=cmmdsDump, cmmdsModel=cachedModel, cacheDir=cacheDir):
+			sys.exit('Failed to load the snapshot cache')
+		duration = time.time() - timeStart
+		print('{:<40} {:>10} entries in {:>7.2f}s = {:>10.0f} entries/s'.format('Load snapshot cache', len(cluster), duration, len(cluster) / duration))
+	finally:
+		shutil.rmtree(cacheDir, ignore_errors=True)
+		if not args.cmmds:
+			os.remove(cmmdsDump)
+
+	return True
+
+
+#
+## Main
+#
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,86 @@
+#!/bin/python3
+#
+# Benchmark for the host-side scripts (get-unmap-stats.py, vsan-objects-overview.py), run against the VSI and CMMDS stand-ins of vsansimulation.py
+#
+# Written by Manuel Moser (moserm)
+
+import sys, os, time, tempfile, subprocess
+from argparse import ArgumentParser
+
+
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-o', '--objects', metavar='N', dest='objects', type=int, default=20000,
+	help='number of vSAN objects in the synthetic cluster. Default value is 20000')
+parser.add_argument('-v', '--vms', metavar='N', dest='vms', type=int, default=5000,
+	help='number of VMs (DOM_NAME entries) in the synthetic cluster. Default value is 5000')
+parser.add_argument('-H', '--hosts', metavar='N', dest='hosts', type=int, default=8,
+	help='number of hosts in the synthetic cluster, the scripts see the objects owned by the first one. Default value is 8')
+parser.add_argument('-l', '--latency', metavar='SECONDS', dest='latency', type=float, default=0.0005,
+	help='latency injected into every VSI and CMMDS call. Default value is 0.0005')
+
+args = parser.parse_args()
+
+
+# General variables
+scriptDir = os.path.dirname(os.path.abspath(__file__))
+
+
+#
+## Functions
+#
+def run_script(name: str, command: list, env: dict) -> float:
+	'''Run a script with the simulation and print how long it took
+	Arguments:
+		name: description of the run
+		command: script and its arguments
+		env: environment with VSAN_SIMULATION set
+	Return:
+		duration in seconds'''
+
+	timeStart = time.time()
+	result = subprocess.run([sys.executable] + command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, cwd=scriptDir)
+	duration = time.time() - timeStart
+
+	if result.returncode != 0:
+		sys.exit('{} failed:\n{}'.format(name, result.stderr.decode('utf-8', 'replace')))
+
+	print('{:<55} {:>8.2f}s'.format(name, duration))
+	return duration
+
+
+def main():
+	env = dict(os.environ)
+	env['VSAN_SIMULATION'] = 'objects={},vms={},hosts={},latency={}'.format(args.objects, args.vms, args.hosts, args.latency)
+	print('VSAN_SIMULATION="{}"\n'.format(env['VSAN_SIMULATION']))
+
+	nameCacheFile = os.path.join(tempfile.mkdtemp(prefix='benchmark-host-scripts-'), 'name-cache.json')
+
+	try:
+		run_script('Setting up the simulation only', ['-c', 'import vsansimulation; vsansimulation.install_from_environment()'], env)
+		print('(the setup time is included in all of the following)\n')
+
+		unmapStats = os.path.join(scriptDir, 'get-unmap-stats.py')
+		run_script('get-unmap-stats.py, serial VSI reads', [unmapStats, '-j', '1', '--no-name-cache'], env)
+		run_script('get-unmap-stats.py, 8 parallel VSI reads', [unmapStats, '-j', '8', '--no-name-cache'], env)
+		run_script('get-unmap-stats.py, 32 parallel VSI reads', [unmapStats, '-j', '32', '--no-name-cache'], env)
+		run_script('get-unmap-stats.py, empty name cache', [unmapStats, '-j', '32', '--name-cache', nameCacheFile], env)
+		run_script('get-unmap-stats.py, warm name cache', [unmapStats, '-j', '32', '--name-cache', nameCacheFile], env)
+
+		objectsOverview = os.path.join(scriptDir, 'vsan-objects-overview.py')
+		run_script('vsan-objects-overview.py, live mode', [objectsOverview, '--no-name-cache'], env)
+		run_script('vsan-objects-overview.py, live mode, warm name cache', [objectsOverview, '--name-cache', nameCacheFile], env)
+	finally:
+		if os.path.exists(nameCacheFile):
+			os.remove(nameCacheFile)
+		os.rmdir(os.path.dirname(nameCacheFile))
+
+	return True
+
+
+#
+## Main
+#
+if __name__ == '__main__':
+	main()
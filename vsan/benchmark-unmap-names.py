@@ -0,0 +1,80 @@
+#!/bin/python3
+#
+# Benchmark for resolving the related VM names of vSAN objects as done by get-unmap-stats.py, using a stand-in for pyCMMDS with a synthetic cluster
+#
+# Written by Manuel Moser (moserm)
+
+import sys, time
+from argparse import ArgumentParser
+
+import vsancmmdsfunctions
+import vsansimulation
+
+
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-o', '--objects', metavar='N', dest='objects', type=int, default=20000,
+	help='number of vSAN objects in the synthetic cluster. Default value is 20000')
+parser.add_argument('-v', '--vms', metavar='N', dest='vms', type=int, default=5000,
+	help='number of VMs (DOM_NAME entries) in the synthetic cluster. Default value is 5000')
+
+args = parser.parse_args()
+
+
+#
+## Functions
+#
+def get_vm_name_per_object(pyCMMDS, vsanObjectUuid: str) -> str:
+	'''Resolve the related VM name of a single vSAN object with two lookups, as get-unmap-stats.py used to do for every object'''
+
+	queryDomObject = pyCMMDS.CMMDSQuery()
+	queryDomObject.uuid = vsanObjectUuid
+	queryDomObject.type = pyCMMDS.CMMDS_TYPE_DOM_OBJECT
+	queryDomObject.wildcards = {'latestRevision': 1, 'anyOwner': 1}
+	entryDomObject = pyCMMDS.FindEntry(queryDomObject, pyCMMDS.CMMDS_FIND_FLAG_NONE, True)
+	try:
+		groupUuid = entryDomObject.content['attributes']['groupUuid']
+	except (AttributeError, KeyError, TypeError):
+		return 'None found'
+
+	queryDomName = pyCMMDS.CMMDSQuery()
+	queryDomName.uuid = groupUuid
+	queryDomName.type = pyCMMDS.CMMDS_TYPE_DOM_NAME
+	queryDomName.wildcards = {'latestRevision': 1, 'anyOwner': 1}
+	entryDomName = pyCMMDS.FindEntry(queryDomName, pyCMMDS.CMMDS_FIND_FLAG_NONE, True)
+	try:
+		return entryDomName.content['ufn']
+	except (AttributeError, KeyError, TypeError):
+		return 'None found'
+
+
+def main():
+	cluster = vsansimulation.SyntheticCluster(objects=args.objects, vms=args.vms)
+	fakePyCmmds = vsansimulation.FakePyCmmds(cluster=cluster)
+	objectUuids = [entry.uuid for entry in fakePyCmmds.entries[fakePyCmmds.CMMDS_TYPE_DOM_OBJECT]]
+	print('Synthetic cluster with {} objects and {} VMs\n'.format(args.objects, args.vms))
+
+	fakePyCmmds.findCalls = 0
+	timeStart = time.time()
+	perObjectNames = dict((uuid, get_vm_name_per_object(pyCMMDS=fakePyCmmds, vsanObjectUuid=uuid)) for uuid in objectUuids)
+	duration = time.time() - timeStart
+	print('{:<30} {:>8} FindEntry calls in {:>7.3f}s'.format('Two lookups per object', fakePyCmmds.findCalls, duration))
+
+	fakePyCmmds.findCalls = 0
+	timeStart = time.time()
+	bulkNames = vsancmmdsfunctions.get_object_names(pyCMMDS=fakePyCmmds)
+	duration = time.time() - timeStart
+	print('{:<30} {:>8} FindEntry calls in {:>7.3f}s'.format('One bulk pass', fakePyCmmds.findCalls, duration))
+
+	if any(bulkNames.get(uuid, 'None found') != name for uuid, name in perObjectNames.items()):
+		sys.exit('\nThe names resolved in the bulk pass differ from the ones resolved per object')
+
+	return True
+
+
+#
+## Main
+#
+if __name__ == '__main__':
+	main()
@@ -2,7 +2,16 @@
 #
 # Written by Manuel Moser (moserm)
 
-import sys
+import sys, os, time, csv, json, heapq, queue, threading, itertools
+from argparse import ArgumentParser
+from collections import deque
+
+import vsancmmdsfunctions
+
+# Stand-ins for VSI and CMMDS serving a synthetic cluster, to run the script on any Linux box (see vsansimulation.py)
+if os.environ.get('VSAN_SIMULATION'):
+	import vsansimulation
+	vsansimulation.install_from_environment()
 
 try:
 	import vmware.vsi as vsi
@@ -11,6 +20,49 @@ except:
 	sys.exit('Failed to import Python modules for VSI and CMMDS. Is this really a live ESXi?')
 
 
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-j', '--jobs', metavar='N', dest='jobs', type=int, default=8,
+	help='number of objects to get the stats for in parallel. Default value is 8')
+parser.add_argument('-t', '--timeout', metavar='SECONDS', dest='timeout', type=float, default=10,
+	help='time after which getting the stats of a single object is given up. Default value is 10')
+parser.add_argument('-f', '--fields', metavar='FIELD,...', dest='fields', default='unmapCount,unmapBytes',
+	help='comma separated list of the DOM owner stats fields to collect, or \'all\' for all numeric fields. Default value is \'unmapCount,unmapBytes\'')
+parser.add_argument('-a', '--average', metavar='NAME=SUM/COUNT', dest='averages', action='append', default=[],
+	help='derived average NAME calculated as field SUM divided by field COUNT, e.g. readLatency=latencyRead/readCount. Can be specified multiple times')
+parser.add_argument('-s', '--sort', metavar='FIELD', dest='sortBy', default=None,
+	help='field or average to sort by, highest first. \'ops\' and \'bytes\' are short for unmapCount and unmapBytes. Default value is unmapBytes if collected, the first field otherwise')
+parser.add_argument('-n', '--top', metavar='N', dest='top', type=int, default=None,
+	help='number of objects to show. Default value is all objects, or 20 in top mode')
+parser.add_argument('-o', '--format', dest='format', choices=['table', 'csv', 'jsonl'], default='table',
+	help='output format: a table or, for later analysis, CSV or JSON lines (one object per line). Default value is table')
+parser.add_argument('-i', '--interval', metavar='SECONDS', dest='interval', type=float, default=None,
+	help='top mode: sample the stats every SECONDS and show the objects with the highest rates, refreshing the screen like esxtop')
+parser.add_argument('-c', '--count', metavar='N', dest='count', type=int, default=0,
+	help='top mode: number of samples to take. Default value is 0, i.e. until interrupted with CTRL+C')
+parser.add_argument('-w', '--window', metavar='N', dest='window', type=int, default=1,
+	help='top mode: number of intervals the rates are averaged over. Default value is 1, i.e. the last interval only')
+parser.add_argument('--name-cache', metavar='FILE', dest='nameCacheFile', default=vsancmmdsfunctions.nameCacheFile,
+	help='file to cache the VM names of the objects in across runs. Default value is \'{}\''.format(vsancmmdsfunctions.nameCacheFile))
+parser.add_argument('--name-ttl', metavar='SECONDS', dest='nameCacheTtl', type=float, default=vsancmmdsfunctions.nameCacheTtl,
+	help='number of seconds a cached VM name is valid. Default value is {}'.format(vsancmmdsfunctions.nameCacheTtl))
+parser.add_argument('--no-name-cache', dest='useNameCache', action='store_false', default=True,
+	help='resolve all VM names through CMMDS, without reading or writing the name cache')
+
+args = parser.parse_args()
+
+
+# General variables
+sortAliases = {'ops': 'unmapCount', 'bytes': 'unmapBytes'}
+columnTitles = {'unmapCount': 'Total number of unmaps', 'unmapBytes': 'Total unmap bytes', 'unmapCount/s': 'Unmaps/s', 'unmapBytes/s': 'Unmap bytes/s'}
+columnWidths = {'unmapCount': 22, 'unmapBytes': 28, 'unmapCount/s': 22, 'unmapBytes/s': 28}
+statsFields = list()		# Stats fields to collect, all numeric fields if empty
+averages = list()		# Structure: averages = [(<name>, <sum field>, <count field>), ...]
+csvHeaderWritten = False
+nameCache = None		# vsancmmdsfunctions.NameCache, unless disabled
+
+
 #
 ## Functions
 #
@@ -19,71 +71,443 @@ def get_vsan_object_uuids():
 	return vsanObjectUuids
 
 
-def get_unmap_stats(vsanObjectUuid):
+def parse_fields(fields: str) -> list:
+	'''Return the list of stats fields to collect, an empty list meaning all numeric fields'''
+
+	if fields == 'all':
+		return list()
+
+	fieldList = [field.strip() for field in fields.split(',') if field.strip()]
+	if not fieldList:
+		parser.error('no stats fields specified')
+
+	return fieldList
+
+
+def parse_averages(averages: list) -> list:
+	'''Parse the definitions of derived averages
+	Arguments:
+		averages: list with definitions in the form NAME=SUM/COUNT
+	Return:
+		list with (name, sum field, count field) tuples'''
+
+	averageList = list()
+	for average in averages:
+		name, sep, fraction = average.partition('=')
+		sumField, sep2, countField = fraction.partition('/')
+		if not sep or not sep2 or not name or not sumField or not countField:
+			parser.error('invalid average definition \'{}\', expected NAME=SUM/COUNT'.format(average))
+		averageList.append((name, sumField, countField))
+
+	return averageList
+
+
+def get_dom_owner_stats(vsanObjectUuid: str) -> dict:
+	'''Get the DOM owner stats of an object, reduced to the fields to collect
+	Arguments:
+		vsanObjectUuid: vSAN object UUID
+	Return:
+		dictionary with the stats fields and their values
+	Raise:
+		ValueError if a field is missing in the stats of the object, any exception of vsi.get() as is'''
+
 	vsiPath = '/vmkModules/vsan/dom/owners/{}/stats'.format(vsanObjectUuid)
-	allUnmapStats = vsi.get(vsiPath)
+	allStats = vsi.get(vsiPath)
 
-	unmapStats = dict()
-	unmapStats['unmapCount'] = allUnmapStats['unmapCount']
-	unmapStats['unmapBytes'] = allUnmapStats['unmapBytes']
+	if not statsFields:
+		return dict((key, value) for key, value in allStats.items() if isinstance(value, (int, float)) and not isinstance(value, bool))
 
-	return unmapStats
+	ownerStats = dict()
+	for field in statsFields:
+		if field not in allStats:
+			raise ValueError('no stats field \'{}\''.format(field))
+		ownerStats[field] = allStats[field]
 
+	return ownerStats
 
-def get_vm_name(vsanObjectUuid):
-	queryDomObject = pyCMMDS.CMMDSQuery()
-	queryDomObject.uuid = vsanObjectUuid
-	queryDomObject.type = pyCMMDS.CMMDS_TYPE_DOM_OBJECT
-	queryDomObject.wildcards = {'latestRevision': 1, 'anyOwner': 1}
-	entryDomObject = pyCMMDS.FindEntry(queryDomObject, pyCMMDS.CMMDS_FIND_FLAG_NONE, True)
-	try:
-		groupUuid = entryDomObject.content['attributes']['groupUuid']
-	except:
-		relatedVM = 'None found'
-		return relatedVM
-
-	queryDomName = pyCMMDS.CMMDSQuery()
-	queryDomName.uuid = groupUuid
-	queryDomName.type = pyCMMDS.CMMDS_TYPE_DOM_NAME
-	queryDomName.wildcards = {'latestRevision': 1, 'anyOwner': 1}
-	entryDomName = pyCMMDS.FindEntry(queryDomName, pyCMMDS.CMMDS_FIND_FLAG_NONE, True)
-	try:
-		relatedVM = entryDomName.content['ufn']
-	except:
-		relatedVM = 'None found'
 
-	return relatedVM
+def collect_owner_stats(objectUuids: list) -> tuple:
+	'''Get the DOM owner stats of the vSAN objects using a pool of worker threads.
+	A call that takes longer than the timeout is given up and its worker replaced, so a single slow object doesn't stall the others.
+	The worker given up on exits once its call returns, so no more than the number of jobs workers keep taking objects.
+	Objects that vanished in the meantime (or failed for any other reason) are skipped.
+	Arguments:
+		objectUuids: list with the vSAN object UUIDs
+	Return:
+		(stats per object UUID, dictionary with the reason of failure per object UUID, list with the duration of each completed call in seconds)'''
+
+	vsanObjects = dict()
+	failed = dict()
+	callTimes = list()
+
+	uuidQueue = queue.Queue()
+	for uuid in objectUuids:
+		uuidQueue.put(uuid)
+	events = queue.Queue()
+	abandonedWorkers = set()
+	workerIds = itertools.count()
+
+	def worker(workerId: int):
+		while workerId not in abandonedWorkers:
+			try:
+				uuid = uuidQueue.get_nowait()
+			except queue.Empty:
+				return
+
+			timeStart = time.time()
+			events.put(('start', uuid, (timeStart, workerId)))
+			try:
+				events.put(('done', uuid, (get_dom_owner_stats(vsanObjectUuid=uuid), time.time() - timeStart)))
+			except Exception as e:
+				events.put(('failed', uuid, str(e) or type(e).__name__))
+
+	def start_worker():
+		# Daemon threads, so a call that never returns doesn't keep the script from exiting
+		thread = threading.Thread(target=worker, args=(next(workerIds),), daemon=True)
+		thread.start()
+
+	for i in range(min(max(args.jobs, 1), len(objectUuids))):
+		start_worker()
+
+	pending = set(objectUuids)
+	running = dict()
 
+	while pending:
+		# The calls running are checked on every pass, also while other calls keep completing
+		timeNow = time.time()
+		for uuid, (timeStart, workerId) in list(running.items()):
+			if timeNow - timeStart > args.timeout:
+				del running[uuid]
+				pending.discard(uuid)
+				failed[uuid] = 'timed out after {}s'.format(args.timeout)
+				abandonedWorkers.add(workerId)
+				start_worker()
 
-def print_unmap_stats(vsanObjects):
-	print(' Object UUID' + ' ' * 26 + '| Total number of unmaps | Total unmap bytes' + ' ' * 12 + '| Related VM')
-	print('-' * 114)
+		try:
+			event, uuid, data = events.get(timeout=0.1)
+		except queue.Empty:
+			continue
 
-	#for uuid in vsanObjects.keys():
-	for uuid in sorted(vsanObjects, key=lambda x: vsanObjects[x]['unmapBytes'], reverse=True):
-		unmapCountPadding = 22 - len(str(vsanObjects[uuid]['unmapCount']))
-		unmapCountPaddingStr = ' ' * unmapCountPadding
-		unampBytesPadding = 28 - len(str(vsanObjects[uuid]['unmapBytes']))
-		unampBytesPaddingStr = ' ' * unampBytesPadding
+		if uuid not in pending:
+			continue
 
-		outputLine = ' {uuid} | {unmapCountPadding}{unmapCount} | {unampBytesPadding}{unmapBytes} | {vm}'.format(uuid=uuid, unmapCountPadding=unmapCountPaddingStr, unmapCount=vsanObjects[uuid]['unmapCount'],
-				unampBytesPadding=unampBytesPaddingStr, unmapBytes=vsanObjects[uuid]['unmapBytes'], vm=vsanObjects[uuid]['vm'])
+		if event == 'start':
+			running[uuid] = data
+			continue
 
-		print(outputLine)
+		del running[uuid]
+		pending.discard(uuid)
+		if event == 'done':
+			vsanObjects[uuid], callTime = data
+			callTimes.append(callTime)
+		else:
+			failed[uuid] = data
+
+	return vsanObjects, failed, callTimes
+
+
+def get_vm_names(objectUuids) -> dict:
+	'''Return the related VM names of the vSAN objects.
+	With the name cache, only objects and namespaces that are missing or expired in it are looked up in CMMDS.
+	Without it, the names of all objects are resolved in one pass over the DOM_OBJECT and DOM_NAME entries in CMMDS.
+	Arguments:
+		objectUuids: object UUIDs that need a VM name
+	Return:
+		dictionary with the VM name per object UUID'''
+
+	if nameCache is None:
+		vmNames = vsancmmdsfunctions.get_object_names(pyCMMDS=pyCMMDS, default='None found')
+		return vmNames
+
+	vmNames = vsancmmdsfunctions.resolve_object_names(pyCMMDS=pyCMMDS, objectUuids=objectUuids, nameCache=nameCache, default='None found')
+	nameCache.save()
+	return vmNames
+
+
+def update_vm_names(vmNames: dict, objectUuids) -> bool:
+	'''Resolve the VM names again if there are objects whose names haven't been looked up yet, e.g. because they were created since.
+	Objects that still can't be resolved are cached as 'None found', so they don't trigger another lookup on every refresh.
+	Arguments:
+		vmNames['<object-uuid>'] = '<VM name>' -> cache of the VM names, updated in place
+		objectUuids: object UUIDs that need a VM name
+	Return:
+		True if the VM names were resolved again, False otherwise'''
+
+	missingUuids = [uuid for uuid in objectUuids if uuid not in vmNames]
+	if not missingUuids:
+		return False
+
+	vmNames.update(get_vm_names(objectUuids=missingUuids))
+	for uuid in missingUuids:
+		vmNames.setdefault(uuid, 'None found')
+
+	return True
+
+
+def add_averages(row: dict, values: dict) -> dict:
+	'''Add the derived averages to a row, calculated from the values (totals or deltas) of the fields. An average is 0 if its count is 0 or a field is missing'''
+
+	for name, sumField, countField in averages:
+		count = values.get(countField, 0)
+		row[name] = values.get(sumField, 0) / count if count else 0
+
+	return row
+
+
+def calculate_totals(vsanObjects: dict) -> dict:
+	'''Return the rows with the collected stats and the averages over the totals, per object UUID'''
+
+	rows = dict()
+	for uuid, ownerStats in vsanObjects.items():
+		rows[uuid] = add_averages(row=dict(ownerStats), values=ownerStats)
+
+	return rows
+
+
+def calculate_rates(oldSample: tuple, newSample: tuple) -> dict:
+	'''Calculate the rates of the stats fields between two samples, and the averages over the deltas
+	Arguments:
+		oldSample, newSample: (timestamp, stats per object UUID)
+	Return:
+		rates['<object-uuid>'] = {'<field>/s': <rate>, '<average>': <value>} -> only objects that are in both samples'''
+
+	oldTime, oldObjects = oldSample
+	newTime, newObjects = newSample
+	duration = max(newTime - oldTime, 0.001)
+
+	rates = dict()
+	for uuid, newStats in newObjects.items():
+		oldStats = oldObjects.get(uuid)
+		if oldStats is None:
+			continue
+
+		deltas = dict()
+		row = dict()
+		for field, value in newStats.items():
+			delta = value - oldStats.get(field, 0)
+			# The counter was reset in the meantime (e.g. DOM owner moved), count from zero
+			if delta < 0:
+				delta = value
+			deltas[field] = delta
+			row[field + '/s'] = delta / duration
+		rates[uuid] = add_averages(row=row, values=deltas)
+
+	return rates
+
+
+def get_columns(rows: dict, rates: bool) -> list:
+	'''Return the columns of the output: the stats fields (or their rates) in the order specified, followed by the averages'''
+
+	if statsFields:
+		fields = list(statsFields)
+	else:
+		fields = list()
+		for ownerStats in rows.values():
+			for field in ownerStats.keys():
+				if field.endswith('/s'):
+					field = field[:-2]
+				if field not in fields and field not in [average[0] for average in averages]:
+					fields.append(field)
+
+	if rates:
+		fields = [field + '/s' for field in fields]
+
+	return fields + [average[0] for average in averages]
+
+
+def get_sort_column(columns: list, rates: bool) -> str:
+	'''Return the column to sort by'''
+
+	if args.sortBy:
+		sortBy = sortAliases.get(args.sortBy, args.sortBy)
+	elif 'unmapBytes' in statsFields or not statsFields:
+		sortBy = 'unmapBytes'
+	else:
+		sortBy = statsFields[0]
+
+	if rates and sortBy + '/s' in columns:
+		return sortBy + '/s'
+	if sortBy in columns:
+		return sortBy
+
+	if args.sortBy:
+		sys.exit('Unable to sort by {}, it\'s neither a collected field nor an average'.format(args.sortBy))
+	return columns[0]
+
+
+def select_top_rows(rows: dict, sortColumn: str, top: int) -> list:
+	'''Return the object UUIDs with the highest values in the sort column. With a limit, heapq is used to select them instead of sorting all objects
+	Arguments:
+		rows['<object-uuid>'] = {'<column>': <value>}
+		sortColumn: column to sort by
+		top: number of objects to return, 0 for all'''
+
+	sortKey = lambda uuid: rows[uuid].get(sortColumn, 0)
+
+	if top and top < len(rows):
+		return heapq.nlargest(top, rows, key=sortKey)
+
+	return sorted(rows, key=sortKey, reverse=True)
+
+
+def format_value(value) -> str:
+	if isinstance(value, float):
+		return '{:.1f}'.format(value)
+	return str(value)
+
+
+def print_table(rows: dict, topUuids: list, columns: list, vmNames: dict):
+	'''Print the objects as a table'''
+
+	values = dict((uuid, [format_value(rows[uuid].get(column, 0)) for column in columns]) for uuid in topUuids)
+	widths = [max([columnWidths.get(column, 0), len(columnTitles.get(column, column))] + [len(values[uuid][i]) for uuid in topUuids]) for i, column in enumerate(columns)]
+
+	header = ' Object UUID' + ' ' * 26
+	for column, width in zip(columns, widths):
+		title = columnTitles.get(column, column)
+		header += '| ' + title + ' ' * (width - len(title)) + ' '
+	print(header + '| Related VM')
+	print('-' * (len(header) + 20))
+
+	for uuid in topUuids:
+		outputLine = ' ' + uuid
+		for value, width in zip(values[uuid], widths):
+			outputLine += ' | ' + value.rjust(width)
+		print(outputLine + ' | ' + vmNames.get(uuid, 'None found'))
+
+	return True
+
+
+def write_records(rows: dict, topUuids: list, columns: list, vmNames: dict, timestamp: float = None):
+	'''Write the objects as CSV or JSON lines, with the time of the sample in top mode'''
+
+	global csvHeaderWritten
+
+	prefix = ['timestamp'] if timestamp is not None else list()
+	sampleTime = [time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(timestamp))] if timestamp is not None else list()
+
+	if args.format == 'csv':
+		writer = csv.writer(sys.stdout)
+		if not csvHeaderWritten:
+			writer.writerow(prefix + ['uuid'] + columns + ['vm'])
+			csvHeaderWritten = True
+		for uuid in topUuids:
+			writer.writerow(sampleTime + [uuid] + [rows[uuid].get(column, 0) for column in columns] + [vmNames.get(uuid, 'None found')])
+	else:
+		for uuid in topUuids:
+			record = dict(zip(prefix, sampleTime))
+			record['uuid'] = uuid
+			for column in columns:
+				record[column] = rows[uuid].get(column, 0)
+			record['vm'] = vmNames.get(uuid, 'None found')
+			sys.stdout.write(json.dumps(record) + '\n')
+
+	sys.stdout.flush()
+	return True
+
+
+def output_rows(rows: dict, vmNames: dict, top: int, rates: bool, timestamp: float = None):
+	'''Output the objects with the highest values in the sort column, in the output format specified'''
+
+	if not rows:
+		return True
+
+	columns = get_columns(rows=rows, rates=rates)
+	topUuids = select_top_rows(rows=rows, sortColumn=get_sort_column(columns=columns, rates=rates), top=top)
+
+	if args.format == 'table':
+		print_table(rows=rows, topUuids=topUuids, columns=columns, vmNames=vmNames)
+	else:
+		write_records(rows=rows, topUuids=topUuids, columns=columns, vmNames=vmNames, timestamp=timestamp)
+
+	return True
+
+
+def print_status(message: str):
+	'''Print status information, to stderr if the output is CSV or JSON lines so it doesn't end up in the data'''
+
+	print(message, file=sys.stdout if args.format == 'table' else sys.stderr)
+	return True
+
+
+def print_collection_summary(vsanObjects: dict, failed: dict, callTimes: list, duration: float):
+	'''Print how long collecting the stats took and for which objects it failed'''
+
+	print_status('')
+	if callTimes:
+		print_status('Got the stats of {} objects in {:.2f}s ({} in parallel), {:.1f}ms per object on average, {:.1f}ms at most'.format(len(vsanObjects), duration, args.jobs,
+				sum(callTimes) / len(callTimes) * 1000, max(callTimes) * 1000))
+
+	if failed:
+		print_status('Failed to get the stats of {} objects (e.g. because they were removed in the meantime):'.format(len(failed)))
+		for uuid in sorted(failed):
+			print_status(' {}: {}'.format(uuid, failed[uuid]))
+
+	return True
+
+
+def run_top_mode():
+	'''Sample the stats every interval and output the objects with the highest rates.
+	The last samples are kept in a ring buffer, the rates are calculated between the oldest and the newest one in it.
+	The VM names are cached across the samples and only resolved again for objects that are new.'''
+
+	samples = deque(maxlen=max(args.window, 1) + 1)
+	vmNames = dict()
+	top = args.top if args.top is not None else 20
+	taken = 0
+
+	try:
+		while True:
+			timeStart = time.time()
+			objectUuids = get_vsan_object_uuids()
+			vsanObjects, failed, callTimes = collect_owner_stats(objectUuids=objectUuids)
+			samples.append((timeStart, vsanObjects))
+			update_vm_names(vmNames=vmNames, objectUuids=vsanObjects.keys())
+			taken += 1
+
+			if len(samples) == 1:
+				print_status('Took the first sample of {} objects, the rates are shown after the next one in {}s'.format(len(vsanObjects), args.interval))
+			elif args.format == 'table':
+				if sys.stdout.isatty():
+					sys.stdout.write('\033[H\033[2J')
+				print('{}  interval: {}s  averaged over: {:.1f}s  objects: {}  failed: {}'.format(time.strftime('%Y-%m-%d %H:%M:%S'), args.interval,
+						samples[-1][0] - samples[0][0], len(vsanObjects), len(failed)))
+				print('')
+				output_rows(rows=calculate_rates(oldSample=samples[0], newSample=samples[-1]), vmNames=vmNames, top=top, rates=True)
+				sys.stdout.flush()
+			else:
+				output_rows(rows=calculate_rates(oldSample=samples[0], newSample=samples[-1]), vmNames=vmNames, top=top, rates=True, timestamp=timeStart)
+
+			if args.count and taken >= args.count:
+				break
+
+			time.sleep(max(args.interval - (time.time() - timeStart), 0))
+	except KeyboardInterrupt:
+		pass
 
 	return True
 
 
 def main():
-	vsanObjects = dict()
+	global statsFields, averages, nameCache
+	statsFields = parse_fields(fields=args.fields)
+	averages = parse_averages(averages=args.averages)
+	if args.useNameCache:
+		nameCache = vsancmmdsfunctions.NameCache(cacheFile=args.nameCacheFile, ttl=args.nameCacheTtl)
+
+	if args.interval:
+		run_top_mode()
+		return True
 
 	objectUuids = get_vsan_object_uuids()
+	vmNames = get_vm_names(objectUuids=objectUuids)
 
-	for uuid in objectUuids:
-		vsanObjects[uuid] = get_unmap_stats(vsanObjectUuid=uuid)
-		vsanObjects[uuid]['vm'] = get_vm_name(uuid)
+	timeStart = time.time()
+	vsanObjects, failed, callTimes = collect_owner_stats(objectUuids=objectUuids)
+	duration = time.time() - timeStart
 
-	print_unmap_stats(vsanObjects=vsanObjects)
+	output_rows(rows=calculate_totals(vsanObjects=vsanObjects), vmNames=vmNames, top=args.top or 0, rates=False)
+	print_collection_summary(vsanObjects=vsanObjects, failed=failed, callTimes=callTimes, duration=duration)
 
 	return True
 
@@ -0,0 +1,120 @@
+#!/bin/python3.6
+#
+# Decodes the binary vSAN traces (vsantraces*.gz) in the current directory and in all extracted ESXi log bundles (esx-*) in it, using vsanTraceReader.
+#
+# Written by Manuel Moser (moserm)
+
+import sys, os, time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from glob import glob
+
+import vsantracefunctions
+
+
+# Parsing command-line arguments
+parser = ArgumentParser()
+
+parser.add_argument('-d', '--dir', metavar='DIR', dest='baseDir', default='.',
+		help='directory with the vSAN traces or the extracted ESXi log bundles. Default value is the current directory')
+parser.add_argument('-j', '--jobs', metavar='N', dest='jobs', type=int, default=os.cpu_count() or 1,
+		help='number of vSAN trace files to decode in parallel. Default value is the number of CPUs')
+parser.add_argument('-r', '--reader', metavar='vsanTraceReader', dest='reader', default=None,
+		help='decoder to use instead of the vsanTraceReader found next to the vSAN traces or in the ESXi log bundle. Any executable decoding stdin to stdout will do')
+parser.add_argument('-f', '--force', dest='force', action='store_true', default=False,
+		help='decode all vSAN trace files, even if the decoded text file is already up to date')
+
+args = parser.parse_args()
+
+# A relative path to the decoder would otherwise be looked up on PATH by subprocess, e.g. "vsanTraceReader" in the current directory
+if args.reader and (os.sep in args.reader or os.path.isfile(args.reader)):
+	args.reader = os.path.abspath(args.reader)
+
+
+#
+## Functions
+#
+def collect_trace_archives() -> list:
+	'''Collect the binary vSAN trace files to decode together with the decoder to use for them
+	Return:
+		list with (binary vSAN trace file, decoded text file, vsanTraceReader) tuples'''
+
+	traceArchives = list()
+	skipped = 0
+
+	for vsanTraceDir in vsantracefunctions.find_vsan_trace_dirs(baseDir=args.baseDir):
+		vsanTraceReader = args.reader or vsantracefunctions.find_vsan_trace_reader(vsanTraceDir=vsanTraceDir)
+		if not vsanTraceReader:
+			print('No vsanTraceReader found for {}, skipping it'.format(vsanTraceDir))
+			continue
+
+		for vsanTraceArchive in sorted(glob(os.path.join(vsanTraceDir, 'vsantraces*.gz'))):
+			decodedTraceFile = vsantracefunctions.get_decoded_trace_file(vsanTraceArchive=vsanTraceArchive)
+
+			if not args.force and vsantracefunctions.is_decoded_trace_up_to_date(vsanTraceArchive=vsanTraceArchive, decodedTraceFile=decodedTraceFile):
+				skipped += 1
+				continue
+
+			traceArchives.append((vsanTraceArchive, decodedTraceFile, vsanTraceReader))
+
+	if skipped:
+		print('Skipping {} vSAN trace files that are already decoded'.format(skipped))
+
+	return traceArchives
+
+
+def decode_trace_archives(traceArchives: list) -> int:
+	'''Decode the binary vSAN trace files using a pool of workers and report the throughput
+	Arguments:
+		traceArchives: list with (binary vSAN trace file, decoded text file, vsanTraceReader) tuples
+	Return:
+		number of vSAN trace files that failed to decode'''
+
+	failed = 0
+	totalIn = 0
+	totalOut = 0
+	timeStart = time.time()
+
+	with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+		futures = dict()
+		for vsanTraceArchive, decodedTraceFile, vsanTraceReader in traceArchives:
+			future = executor.submit(vsantracefunctions.decode_vsan_trace_file, vsanTraceArchive, decodedTraceFile, vsanTraceReader)
+			futures[future] = vsanTraceArchive
+
+		for future in as_completed(futures):
+			try:
+				bytesIn, bytesOut, duration = future.result()
+			except (OSError, RuntimeError) as e:
+				print('Failed to decode {}: {}'.format(futures[future], e))
+				failed += 1
+				continue
+
+			totalIn += bytesIn
+			totalOut += bytesOut
+			print('Decoded {} ({:.1f} MB -> {:.1f} MB) in {:.1f}s'.format(futures[future], bytesIn / 1048576, bytesOut / 1048576, duration))
+
+	duration = max(time.time() - timeStart, 0.001)
+	print('Decoded {} of {} vSAN trace files in {:.1f}s: {:.1f} MB/s in, {:.1f} MB/s out'.format(len(traceArchives) - failed, len(traceArchives), duration,
+			totalIn / 1048576 / duration, totalOut / 1048576 / duration))
+
+	return failed
+
+
+def main():
+	traceArchives = collect_trace_archives()
+
+	if not traceArchives:
+		print('Nothing to decode')
+		return True
+
+	if decode_trace_archives(traceArchives=traceArchives):
+		sys.exit(1)
+
+	return True
+
+
+#
+## Main
+#
+if __name__ == '__main__':
+	main()
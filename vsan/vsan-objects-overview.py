@@ -3,9 +3,16 @@
 # Version: 1.0.3
 # Written by Manuel Moser (moserm)
 
-import sys, os, re, json, subprocess
+import sys, os, io, csv, json, subprocess
 from argparse import ArgumentParser
 
+import vsancmmdsfunctions
+
+# Stand-in for CMMDS serving a synthetic cluster, to run the script in live mode on any Linux box (see vsansimulation.py)
+if os.environ.get('VSAN_SIMULATION'):
+	import vsansimulation
+	vsansimulation.install_from_environment()
+
 
 # Parsing command-line arguments
 parser = ArgumentParser()
@@ -16,24 +23,46 @@ parser.add_argument('-a', '--affected', dest='affected', required=False, action=
 	help='only print affected objects, i.e. with components that are not active')
 parser.add_argument('-d', '--debug', dest='debug', required=False, action='store_true',
 	help='debug output')
+parser.add_argument('-o', '--format', dest='format', choices=['table', 'csv', 'jsonl'], default='table',
+	help='output format: a table, CSV with one line per component or JSON lines with one line per object. Default value is table')
+parser.add_argument('--host', metavar='HOST', dest='hosts', action='append',
+	help='only print objects with components on this host (hostname or UUID). Can be specified multiple times')
+parser.add_argument('--disk', metavar='DISK', dest='disks', action='append',
+	help='only print objects with components on this capacity device (device name or disk UUID). Can be specified multiple times')
+parser.add_argument('--vm', metavar='NAME', dest='vms', action='append',
+	help='only print objects of this VM (related VM name). Can be specified multiple times')
+parser.add_argument('--state', metavar='STATE', dest='states', action='append',
+	help='only print objects with components in this state, e.g. Absent or Degraded. Can be specified multiple times')
+parser.add_argument('-s', '--summary', dest='summary', required=False, action='store_true',
+	help='instead of the objects, print the number of components per host, capacity device and state (taking filters into account)')
+parser.add_argument('--diff', metavar='OLD_CMMDS', dest='diff', required=False,
+	help='instead of the objects, print what changed since this older CMMDS dump, compared to the CMMDS dump specified with -c or the live cluster')
+parser.add_argument('-j', '--jobs', metavar='N', dest='jobs', type=int, default=1,
+	help='number of worker processes to decode the entries of the CMMDS dump with. Default value is 1')
+parser.add_argument('--cmmds-tool', dest='cmmdsTool', required=False, action='store_true',
+	help='on a live ESXi, create a CMMDS dump with cmmds-tool instead of querying CMMDS directly through pyCMMDS')
+parser.add_argument('--name-cache', metavar='FILE', dest='nameCacheFile', default=vsancmmdsfunctions.nameCacheFile,
+	help='on a live ESXi, file to cache the VM names in across runs. Default value is \'{}\''.format(vsancmmdsfunctions.nameCacheFile))
+parser.add_argument('--name-ttl', metavar='SECONDS', dest='nameCacheTtl', type=float, default=vsancmmdsfunctions.nameCacheTtl,
+	help='number of seconds a cached VM name is valid. Default value is {}'.format(vsancmmdsfunctions.nameCacheTtl))
+parser.add_argument('--no-name-cache', dest='useNameCache', action='store_false', default=True,
+	help='on a live ESXi, query all DOM_NAME entries from CMMDS instead of using the name cache')
+parser.add_argument('--cache-dir', metavar='DIR', dest='cacheDir', default=None,
+	help='directory for the snapshot cache of the parsed CMMDS dump. By default a hidden directory next to the CMMDS dump is used')
+parser.add_argument('--no-cache', dest='useCache', action='store_false', default=True,
+	help='neither read from nor write to the snapshot cache of the parsed CMMDS dump')
 
 args = parser.parse_args(
 )
 
 # General variables
-UUID = '[0-9a-z]{8}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{12}'
 objClass = ['VMDK', 'Snapshot', 'Namespace', 'VSWP', 'VMEM', 'Sidecar', 'HBR', 'Coredump', 'DPCONSISTENCYGRP', 'VDFS', 'VDFS_ROOT', 'N/A']
 compStates = ['First', 'None', 'Need Config', 'Initialize', 'Initialized', 'Active', 'Absent', 'Stale', 'Resyncing', 'Degraded', 'Reconfiguring', 'Cleanup', 'Transient', 'Last']
-objects = {}				# Structure: objects['<uuid>']['owner|objClass|groupUuid|components']
-					#	     objects['<uuid>']['components']['<component-uuid>']['type|componentState|stale|diskUuid']
-domNames = {}                           # Structure: domNames['<groupUuid>'] = <domName>
-hosts = {}                              # Structure: hosts['<uuid>'] = <hostname>
-devices = {}				# Structure: devices['<uuid>']['deviceId|hostUuid']
-
-hosts['00000000-0000-0000-0000-000000000000'] = 'Not found'
-devices['00000000-0000-0000-0000-000000000000'] = {}
-devices['00000000-0000-0000-0000-000000000000']['deviceId'] = 'Not found'
-devices['00000000-0000-0000-0000-000000000000']['hostUuid'] = '00000000-0000-0000-0000-000000000000'
+cmmds = vsancmmdsfunctions.CmmdsModel()	# Structure: cmmds.objects|domNames|hosts|disks['<uuid>'] = CmmdsDomObject|CmmdsDomName|CmmdsHost|CmmdsDisk
+unknownDisk = vsancmmdsfunctions.CmmdsDisk(uuid='00000000-0000-0000-0000-000000000000', owner='00000000-0000-0000-0000-000000000000', deviceId='Not found')
+outputBatchLines = 4096		# Number of lines written to the output at once
+outputBatchSize = 1024 * 1024	# Number of characters written to the output at once
+selectedObjects = None			# Objects matching the filter options, None without any filters
 
 
 #
@@ -57,308 +86,416 @@ def create_cmmds_dump(cmmdsDumpOutput: str):
 	return True
 
 
-def fix_cmmds_dump(cmmdsDumpInput: str, cmmdsDumpOutput: str):
-	'''Reads in the CMMDS dump, removes the last "," character, and then writes a new CMMDS dump file, so it can be loaded into Python json
+def call_cmmds_parser(cmmdsDump: str, useCache: bool = False, cmmdsModel=cmmds):
+	'''Call CMMDS parse routine
 	Arguments:
-		cmmdsDumpInput: path to the original CMMDS dump
-		cmmdsDumpOutput: path to the new CMMDS dump file that will be created by this function'''
-
-	if not os.path.isfile(cmmdsDumpInput):
-		print('CMMDS dump file not found: %s' % cmmdsDumpOrig)
-		return False
-
-	fhCmmds = open(cmmdsDumpInput, 'r')
-	cmmdsContent = fhCmmds.readlines()
-	cmmdsContent[len(cmmdsContent)-2] = '}'
+		cmmdsDump: path to the CMMDS dump that's to be parsed
+		useCache: whether to use the snapshot cache of the parsed CMMDS dump
+		cmmdsModel: CMMDS model to add the entries to, by default the one of the overview'''
 
-	fhNewCmmds = open(cmmdsDumpOutput, 'w')
-	fhNewCmmds.writelines(cmmdsContent)
+	if not os.path.isfile(cmmdsDump):
+		sys.exit('CMMDS dump file not found: %s' % cmmdsDump)
 
-	os.chmod(cmmdsDumpOutput, 0o666)
-	fhCmmds.close()
-	fhNewCmmds.close()
+	try:
+		vsancmmdsfunctions.load_cmmds_dump(cmmdsDump=cmmdsDump, cmmdsModel=cmmdsModel, useCache=useCache, cacheDir=args.cacheDir, jobs=args.jobs)
+	except ValueError as e:
+		sys.exit('Failed to parse CMMDS dump %s: %s' % (cmmdsDump, e))
 
 	return True
 
 
-def call_cmmds_parser(cmmdsDump: str):
-	'''Call CMMDS parse routine
+def call_pycmmds_query(pyCMMDS):
+	'''Query the DOM_OBJECT, DOM_NAME, HOSTNAME and DISK entries on a live ESXi through pyCMMDS and add them to the CMMDS model, without an intermediate CMMDS dump.
+	With the name cache, only the DOM_NAME entries missing or expired in it are queried.
 	Arguments:
-		cmmdsDump: path to the CMMDS dump that's to be parsed'''
+		pyCMMDS: pyCMMDS module or a stand-in with the same interface'''
 
-	fhCmmds = open(cmmdsDump, 'r')
-	cmmds = json.load(fhCmmds)
-	fhCmmds.close()
-	parse_cmmds(cmmds=cmmds)
-	os.remove(cmmdsDump)
-	return True
+	if not args.useNameCache:
+		cmmds.load(cmmdsEntries=vsancmmdsfunctions.iter_pycmmds_entries(pyCMMDS=pyCMMDS))
+		return True
 
+	cmmds.load(cmmdsEntries=vsancmmdsfunctions.iter_pycmmds_entries(pyCMMDS=pyCMMDS, entryTypes=('DOM_OBJECT', 'HOSTNAME', 'DISK')))
 
-def parse_cmmds(cmmds):
-	'''Parse CMMDS dump and call respective functions for the required entries'''
+	nameCache = vsancmmdsfunctions.NameCache(cacheFile=args.nameCacheFile, ttl=args.nameCacheTtl)
+	groupUuids = set()
+	for domObject in cmmds.objects.values():
+		groupUuid = domObject.groupUuid if domObject.groupUuid != 'Not found' else None
+		nameCache.set_group_uuid(domObject.uuid, groupUuid)
+		if groupUuid is not None:
+			groupUuids.add(groupUuid)
 
-	for entry in cmmds:
-		if entry['type'] == 'DOM_OBJECT':
-			get_object_info(entry)
-			continue
-		if entry['type'] == 'DOM_NAME':
-			get_dom_name(entry)
-			continue
-		if entry['type'] == 'HOSTNAME':
-			get_host(entry)
-			continue
-		if entry['type'] == 'DISK':
-			get_disk(entry)
-			continue
+	names = vsancmmdsfunctions.resolve_group_names(pyCMMDS=pyCMMDS, groupUuids=groupUuids, nameCache=nameCache)
+	for groupUuid, ufn in names.items():
+		if ufn is not None:
+			cmmds.add(vsancmmdsfunctions.CmmdsDomName(uuid=groupUuid, name=vsancmmdsfunctions.get_dom_name_from_ufn(ufn)))
 
+	nameCache.save()
 	return True
 
 
-def get_object_info(entryDomObject: dict):
-	'''Get objcet info like group UUID, object class, etc.'''
+def get_max_length(stringList: list) -> list:
+	'''Return the length of the longest string in a list'''
+
+	maxLength = 0
+
+	for string in stringList:
+		if len(string) > maxLength:
+			maxLength = len(string)
+
+	return maxLength
+
 
-	if not entryDomObject['uuid'] in objects.keys():
-		objects[entryDomObject['uuid']] = {}
-		objects[entryDomObject['uuid']]['components'] = {}
+def get_column_widths() -> list:
+	'''Return the widths of the table columns, based on the longest hostname and device name'''
 
-	objects[entryDomObject['uuid']]['owner'] = entryDomObject['owner']
+	hostnameColWidth = get_max_length([host.hostname for host in cmmds.hosts.values()] + [unknownDisk.deviceId]) + 2
 
-	regexObjInfo = re.compile('"([^"]+)": ["]{0,1}([^",\}]+)')
-	resultObjInfo = re.findall(regexObjInfo, entryDomObject['content'])
+	deviceIdColWidth = get_max_length([disk.deviceId for disk in cmmds.disks.values()] + [unknownDisk.deviceId]) + 2
+	if deviceIdColWidth < 32:
+		deviceIdColWidth = 32
 
-	parse_dom_object_details(objUuid=entryDomObject['uuid'], objDetails=resultObjInfo)
+	return [37, 18, hostnameColWidth, 65, deviceIdColWidth, hostnameColWidth, 27]
 
-	return True
 
+def check_affected(domObject) -> bool:
+	'''Return whether an object has components that are not active'''
 
-def parse_dom_object_details(objUuid: str, objDetails: list):
-	'''Get the groupUuid, objClass, component UUIDs, and component states from the DOM_OBJECT content values'''
+	for component in domObject.components:
+		if component.state != 5:
+			return True
 
-	staleCsn = False
+	return False
 
-	for keyValuePair in objDetails:
-		if keyValuePair[0] == 'groupUuid':
-			objects[objUuid]['groupUuid'] = keyValuePair[1]
-			continue
 
-		if keyValuePair[0] == 'objClass':
-			objects[objUuid]['objClass'] = keyValuePair[1]
-			continue
+def iter_selected_objects():
+	'''Generator that yields the objects to output, i.e. the ones matching the filters and, with "-a", only the affected ones'''
 
-		if keyValuePair[0] == 'type':
-			componentType = keyValuePair[1]
+	for domObject in cmmds.objects.values():
+		if selectedObjects is not None and domObject not in selectedObjects:
 			continue
-
-		if keyValuePair[0] == 'componentState':
-			componentState = keyValuePair[1]
+		if args.affected and not check_affected(domObject=domObject):
 			continue
+		yield domObject
 
-		if keyValuePair[0] == 'staleCsn':
-			staleCsn = True
-			continue
 
-		if keyValuePair[0] == 'componentUuid':
-			componentUuid = keyValuePair[1]
-			continue
+def get_filter_keys(values: list, records: dict, attribute: str, description: str) -> list:
+	'''Return the UUIDs of the hosts or disks specified by name or UUID with a filter option
+	Arguments:
+		values: values of the filter option
+		records: cmmds.hosts or cmmds.disks
+		attribute: attribute with the name of the records, i.e. hostname or deviceId
+		description: description of the records for the warning if a value doesn't match any'''
+
+	keys = list()
+	for value in values:
+		matches = [uuid for uuid, record in records.items() if uuid == value or getattr(record, attribute) == value]
+		if not matches:
+			print('No {} \'{}\' found'.format(description, value), file=sys.stderr)
+		keys += matches
 
-		if keyValuePair[0] == 'diskUuid':
-			diskUuid = keyValuePair[1]
-			objects[objUuid]['components'][componentUuid] = dict()
-			objects[objUuid]['components'][componentUuid]['type'] = componentType
-			objects[objUuid]['components'][componentUuid]['componentState'] = componentState
-			objects[objUuid]['components'][componentUuid]['stale'] = staleCsn
-			objects[objUuid]['components'][componentUuid]['diskUuid'] = diskUuid
-			componentState = 0
-			staleCsn = False
+	return keys
 
-	if not 'groupUuid' in objects[objUuid].keys():
-		objects[objUuid]['groupUuid'] = 'Not found'
 
-	if not 'objClass' in objects[objUuid].keys():
-		objects[objUuid]['objClass'] = 0
+def select_objects(cmmdsIndex) -> tuple:
+	'''Look up the components and objects matching the filter options in the indexes. Filters of different options must all match, the values of the same option are alternatives
+	Arguments:
+		cmmdsIndex: vsancmmdsfunctions.CmmdsIndex of the CMMDS model
+	Return:
+		(<set with the matching objects>, <set with the matching (object, component)>), either is None if there are no filters for it'''
+
+	componentSets = list()
+	if args.hosts:
+		componentSets.append(set(entry for hostUuid in get_filter_keys(values=args.hosts, records=cmmds.hosts, attribute='hostname', description='host')
+				for entry in cmmdsIndex.componentsByHost.get(hostUuid, ())))
+	if args.disks:
+		componentSets.append(set(entry for diskUuid in get_filter_keys(values=args.disks, records=cmmds.disks, attribute='deviceId', description='disk')
+				for entry in cmmdsIndex.componentsByDisk.get(diskUuid, ())))
+	if args.states:
+		componentSets.append(set(entry for state in args.states for entry in cmmdsIndex.componentsByState.get(state, ())))
+
+	selectedComponents = None
+	objects = None
+	if componentSets:
+		componentSets.sort(key=len)
+		selectedComponents = componentSets[0].intersection(*componentSets[1:])
+		objects = set(domObject for domObject, component in selectedComponents)
+
+	if args.vms:
+		vmObjects = set()
+		for vmName in args.vms:
+			if vmName not in cmmdsIndex.objectsByVm:
+				print('No VM \'{}\' found'.format(vmName), file=sys.stderr)
+			vmObjects.update(cmmdsIndex.objectsByVm.get(vmName, ()))
+
+		if objects is None:
+			objects = vmObjects
+		else:
+			objects &= vmObjects
+			selectedComponents = set(entry for entry in selectedComponents if entry[0] in objects)
+
+	return objects, selectedComponents
+
+
+def get_summary_rows(selectedComponents) -> list:
+	'''Count the components and the ones not active per host, disk and state
+	Arguments:
+		selectedComponents: set with the (object, component) matching the filters, or None to count the components of all objects output
+	Return:
+		list with (<group>, <name>, <components>, <not active>)'''
+
+	if selectedComponents is None:
+		selectedComponents = [(domObject, component) for domObject in iter_selected_objects() for component in domObject.components]
+	elif args.affected:
+		selectedComponents = [entry for entry in selectedComponents if check_affected(domObject=entry[0])]
+
+	counters = {'Host': dict(), 'Disk': dict(), 'State': dict()}
+	for domObject, component in selectedComponents:
+		disk = cmmds.disks.get(component.diskUuid, unknownDisk)
+		notActive = 1 if component.state != 5 else 0
+		for group, name in (('Host', cmmds.get_hostname(disk.owner)), ('Disk', disk.deviceId + ' (' + cmmds.get_hostname(disk.owner) + ')'), ('State', compStates[component.state])):
+			counter = counters[group].setdefault(name, [0, 0])
+			counter[0] += 1
+			counter[1] += notActive
+
+	return [(group, name, counter[0], counter[1]) for group in ('Host', 'Disk', 'State') for name, counter in sorted(counters[group].items())]
+
+
+def print_summary(selectedComponents):
+	'''Print the number of components and the ones not active per host, disk and state in the output format specified, instead of the overview of the objects'''
+
+	titles = ['Group', 'Name', 'Components', 'Not active']
+	rows = get_summary_rows(selectedComponents=selectedComponents)
+
+	if args.format == 'csv':
+		writer = csv.writer(sys.stdout, lineterminator='\n')
+		writer.writerow(['group', 'name', 'components', 'notActive'])
+		writer.writerows(rows)
+	elif args.format == 'jsonl':
+		for group, name, components, notActive in rows:
+			print(json.dumps({'group': group, 'name': name, 'components': components, 'notActive': notActive}))
+	else:
+		nameWidth = get_max_length([row[1] for row in rows] + [titles[1]])
+		line = '{:<5} | {:<%d} | {:>10} | {:>10}' % nameWidth
+		print(line.format(*titles))
+		print('-' * 6 + '+' + '-' * (nameWidth + 2) + '+' + '-' * 12 + '+' + '-' * 11)
+		for row in rows:
+			print(line.format(*row))
 
 	return True
 
 
-def get_dom_name(entryDomName: dict):
-	'''Get VM name from DOM_NAME entry in CMMDS'''
+def get_disk_columns() -> dict:
+	'''Return the device name and the hostname of each disk, looked up once instead of for every component
+	Return:
+		diskColumns['<disk-uuid>'] = (<device name>, <hostname>)'''
 
-	regexEmptyName = re.compile('.*ufn": "".*')
-	regexDomName = re.compile('.*ufn": "(.+)", "cid": "' + UUID + '".*')
+	diskColumns = dict()
+	for disk in cmmds.disks.values():
+		diskColumns[disk.uuid] = (disk.deviceId, cmmds.get_hostname(disk.owner))
 
-	if re.search(regexEmptyName, entryDomName['content']):
-		domNames[entryDomName['uuid']] = '<none>'
-		return True
+	return diskColumns
 
-	searchResult = re.search(regexDomName, entryDomName['content'])
 
-	if not searchResult:
-		regexDomName = re.compile('.*ufn": "(.+)"}.*')
-		searchResult = re.search(regexDomName, entryDomName['content'])
+def get_component_state(component, stateCache: dict) -> str:
+	'''Return the component state as text, e.g. 'Absent Stale', cached per state and stale flag'''
 
-	if searchResult:
-		domNames[entryDomName['uuid']] = searchResult.group(1)
-	else:
-		domNames[entryDomName['uuid']] = 'Not found'
+	key = (component.state, component.stale)
+	strCompState = stateCache.get(key)
+	if strCompState is None:
+		strCompState = stateCache[key] = compStates[component.state] + (' Stale' if component.stale else '')
 
-	return True
+	return strCompState
+
+
+def render_table(out):
+	'''Write the overview of the objects as a table. The format strings are prepared once and the lines written in batches'''
+
+	columnWidths = get_column_widths()
+	titles = ['vSAN Object UUID', 'Object Type', 'DOM Owner', 'vSAN Component States', 'Capacity Device with Component', 'Host with Component', 'Related VM Name']
+
+	# The '- 2' is to take into account the manually added padding with ' | '
+	header = '{:<%d}| ' % columnWidths[0] + ' | '.join('{:<%d}' % (width - 2) for width in columnWidths[1:6]) + ' | {}\n'
+	separator = '+'.join('-' * width for width in columnWidths) + '\n'
+	firstLine = '{} | ' + ' | '.join('{:<%d}' % (width - 2) for width in columnWidths[1:6]) + ' | {}\n'
+	nextLine = ' ' * (columnWidths[0] + 1 + columnWidths[1] + 1 + columnWidths[2]) + '| ' + ' | '.join('{:<%d}' % (width - 2) for width in columnWidths[3:6]) + ' | \n'
+
+	diskColumns = get_disk_columns()
+	unknownDiskColumns = (unknownDisk.deviceId, cmmds.get_hostname(unknownDisk.owner))
+	stateCache = dict()
+
+	lines = [header.format(*titles), separator]
+	for domObject in iter_selected_objects():
+		objType = objClass[domObject.objClass]
+		ownerHostname = cmmds.get_hostname(domObject.owner)
+		domName = cmmds.get_dom_name(domObject.groupUuid)
+
+		for i, component in enumerate(domObject.components):
+			deviceId, diskHostname = diskColumns.get(component.diskUuid, unknownDiskColumns)
+			strComponent = component.uuid + ' (' + component.type + '): ' + get_component_state(component=component, stateCache=stateCache)
+
+			if i == 0 or args.debug:
+				lines.append(firstLine.format(domObject.uuid, objType, ownerHostname, strComponent, deviceId, diskHostname, domName))
+			else:
+				lines.append(nextLine.format(strComponent, deviceId, diskHostname))
 
+		lines.append(separator)
 
-def get_host(entryHost: dict):
-	'''Get hostname from HOSTNAME entry in CMMDS'''
+		if len(lines) >= outputBatchLines:
+			out.write(''.join(lines))
+			lines = list()
 
-	hosts[entryHost['uuid']] = entryHost['content'].split()[1].lstrip('"').rstrip('"}')
+	out.write(''.join(lines))
 	return True
 
 
-def get_disk(entryDisk: dict):
-	'''Get device ID for a disk and the host UUID it's located in'''
+def iter_component_records():
+	'''Generator that yields one record per component of the objects to output (or per object, if it has no components), for CSV'''
 
-	if not entryDisk['uuid'] in devices.keys():
-		devices[entryDisk['uuid']] = {}
-		devices[entryDisk['uuid']]['hostUuid'] = entryDisk['owner']
+	diskColumns = get_disk_columns()
+	unknownDiskColumns = (unknownDisk.deviceId, cmmds.get_hostname(unknownDisk.owner))
+	stateCache = dict()
 
-	regexDiskInfo = re.compile('"([^"]+)": ["]{0,1}([^",\}]+)')
-	resultDiskInfo = re.findall(regexDiskInfo, entryDisk['content'])
+	for domObject in iter_selected_objects():
+		objectColumns = [domObject.uuid, objClass[domObject.objClass], cmmds.get_hostname(domObject.owner), cmmds.get_dom_name(domObject.groupUuid)]
 
-	for keyValuePair in resultDiskInfo:
-		if keyValuePair[0] == 'devName':
-			devices[entryDisk['uuid']]['deviceId'] = keyValuePair[1]
-			break
+		if not domObject.components:
+			yield objectColumns + ['', '', '', '', '', '']
 
+		for component in domObject.components:
+			deviceId, diskHostname = diskColumns.get(component.diskUuid, unknownDiskColumns)
+			yield objectColumns + [component.uuid, component.type, get_component_state(component=component, stateCache=stateCache), component.diskUuid, deviceId, diskHostname]
+
+
+def render_csv(out):
+	'''Write the overview of the objects as CSV, one line per component'''
+
+	buffer = io.StringIO()
+	writer = csv.writer(buffer, lineterminator='\n')
+	writer.writerow(['objectUuid', 'objectType', 'domOwner', 'vmName', 'componentUuid', 'componentType', 'componentState', 'diskUuid', 'capacityDevice', 'componentHost'])
+
+	for record in iter_component_records():
+		writer.writerow(record)
+
+		if buffer.tell() >= outputBatchSize:
+			out.write(buffer.getvalue())
+			buffer.seek(0)
+			buffer.truncate()
+
+	out.write(buffer.getvalue())
 	return True
 
 
-def get_max_length(stringList: list) -> list:
-	'''Return the length of the longest string in a list'''
+def render_jsonl(out):
+	'''Write the overview of the objects as JSON lines, one line per object with its components'''
 
-	maxLength = 0
+	diskColumns = get_disk_columns()
+	unknownDiskColumns = (unknownDisk.deviceId, cmmds.get_hostname(unknownDisk.owner))
+	stateCache = dict()
+	encoder = json.JSONEncoder()
 
-	for string in stringList:
-		if len(string) > maxLength:
-			maxLength = len(string)
+	lines = list()
+	for domObject in iter_selected_objects():
+		components = list()
+		for component in domObject.components:
+			deviceId, diskHostname = diskColumns.get(component.diskUuid, unknownDiskColumns)
+			components.append({'uuid': component.uuid, 'type': component.type, 'state': get_component_state(component=component, stateCache=stateCache),
+					'diskUuid': component.diskUuid, 'capacityDevice': deviceId, 'host': diskHostname})
 
-	return maxLength
+		lines.append(encoder.encode({'uuid': domObject.uuid, 'type': objClass[domObject.objClass], 'domOwner': cmmds.get_hostname(domObject.owner),
+				'vmName': cmmds.get_dom_name(domObject.groupUuid), 'components': components}) + '\n')
 
+		if len(lines) >= outputBatchLines:
+			out.write(''.join(lines))
+			lines = list()
 
-def get_nested_dict_values(nestedDict: dict, subkey: str) -> list:
-	'''Get the values from a nested dictionary for a particular subkey and return the values as a list'''
+	out.write(''.join(lines))
+	return True
 
-	valuesList = list()
 
-	for key in nestedDict.keys():
-		valuesList.append(nestedDict[key][subkey])
+def get_disk_description(cmmdsModel, diskUuid: str) -> str:
+	'''Return the device name and hostname of a disk, e.g. naa.xxx:2 (esxi01)'''
 
-	return valuesList
+	disk = cmmdsModel.disks.get(diskUuid, unknownDisk)
+	return disk.deviceId + ' (' + cmmdsModel.get_hostname(disk.owner) + ')'
 
 
-def print_objects_overview():
-	'''Print a table with the overview of the objects'''
+def get_change_row(change, oldModel) -> list:
+	'''Return the columns of a difference between the CMMDS model of the older CMMDS dump and the current one
+	Arguments:
+		change: vsancmmdsfunctions.CmmdsChange
+		oldModel: CMMDS model of the older CMMDS dump
+	Return:
+		[<change>, <object UUID>, <component UUID>, <before>, <after>, <related VM name>]'''
+
+	old = new = ''
+	if change.kind == 'Object added':
+		new = '{}, {} components'.format(objClass[change.new.objClass], len(change.new.components))
+	elif change.kind == 'Object removed':
+		old = '{}, {} components'.format(objClass[change.old.objClass], len(change.old.components))
+	elif change.kind == 'Owner changed':
+		old = oldModel.get_hostname(change.old)
+		new = cmmds.get_hostname(change.new)
+	elif change.kind == 'Component added':
+		new = '{}: {} on {}'.format(change.new.type, compStates[change.new.state] + (' Stale' if change.new.stale else ''), get_disk_description(cmmds, change.new.diskUuid))
+	elif change.kind == 'Component removed':
+		old = '{}: {} on {}'.format(change.old.type, compStates[change.old.state] + (' Stale' if change.old.stale else ''), get_disk_description(oldModel, change.old.diskUuid))
+	elif change.kind == 'State changed':
+		old = compStates[change.old[0]] + (' Stale' if change.old[1] else '')
+		new = compStates[change.new[0]] + (' Stale' if change.new[1] else '')
+	elif change.kind == 'Component moved':
+		old = get_disk_description(oldModel, change.old)
+		new = get_disk_description(cmmds, change.new)
+
+	if change.objectUuid in cmmds.objects:
+		vmName = cmmds.get_dom_name(cmmds.objects[change.objectUuid].groupUuid)
+	else:
+		vmName = oldModel.get_dom_name(oldModel.objects[change.objectUuid].groupUuid)
 
-	hostnameColWidth = get_max_length(hosts.values()) + 2
+	return [change.kind, change.objectUuid, change.componentUuid or '', old, new, vmName]
 
-	deviceIdColWidth = get_max_length(get_nested_dict_values(nestedDict=devices, subkey='deviceId')) + 2
-	if deviceIdColWidth < 32:
-		deviceIdColWidth = 32
 
-	columnWidths = [37, 18, hostnameColWidth, 65, deviceIdColWidth, hostnameColWidth, 27]
-
-	def print_header(columnWidths: list):
-		columnTitle0 = 'vSAN Object UUID'
-		columnTitle1 = 'Object Type'
-		columnTitle2 = 'DOM Owner'
-		columnTitle3 = 'vSAN Component States'
-		columnTitle4 = 'Capacity Device with Component'
-		columnTitle5 = 'Host with Component'
-		columnTitle6 = 'Related VM Name'
-
-		padding0 = columnWidths[0] - len(columnTitle0)
-		padding1 = columnWidths[1] - len(columnTitle1) - 2 # the '- 2' at the end is to take into account the manually added padding with ' | '
-		padding2 = columnWidths[2] - len(columnTitle2) - 2
-		padding3 = columnWidths[3] - len(columnTitle3) - 2
-		padding4 = columnWidths[4] - len(columnTitle4) - 2
-		padding5 = columnWidths[5] - len(columnTitle5) - 2
-
-		print(columnTitle0 + ' ' * padding0 + '| '
-			+ columnTitle1 + ' ' * padding1 + ' | '
-			+ columnTitle2 + ' ' * padding2 + ' | '
-			+ columnTitle3 + ' ' * padding3 + ' | '
-			+ columnTitle4 + ' ' * padding4 + ' | '
-			+ columnTitle5 + ' ' * padding5 + ' | '
-			+ columnTitle6)
+def print_cmmds_diff(oldModel):
+	'''Print what changed between the CMMDS model of the older CMMDS dump and the current one in the output format specified
+	Arguments:
+		oldModel: CMMDS model of the older CMMDS dump'''
+
+	changes = vsancmmdsfunctions.diff_cmmds_models(oldModel=oldModel, newModel=cmmds)
+	rows = [get_change_row(change=change, oldModel=oldModel) for change in changes]
+	titles = ['Change', 'vSAN Object UUID', 'vSAN Component UUID', 'Before', 'After', 'Related VM Name']
+
+	if args.format == 'csv':
+		buffer = io.StringIO()
+		writer = csv.writer(buffer, lineterminator='\n')
+		writer.writerow(['change', 'objectUuid', 'componentUuid', 'before', 'after', 'vmName'])
+		writer.writerows(rows)
+		sys.stdout.write(buffer.getvalue())
 		return True
 
-	def print_separator(columnWidths: list):
-		print('-' * columnWidths[0] + '+'
-			+ '-' * columnWidths[1] + '+'
-			+ '-' * columnWidths[2] + '+'
-			+ '-' * columnWidths[3] + '+'
-			+ '-' * columnWidths[4] + '+'
-			+ '-' * columnWidths[5] + '+'
-			+ '-' * columnWidths[6])
+	if args.format == 'jsonl':
+		encoder = json.JSONEncoder()
+		sys.stdout.write(''.join(encoder.encode(dict(zip(['change', 'objectUuid', 'componentUuid', 'before', 'after', 'vmName'], row))) + '\n' for row in rows))
 		return True
 
-	def print_object(columnWidths: list, objUuid: str):
-		firstLine = True
-
-		for compUuid in objects[objUuid]['components'].keys():
-			strCompState = compStates[int(objects[objUuid]['components'][compUuid]['componentState'])]
-			if objects[objUuid]['components'][compUuid]['stale']:
-				strCompState += ' Stale'
-
-			diskUuid = objects[objUuid]['components'][compUuid]['diskUuid']
-			if not diskUuid in devices:
-				diskUuid = '00000000-0000-0000-0000-000000000000'
-
-			padding1 = columnWidths[1] - len(objClass[int(objects[objUuid]['objClass'])]) - 2
-			padding2 = columnWidths[2] - len(hosts[objects[objUuid]['owner']]) - 2
-			padding3 = columnWidths[3] - len(compUuid) - len(objects[objUuid]['components'][compUuid]['type'])- 5 - len(strCompState) - 2 # the first '- 5' is for the strings ' (' and  '): '
-			padding4 = columnWidths[4] - len(devices[diskUuid]['deviceId']) - 2
-			padding5 = columnWidths[5] - len(hosts[devices[diskUuid]['hostUuid']]) - 2
-
-			if firstLine or args.debug:
-				try:
-					domName = domNames[objects[objUuid]['groupUuid']]
-				except:
-					domName = 'Not found'
-
-				print(objUuid + ' | '
-					+ objClass[int(objects[objUuid]['objClass'])] + ' ' * padding1 + ' | '
-					+ hosts[objects[objUuid]['owner']] + ' ' * padding2 + ' | '
-					+ compUuid + ' (' + objects[objUuid]['components'][compUuid]['type'] + '): ' + strCompState + ' ' * padding3 + ' | '
-					+ devices[diskUuid]['deviceId'] + ' ' * padding4 + ' | '
-					+ hosts[devices[diskUuid]['hostUuid']] + ' ' * padding5 + ' | '
-					+ domName)
-				firstLine = False
-			else:
-				#linePadding = len(objUuid + ' | ' + objClass[int(objects[objUuid]['objClass'])] + ' ' * padding1)
-				linePadding = columnWidths[0] + 1 + columnWidths[1] + 1 + columnWidths[2] # '+ 1' is for the '|'
-				padding3 = columnWidths[3] - len(compUuid) - len(objects[objUuid]['components'][compUuid]['type']) - 5 - len(strCompState) - 2 # the first '- 5' is for the strings ' (' and  '): '
-				print(' ' * linePadding + '| '
-					+ compUuid + ' (' + objects[objUuid]['components'][compUuid]['type'] + '): ' + strCompState + ' ' * padding3 + ' | '
-					+ devices[diskUuid]['deviceId'] + ' ' * padding4 + ' | '
-					+ hosts[devices[diskUuid]['hostUuid']] + ' ' * padding5 + ' | ')
+	maxLengths = [get_max_length([row[i] for row in rows] + [titles[i]]) for i in range(5)]
+	line = ' | '.join('{:<%d}' % length for length in maxLengths) + ' | {}\n'
+	separator = '-' * (maxLengths[0] + 1) + '+' + '+'.join('-' * (length + 2) for length in maxLengths[1:]) + '+' + '-' * 27 + '\n'
 
-		return True
+	lines = [line.format(*titles), separator] + [line.format(*row) for row in rows] + [separator]
+	counts = dict((kind, 0) for kind in vsancmmdsfunctions.cmmdsChangeKinds)
+	for change in changes:
+		counts[change.kind] += 1
+	lines.append(', '.join('{}: {}'.format(kind, count) for kind, count in counts.items()) + '\n')
+	sys.stdout.write(''.join(lines))
 
-	def check_affected(objUuid: str):
-		for compUuid in objects[objUuid]['components'].keys():
-			if int(objects[objUuid]['components'][compUuid]['componentState']) != 5:
-				return True
+	return True
 
-		return False
 
-	print_header(columnWidths=columnWidths)
-	print_separator(columnWidths=columnWidths)
+def print_objects_overview():
+	'''Print the overview of the objects in the output format specified'''
 
-	for objUuid in objects.keys():
-		if args.affected:
-			if check_affected(objUuid=objUuid):
-				print_object(columnWidths=columnWidths, objUuid=objUuid)
-				print_separator(columnWidths=columnWidths)
-		else:
-			print_object(columnWidths=columnWidths, objUuid=objUuid)
-			print_separator(columnWidths=columnWidths)
+	renderers = {'table': render_table, 'csv': render_csv, 'jsonl': render_jsonl}
+
+	renderers[args.format](out=sys.stdout)
 
 	return True
 
@@ -366,20 +503,47 @@ def print_objects_overview():
 def main():
 	'''Main function'''
 
-	cmmdsDump = '/tmp/cmmds.json'
-
-	if args.cmmds:
-		cmmdsDumpOrig = args.cmmds
+	global selectedObjects
+
+	# Component states are specified by name, but indexed by number
+	if args.states:
+		stateNames = dict((name.lower(), state) for state, name in enumerate(compStates))
+		for state in args.states:
+			if state.lower() not in stateNames:
+				parser.error('unknown component state \'{}\', use one of: {}'.format(state, ', '.join(compStates)))
+		args.states = [stateNames[state.lower()] for state in args.states]
+
+	# On a live ESXi CMMDS is queried directly through pyCMMDS where possible. A dump freshly created with cmmds-tool is never the same twice, so only a given CMMDS dump is cached
+	pyCMMDS = None
+	if not args.cmmds and not args.cmmdsTool:
+		pyCMMDS = vsancmmdsfunctions.import_pycmmds()
+
+	if pyCMMDS:
+		call_pycmmds_query(pyCMMDS=pyCMMDS)
+	elif args.cmmds:
+		call_cmmds_parser(cmmdsDump=args.cmmds, useCache=args.useCache)
 	else:
-		cmmdsDumpOrig = '/tmp/cmmdsDump.txt'
-		create_cmmds_dump(cmmdsDumpOutput=cmmdsDumpOrig)
-
-	if fix_cmmds_dump(cmmdsDumpInput=cmmdsDumpOrig, cmmdsDumpOutput=cmmdsDump):
+		cmmdsDump = '/tmp/cmmdsDump.txt'
+		create_cmmds_dump(cmmdsDumpOutput=cmmdsDump)
 		call_cmmds_parser(cmmdsDump=cmmdsDump)
-	else:
-		sys.exit('Function to rectify ending of the CMMDS dump file didn\'t run successfully. Exiting.')
 
-	print_objects_overview()
+	selectedComponents = None
+	if args.hosts or args.disks or args.vms or args.states:
+		selectedObjects, selectedComponents = select_objects(cmmdsIndex=vsancmmdsfunctions.CmmdsIndex(cmmdsModel=cmmds))
+
+	try:
+		if args.diff:
+			oldModel = vsancmmdsfunctions.CmmdsModel()
+			call_cmmds_parser(cmmdsDump=args.diff, useCache=args.useCache, cmmdsModel=oldModel)
+			print_cmmds_diff(oldModel=oldModel)
+		elif args.summary:
+			print_summary(selectedComponents=selectedComponents)
+		else:
+			print_objects_overview()
+		sys.stdout.flush()
+	except BrokenPipeError:
+		# The reading end (e.g. head) is gone, don't complain about it again on exit
+		os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
 
 	return True
 
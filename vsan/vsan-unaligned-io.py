@@ -2,12 +2,10 @@
 #
 # Written by Manuel Moser (moserm)
 
-import sys, os, re, json
-import mimetypes, time
+import sys, os, re
+import mimetypes
 from argparse import ArgumentParser
-from datetime import datetime
 from glob import glob
-from decimal import *
 
 import vsancmmdsfunctions
 import vsantracefunctions
@@ -22,7 +20,7 @@ parser = ArgumentParser()
 
 argGrpMain = parser.add_mutually_exclusive_group(required=False)
 argGrpMain.add_argument('-f', '--file', metavar='vsantraces.txt', dest='trace', default='.',
-		help='specify vSAN trace file to process')
+		help='specify vSAN trace file to process (plain text or gzip-compressed)')
 argGrpMain.add_argument('-d', '--dir', metavar='vsan-trace-directory', nargs='+', dest='trace', default='.',
 		help='specify vSAN trace directory to process')
 
@@ -34,6 +32,18 @@ parser.add_argument('-t', '--top', dest='top', action='store_true', default=Fals
 		help='list top 10 objects with unaligned IOs and their related VM names')
 parser.add_argument('-c', '--cmmds', metavar='cmmds/cmmds-tool_find--f-python.txt', nargs='?', dest='cmmds', default='cmmds/cmmds-tool_find--f-python.txt',
 		help='path to the CMMDS dump. Use this in conjunction with -t|--top. Default value is \'cmmds/cmmds-tool_find--f-python.txt\'')
+parser.add_argument('-j', '--jobs', metavar='N', dest='jobs', type=int, default=1,
+		help='number of worker processes to scan the vSAN trace files and decode the CMMDS dump with. Large trace files are split into byte ranges. Default value is 1')
+parser.add_argument('--raw', dest='keepRaw', action='store_true', default=False,
+		help='keep the RMW trace messages and add them to the results file (uses considerably more memory)')
+parser.add_argument('--cache-dir', metavar='DIR', dest='cacheDir', default=None,
+		help='directory for the cache of the parsed vSAN trace files and CMMDS dump. By default a hidden directory next to each vSAN trace file and the CMMDS dump is used')
+parser.add_argument('--no-cache', dest='useCache', action='store_false', default=True,
+		help='neither read from nor write to the cache of the parsed vSAN trace files and CMMDS dump')
+parser.add_argument('--clear-cache', dest='clearCache', action='store_true', default=False,
+		help='remove the cache files of the specified vSAN trace files and CMMDS dump before processing them')
+parser.add_argument('--line-scan', dest='scanBytes', action='store_false', default=True,
+		help='decode and check every line of the vSAN trace files, instead of searching the raw (memory-mapped) bytes and only decoding matching lines')
 #parser.add_argument('-r', '--rmw', dest='allRmw', action='store_true', default=False,
 #		help='output all found RMW IOs; by default only unaligned IOs (non 4K aligned) are written to the output')
 
@@ -41,12 +51,9 @@ args = parser.parse_args()
 
 
 # General variables
-rmwIos = dict()					# Structure: rmwIos['<opID>']['rmw|startDate|startTime|startTS|startEpoch|endDate|endTime|endTS|lat|obj|len']
-topAffObjects = dict()				# Structure: topAffObjects['<object-uuid>']['amount|groupUuid']
-objects = dict()				# Structure: objects['<uuid>']['owner|objClass|groupUuid|components']
-						#            objects['<uuid>']['components']['<component-uuid>']['componentState|stale|diskUuid']
-domNames = dict()				# Structure: domNames['<groupUuid>'] = <domName>
-domNames['0'] = 'Not in CMMDS'
+rmwIos = vsantracefunctions.RmwIoStore(keepRaw=args.keepRaw)	# Columns: rmwIos.opIds|lengths|objIdxs|starts|ends -> starts and ends as integers in microseconds
+topAffObjects = list()				# Structure: topAffObjects = [(<object-uuid>, <amount>, <groupUuid>), ...] -> groupUuid is None if the object isn't in CMMDS
+cmmds = vsancmmdsfunctions.CmmdsModel()		# Structure: cmmds.objects|domNames|hosts|disks['<uuid>'] = CmmdsDomObject|CmmdsDomName|CmmdsHost|CmmdsDisk
 resultsFile = 'results-vsan-unaligned-ios.txt'
 
 args.allRmw = False
@@ -55,109 +62,35 @@ args.allRmw = False
 ## Functions
 #
 def search_rmw_io(vsanTraceFiles: dict):
-	'''Search for RMW (readModifyWrite) IO that was created from writeWithBlkAttr5 in the vSAN trace files'''
+	'''Search for RMW (readModifyWrite) IO that was created from writeWithBlkAttr5 in the vSAN trace files and calculate its latency.
+	The trace files are only scanned once, the RMW messages and the start/completion of the IO are matched up by opId.
+	Trace files that haven't changed since a previous run are taken from the cache instead.'''
 
-	regexRmw = re.compile('\[(?P<opId>[0-9a-z]+) p:[A-Z]+ p:writeWithBlkAttr5 c:[A-Z]+ c:readModifyWrite.+length-[0-9]{2}.: (?P<length>[0-9]+)\}')
+	if args.clearCache:
+		removed = vsantracefunctions.clear_rmw_cache(vsanTraceFiles=vsanTraceFiles, cacheDir=args.cacheDir)
+		print('Removed {} cache files'.format(removed))
 
-	for vsanTraceFile in vsanTraceFiles.keys():
-		for vsanTraceMessage in vsanTraceFiles[vsanTraceFile]:
-			resultRmw = regexRmw.search(vsanTraceMessage)
-			if resultRmw:
-				rmwIos[resultRmw.group('opId')] = dict()
-				rmwIos[resultRmw.group('opId')]['rmw'] = vsanTraceMessage
-				rmwIos[resultRmw.group('opId')]['len'] = resultRmw.group('length')
+	rmwOps = vsantracefunctions.scan_rmw_io_files(vsanTraceFiles=vsanTraceFiles, jobs=args.jobs, keepRaw=args.keepRaw, useCache=args.useCache, cacheDir=args.cacheDir, scanBytes=args.scanBytes)
+	rmwIos.add_rmw_ops(rmwOps=rmwOps)
 
 	return True
 
 
-def calcuate_rmw_io_latency(vsanTraceFiles: dict):
-	'''Calculate the latency of the RMW IO'''
-
-	unalignedIoOpIds = ''
-	for opId in rmwIos.keys():
-		unalignedIoOpIds = unalignedIoOpIds + '|' + opId
-		unalignedIoOpIds = unalignedIoOpIds.lstrip('|')
-
-	regexUnalignedIoStartEnd = re.compile('(?P<date>[0-9]{4}-[0-9]{2}-[0-9]{2})T(?P<time>[0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{6}).+\[(?P<opId>' + unalignedIoOpIds + ').+writeWithBlkAttr5.+(?P<stage>DOMTraceOperationSendRequestToServer|DOMTraceOperationSendRequestToServerCompleted):.+objUuid.: .(?P<object>[0-9a-z]{8}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{12}).+')
-
-	timestampFormat = '%Y-%m-%d %H:%M:%S.%f'
-
-	def store_timestamp(opId: str, tsType: str, ioDate: str, ioTime: str):
-		if tsType == 'start':
-			rmwIos[opId]['startDate'] = ioDate
-			rmwIos[opId]['startTime'] = ioTime
-			rmwIos[opId]['startTS'] = ioDate + 'T' + ioTime
-			rmwIos[opId]['startEpoch'] = int(time.mktime(time.strptime(ioDate + ' ' + ioTime, timestampFormat)))
-		elif tsType == 'end':
-			rmwIos[opId]['endDate'] = ioDate
-			rmwIos[opId]['endTime'] = ioTime
-			rmwIos[opId]['endTS'] = ioDate + 'T' + ioTime
-		else:
-			print('Error: unknown timestamp type')
-		return True
-
-	for vsanTraceFile in vsanTraceFiles.keys():
-		for vsanTraceMessage in vsanTraceFiles[vsanTraceFile]:
-			resultUnalignedIoStartEnd = regexUnalignedIoStartEnd.search(vsanTraceMessage)
-			if resultUnalignedIoStartEnd:
-				if resultUnalignedIoStartEnd.group('stage') == 'DOMTraceOperationSendRequestToServer':
-					tsType = 'start'
-				elif resultUnalignedIoStartEnd.group('stage') == 'DOMTraceOperationSendRequestToServerCompleted':
-					tsType = 'end'
-				else:
-					print('Something went wrong. Regex matched, but for some reason it\'s unknown whether it\'s start or end of the IO')
-
-				store_timestamp(opId=resultUnalignedIoStartEnd.group('opId'), tsType=tsType, ioDate=resultUnalignedIoStartEnd.group('date'), ioTime=resultUnalignedIoStartEnd.group('time'))
-
-				rmwIos[resultUnalignedIoStartEnd.group('opId')]['obj'] = resultUnalignedIoStartEnd.group('object')
-
-	for opId in list(rmwIos.keys()):
-		if not 'startDate' in rmwIos[opId].keys() or not 'endTime' in rmwIos[opId].keys():
-			del rmwIos[opId]
-			continue
-
-		timestampStart = datetime.strptime(rmwIos[opId]['startDate'] + ' ' + rmwIos[opId]['startTime'], timestampFormat)
-		timestampEnd = datetime.strptime(rmwIos[opId]['endDate'] + ' ' + rmwIos[opId]['endTime'], timestampFormat)
-		rmwIos[opId]['lat'] = timestampEnd - timestampStart
-
-	return True
-
-
-def identify_unaligned_io(io: dict):
-	'''Checks whether an IO is 4K aligned and returns True or False accordingly'''
-
-	ioLength = Decimal(str(io['len']))
-	if '.' in str(ioLength / 4096):
-		return True
-	else:
-		return False
-
-
 def call_cmmds_parser(cmmdsDump: str):
 	'''Call CMMDS parse routine
 	Arguments:
 		cmmdsDump: path to the CMMDS dump that's to be parsed'''
 
-	fhCmmds = open(cmmdsDump, 'r')
-	cmmds = json.load(fhCmmds)
-	fhCmmds.close()
-	parse_cmmds(cmmds=cmmds)
-	os.remove(cmmdsDump)
-	return True
-
+	if not os.path.isfile(cmmdsDump):
+		sys.exit('CMMDS dump file not found: %s' % cmmdsDump)
 
-def parse_cmmds(cmmds):
-	'''Parse CMMDS dump and call respective functions for the required entries'''
+	if args.clearCache:
+		vsancmmdsfunctions.clear_cmmds_cache(cmmdsDump=cmmdsDump, cacheDir=args.cacheDir)
 
-	for entry in cmmds:
-		if entry['type'] == 'DOM_OBJECT':
-			objUuid, objDetails = vsancmmdsfunctions.get_object_info(entryDomObject=entry)
-			objects[objUuid] = objDetails
-			continue
-		if entry['type'] == 'DOM_NAME':
-			domNameUuid, domName = vsancmmdsfunctions.get_dom_name(entryDomName=entry)
-			domNames[domNameUuid] = domName
-			continue
+	try:
+		vsancmmdsfunctions.load_cmmds_dump(cmmdsDump=cmmdsDump, cmmdsModel=cmmds, useCache=args.useCache, cacheDir=args.cacheDir, jobs=args.jobs)
+	except ValueError as e:
+		sys.exit('Failed to parse CMMDS dump %s: %s' % (cmmdsDump, e))
 
 	return True
 
@@ -165,30 +98,15 @@ def parse_cmmds(cmmds):
 def process_top_affected_objects():
 	'''Process top affected objects, which requires processing the CMMDS dump as well, to get the related VM names'''
 
-	cmmdsDumpOrig = args.cmmds
-	cmmdsDump = '/tmp/cmmds.json'
-
-	if vsancmmdsfunctions.fix_cmmds_dump(cmmdsDumpInput=cmmdsDumpOrig, cmmdsDumpOutput=cmmdsDump):
-		call_cmmds_parser(cmmdsDump=cmmdsDump)
-	else:
-		sys.exit('Function to rectify ending of the CMMDS dump file didn\'t run successfully. Exiting.')
-
-	for unalignedIo in rmwIos.keys():
-		if not identify_unaligned_io(io=rmwIos[unalignedIo]):
-			continue
-
-		objUuid = rmwIos[unalignedIo]['obj']
+	call_cmmds_parser(cmmdsDump=args.cmmds)
 
-		if objUuid in topAffObjects.keys():
-			topAffObjects[objUuid]['amount'] += 1
+	for objUuid, amount in rmwIos.top_objects(rows=rmwIos.rows(unalignedOnly=True), top=10):
+		if objUuid in cmmds.objects:
+			groupUuid = cmmds.objects[objUuid].groupUuid
 		else:
-			topAffObjects[objUuid] = dict()
-			topAffObjects[objUuid]['amount'] = 1
+			groupUuid = None
 
-			if objUuid in objects.keys():
-				topAffObjects[objUuid]['groupUuid'] = objects[objUuid]['groupUuid']
-			else:
-				topAffObjects[objUuid]['groupUuid'] = '0'
+		topAffObjects.append((objUuid, amount, groupUuid))
 
 	return True
 
@@ -196,21 +114,16 @@ def process_top_affected_objects():
 def output_top_affected_objects():
 	'''Output the 10 objects with the highest amount of unaligned IOs and their related VM names'''
 
-	i = 0
-	top = 10
-
 	print(' Number of Unaligned IOs | Object UUID                          | Related VM')
 	print('-------------------------+--------------------------------------+------------')
 
-	for objUuid in sorted(topAffObjects, key=lambda x: topAffObjects[x]['amount'], reverse=True):
-		if not i < top:
-			break
-
-		paddingIo = 24 - len(str(topAffObjects[objUuid]['amount']))
-
-		print(' ' * paddingIo + str(topAffObjects[objUuid]['amount']) + ' | ' + objUuid + ' | ' + domNames[topAffObjects[objUuid]['groupUuid']])
+	for objUuid, amount, groupUuid in topAffObjects:
+		if groupUuid is None:
+			domName = 'Not in CMMDS'
+		else:
+			domName = cmmds.get_dom_name(groupUuid)
 
-		i += 1
+		print(str(amount).rjust(24) + ' | ' + objUuid + ' | ' + domName)
 
 	return True
 
@@ -220,46 +133,43 @@ def output_findings():
 
 	fhResults = open(resultsFile, 'w')
 
-	def convert_timeformat_to_units(timestamp: str) -> str:
-		'''Convert "0:00:00.000908" timestamp to the following format (omitting 0 values, though): 0h 00min 00s 000ms 908us
+	def convert_timeformat_to_units(latencyUs: int) -> str:
+		'''Convert a latency in microseconds to the following format (omitting 0 values, though): 0h 00min 00s 000ms 908us
 		Resulting string length is 24 characters'''
 
-		hours, minutes, seconds = str(timestamp).split(':')
-		seconds, microseconds = seconds.split('.')
-		milliseconds = microseconds[0:3]
-		microseconds = microseconds[3:6]
+		milliseconds, microseconds = divmod(abs(latencyUs), 1000)
+		seconds, milliseconds = divmod(milliseconds, 1000)
+		minutes, seconds = divmod(seconds, 60)
+		hours, minutes = divmod(minutes, 60)
 
-		strLatency = microseconds + 'us'
+		strLatency = '%03dus' % microseconds
 
-		if int(milliseconds) != 0:
-			strLatency = milliseconds.lstrip('0') + 'ms ' + strLatency
+		if milliseconds != 0:
+			strLatency = str(milliseconds) + 'ms ' + strLatency
 
-		if int(seconds) != 0 :
-			strLatency = seconds.lstrip('0') + 's ' + strLatency
+		if seconds != 0:
+			strLatency = str(seconds) + 's ' + strLatency
 
-		if int(minutes) != 0:
-			strLatency = minutes.lstrip('0') + 'min ' + strLatency
+		if minutes != 0:
+			strLatency = str(minutes) + 'min ' + strLatency
 
-		if int(hours) != 0:
-			strLatency = hours + 'h ' + strLatency
+		if hours != 0:
+			strLatency = str(hours) + 'h ' + strLatency
 
-		while len(strLatency) < 24:
-			strLatency = ' ' + strLatency
+		if latencyUs < 0:
+			strLatency = '-' + strLatency
 
-		return strLatency
+		return strLatency.rjust(24)
 
-	def output_io(opId: str, io: dict, fhOutput):
-		if not args.allRmw:
-			if not identify_unaligned_io(io=io):
-				return False
+	def output_io(row: int, fhOutput):
+		outputStr = '{opId} | {length:>6} | {uuid} | {tsStart} | {tsEnd} | {latency}\n'
 
-		outputStr = '{opId} | {length} | {uuid} | {tsStart} | {tsEnd} | {latency}\n'
-		ioLength = io['len']
+		fhOutput.write(outputStr.format(opId=rmwIos.opIds[row], length=rmwIos.lengths[row], uuid=rmwIos.obj(row), tsStart=vsantracefunctions.format_trace_timestamp(rmwIos.starts[row]),
+				tsEnd=vsantracefunctions.format_trace_timestamp(rmwIos.ends[row]), latency=convert_timeformat_to_units(rmwIos.latency(row))))
 
-		while len(ioLength) < 6:
-			ioLength = ' ' + ioLength
+		if rmwIos.keepRaw:
+			fhOutput.write('\t' + rmwIos.rawMessages[row].rstrip('\n') + '\n')
 
-		fhOutput.write(outputStr.format(opId=opId, length=ioLength, uuid=io['obj'], tsStart=io['startTS'], tsEnd=io['endTS'], latency=convert_timeformat_to_units(io['lat'])))
 		return True
 
 	fhResults.write(' Op ID   | Length | Object UUID                          | Start Time                 | End Time                   | Total Latency\n')
@@ -268,10 +178,10 @@ def output_findings():
 	if args.sortByLatency:
 		sortBy = 'lat'
 	else:
-		sortBy = 'startEpoch'
+		sortBy = 'start'
 
-	for unalignedIo in sorted(rmwIos, key=lambda x: rmwIos[x][sortBy], reverse=True):
-		output_io(opId=unalignedIo, io=rmwIos[unalignedIo], fhOutput=fhResults)
+	for row in rmwIos.sorted_rows(rows=rmwIos.rows(unalignedOnly=not args.allRmw), sortBy=sortBy, reverse=True):
+		output_io(row=row, fhOutput=fhResults)
 
 	fhResults.close()
 	os.chmod(resultsFile, 0o666)
@@ -292,20 +202,11 @@ def plot_graph_matplotlib():
 
 	print('Plotting graph...')
 
-	def convert_time_to_microseconds(timestamp: str) -> str:
-		hours, minutes, seconds = timestamp.split(':')
-		seconds, microseconds = seconds.split('.')
-		milliseconds = int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000
-		microsecondsTotal = milliseconds * 1000 + int(microseconds)
-		return microsecondsTotal
-
 	# Create list of timestamps for x-axis and latencies for y-axis
-	for io in sorted(rmwIos, key=lambda x: rmwIos[x]['startEpoch']):
-		timestamp = rmwIos[io]['startDate'] + ' ' + rmwIos[io]['startTime']
+	for row in rmwIos.sorted_rows(rows=rmwIos.rows()):
+		timestamp = vsantracefunctions.format_trace_timestamp(rmwIos.starts[row], separator=' ')
 		timestamps.append(timestamp)
-
-		latencyUs = convert_time_to_microseconds(str(rmwIos[io]['lat']))
-		latencies.append(latencyUs)
+		latencies.append(rmwIos.latency(row))
 
 	df = pandas.DataFrame({'time': timestamps, 'latency': latencies})
 	pyplot.figure(figsize=(20,10)) # Figure size in inches
@@ -333,27 +234,11 @@ def plot_graph():
 
 	print('Plotting graph...')
 
-	def convert_time_to_microseconds(timestamp):
-		hours, minutes, seconds = timestamp.split(':')
-		seconds, microseconds = seconds.split('.')
-		milliseconds = int(hours) * 3600000 + int(minutes) * 60000 + int(seconds) * 1000
-		microsecondsTotal = milliseconds * 1000 + int(microseconds)
-		return microsecondsTotal
-
-	def add_data_point(ioOpId: str):
-		timestamp = rmwIos[ioOpId]['startDate'] + ' ' + rmwIos[ioOpId]['startTime']
-		timestamps.append(timestamp)
-		latencyUs = convert_time_to_microseconds(str(rmwIos[ioOpId]['lat']))
-		latencies.append(latencyUs)
-		return True
-
 	# Create list of timestamps for x-axis and latencies for y-axis
-	for io in sorted(rmwIos, key=lambda x: rmwIos[x]['startEpoch']):
-		if args.allRmw:
-			add_data_point(ioOpId=io)
-		else:
-			if identify_unaligned_io(io=rmwIos[io]):
-				add_data_point(ioOpId=io)
+	for row in rmwIos.sorted_rows(rows=rmwIos.rows(unalignedOnly=not args.allRmw)):
+		timestamp = vsantracefunctions.format_trace_timestamp(rmwIos.starts[row], separator=' ')
+		timestamps.append(timestamp)
+		latencies.append(rmwIos.latency(row))
 
 	seaborn.set()
 	df = pandas.DataFrame({'time': timestamps, 'latency': latencies})
@@ -395,10 +280,8 @@ def get_srviwer_url(fileName):
 
 def main():
 	vsanTraceFiles = vsantracefunctions.process_trace_file_arg(vsanTraceArg=args.trace, traceFilePrefix='vsantraces--')
-	vsanTraceFiles = vsantracefunctions.read_in_vsan_trace_files(vsanTraceFiles=vsanTraceFiles)
 
 	search_rmw_io(vsanTraceFiles=vsanTraceFiles)
-	calcuate_rmw_io_latency(vsanTraceFiles=vsanTraceFiles)
 	output_findings()
 
 	if args.top:
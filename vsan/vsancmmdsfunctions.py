@@ -2,129 +2,1013 @@
 #
 # Written by Manuel Moser (moserm)
 
-import os, re
+import sys, os, re, gc, json, time, hashlib, multiprocessing, struct
+from array import array
+from collections import deque
+from itertools import islice
 
 #
 ## General variables
 #
 
 UUID = '[0-9a-z]{8}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{12}'
+cmmdsChunkSize = 1024 * 1024		# Number of characters read at once from the CMMDS dump
+cmmdsIncompleteMargin = 16		# An entry that fails to decode this close to the end of the buffer may just be cut off, e.g. in "false" or a \uXXXX escape
+cmmdsEntryTypes = ('DOM_OBJECT', 'DOM_NAME', 'HOSTNAME', 'DISK')	# CMMDS entry types the model is made of
+cmmdsDecodeBatchSize = 1000		# Number of CMMDS entries handed to a worker process at once
+cmmdsModelVersion = 1			# Increase whenever the decoding changes, so existing cache files are invalidated
+cmmdsCacheMagic = b'VSANCMMC'
+cmmdsCacheDirName = '.vsan-cmmds-cache'
+cmmdsChangeKinds = ('Object added', 'Object removed', 'Owner changed', 'Component added', 'Component removed', 'State changed', 'Component moved')
+nameCacheFile = '/tmp/vsan-name-cache.json'	# Default location of the cache for the names of the objects
+nameCacheTtl = 3600			# Number of seconds an entry in the name cache is valid
+nameCacheVersion = 1
+nameCacheBulkThreshold = 256		# With more cache misses than this, all entries are fetched in one pass instead of looking up each one
+
+# Patterns for CMMDS entry content that isn't valid JSON
+regexKeyValue = re.compile(r'"([^"]+)": ["]{0,1}([^",\}]+)')
+regexDomNameEmpty = re.compile(r'ufn": ""')
+regexDomNameCid = re.compile(r'.*ufn": "(.+)", "cid": "' + UUID + '".*')
+regexDomNameNoCid = re.compile(r'.*ufn": "(.+)"}.*')
+regexHostname = re.compile(r'"hostname": "([^"]*)"')
+
+
+#
+## Classes
+#
+class CmmdsComponent:
+	'''vSAN component of a DOM_OBJECT entry
+	uuid: component UUID
+	type: component type, e.g. Component or Witness
+	state: component state as integer, e.g. 5 for Active
+	stale: whether the component has a stale CSN
+	diskUuid: UUID of the capacity disk the component is located on'''
+
+	__slots__ = ('uuid', 'type', 'state', 'stale', 'diskUuid')
+
+	def __init__(self, uuid: str, type: str, state: int, stale: bool, diskUuid: str):
+		self.uuid = uuid
+		self.type = type
+		self.state = state
+		self.stale = stale
+		self.diskUuid = diskUuid
+
+
+class CmmdsDomObject:
+	'''DOM_OBJECT entry
+	uuid: object UUID
+	owner: UUID of the host owning the object (DOM owner)
+	groupUuid: UUID of the namespace the object belongs to, i.e. the key for the DOM_NAME entry
+	objClass: object class as integer, e.g. 0 for VMDK
+	components: list with the CmmdsComponent of the object'''
+
+	__slots__ = ('uuid', 'owner', 'groupUuid', 'objClass', 'components')
+
+	def __init__(self, uuid: str, owner: str, groupUuid: str = 'Not found', objClass: int = 0, components: list = None):
+		self.uuid = uuid
+		self.owner = owner
+		self.groupUuid = groupUuid
+		self.objClass = objClass
+		self.components = components if components is not None else list()
+
+
+class CmmdsDomName:
+	'''DOM_NAME entry
+	uuid: UUID of the namespace (groupUuid of the objects)
+	name: user friendly name, i.e. usually the VM name'''
+
+	__slots__ = ('uuid', 'name')
+
+	def __init__(self, uuid: str, name: str):
+		self.uuid = uuid
+		self.name = name
+
+
+class CmmdsHost:
+	'''HOSTNAME entry
+	uuid: host UUID
+	hostname: hostname'''
+
+	__slots__ = ('uuid', 'hostname')
+
+	def __init__(self, uuid: str, hostname: str):
+		self.uuid = uuid
+		self.hostname = hostname
+
+
+class CmmdsDisk:
+	'''DISK entry
+	uuid: disk UUID
+	owner: UUID of the host the disk is located in
+	deviceId: device name of the disk, e.g. naa.xxx:2'''
+
+	__slots__ = ('uuid', 'owner', 'deviceId')
+
+	def __init__(self, uuid: str, owner: str, deviceId: str = 'Not found'):
+		self.uuid = uuid
+		self.owner = owner
+		self.deviceId = deviceId
+
+
+class CmmdsModel:
+	'''Decoded CMMDS entries that are of interest, keyed by UUID
+	objects['<uuid>'] = CmmdsDomObject
+	domNames['<groupUuid>'] = CmmdsDomName
+	hosts['<uuid>'] = CmmdsHost
+	disks['<uuid>'] = CmmdsDisk'''
+
+	def __init__(self):
+		self.objects = dict()
+		self.domNames = dict()
+		self.hosts = dict()
+		self.disks = dict()
+
+	def add(self, record) -> bool:
+		'''Add a decoded CMMDS entry to the model, replacing an earlier entry with the same UUID'''
+
+		if isinstance(record, CmmdsDomObject):
+			self.objects[record.uuid] = record
+		elif isinstance(record, CmmdsDomName):
+			self.domNames[record.uuid] = record
+		elif isinstance(record, CmmdsHost):
+			self.hosts[record.uuid] = record
+		elif isinstance(record, CmmdsDisk):
+			self.disks[record.uuid] = record
+		else:
+			return False
+
+		return True
+
+	def load(self, cmmdsEntries, entryTypes: tuple = cmmdsEntryTypes) -> int:
+		'''Decode CMMDS entries and add them to the model
+		Arguments:
+			cmmdsEntries: iterable with CMMDS entries, e.g. from iter_cmmds_entries()
+			entryTypes: CMMDS entry types to decode, all others are skipped
+		Return:
+			number of entries added to the model'''
+
+		added = 0
+		for cmmdsEntry in cmmdsEntries:
+			if cmmdsEntry['type'] not in entryTypes:
+				continue
+
+			record = decode_cmmds_entry(cmmdsEntry)
+			if record is not None:
+				self.add(record)
+				added += 1
+
+		return added
+
+	def load_parallel(self, cmmdsEntries, jobs: int, entryTypes: tuple = cmmdsEntryTypes) -> int:
+		'''Decode CMMDS entries in worker processes and add them to the model. The entries are read here and handed to the workers in batches,
+		the decoded batches are added in the order of the entries, so the model is the same as with load()
+		Arguments:
+			cmmdsEntries: iterable with CMMDS entries, e.g. from iter_cmmds_entries()
+			jobs: number of worker processes
+			entryTypes: CMMDS entry types to decode, all others are skipped
+		Return:
+			number of entries added to the model'''
+
+		added = 0
+		pool = multiprocessing.Pool(processes=jobs)
+
+		try:
+			# Only a few batches per worker are in flight, so the entries aren't read in faster than they are decoded
+			pending = deque()
+			for batch in iter_cmmds_entry_batches(cmmdsEntries=cmmdsEntries, entryTypes=entryTypes):
+				pending.append(pool.apply_async(decode_cmmds_entry_batch, (batch,)))
+				if len(pending) >= jobs * 2:
+					added += self.add_rows(pending.popleft().get())
+
+			while pending:
+				added += self.add_rows(pending.popleft().get())
+		finally:
+			pool.terminate()
+
+		return added
+
+	def add_rows(self, rows: list) -> int:
+		'''Add CMMDS entries decoded into compact tuples by decode_cmmds_entry_batch() to the model
+		Return:
+			number of entries added to the model'''
+
+		for row in rows:
+			if row[0] == 'DOM_OBJECT':
+				self.objects[row[1]] = CmmdsDomObject(row[1], sys.intern(row[2]), sys.intern(row[3]), row[4],
+						[CmmdsComponent(uuid, sys.intern(type), state, stale, sys.intern(diskUuid)) for uuid, type, state, stale, diskUuid in row[5]])
+			elif row[0] == 'DOM_NAME':
+				self.domNames[row[1]] = CmmdsDomName(row[1], row[2])
+			elif row[0] == 'HOSTNAME':
+				self.hosts[row[1]] = CmmdsHost(row[1], row[2])
+			else:
+				self.disks[row[1]] = CmmdsDisk(row[1], row[2], row[3])
+
+		return len(rows)
+
+	def get_dom_name(self, groupUuid: str, default: str = 'Not found') -> str:
+		domName = self.domNames.get(groupUuid)
+		return domName.name if domName is not None else default
+
+	def get_hostname(self, hostUuid: str, default: str = 'Not found') -> str:
+		host = self.hosts.get(hostUuid)
+		return host.hostname if host is not None else default
+
+
+class CmmdsIndex:
+	'''Inverted indexes over a CmmdsModel, built in a single pass once the model is loaded, to find the components on a host or disk or in a state without scanning all objects
+	componentsByHost['<host-uuid>'] = [(CmmdsDomObject, CmmdsComponent), ...]
+	componentsByDisk['<disk-uuid>'] = [(CmmdsDomObject, CmmdsComponent), ...]
+	componentsByState[<state>] = [(CmmdsDomObject, CmmdsComponent), ...]
+	objectsByVm['<vm name>'] = [CmmdsDomObject, ...]
+	Components on disks missing in the model are indexed with None as host UUID, objects without DOM_NAME entry with 'Not found' as VM name'''
+
+	def __init__(self, cmmdsModel: CmmdsModel):
+		self.componentsByHost = dict()
+		self.componentsByDisk = dict()
+		self.componentsByState = dict()
+		self.objectsByVm = dict()
+
+		disks = cmmdsModel.disks
+		for domObject in cmmdsModel.objects.values():
+			self.objectsByVm.setdefault(cmmdsModel.get_dom_name(domObject.groupUuid), []).append(domObject)
+
+			for component in domObject.components:
+				entry = (domObject, component)
+				disk = disks.get(component.diskUuid)
+				self.componentsByHost.setdefault(disk.owner if disk is not None else None, []).append(entry)
+				self.componentsByDisk.setdefault(component.diskUuid, []).append(entry)
+				self.componentsByState.setdefault(component.state, []).append(entry)
+
+
+class CmmdsChange:
+	'''Difference between two CmmdsModel, e.g. of two CMMDS dumps taken minutes apart
+	kind: one of cmmdsChangeKinds
+	objectUuid: object UUID
+	componentUuid: component UUID, None for changes of the object itself
+	old: value before the change, None for added objects and components
+	new: value after the change, None for removed objects and components
+	The values are CmmdsDomObject for added/removed objects, CmmdsComponent for added/removed components, the host UUID for owner changes, (<state>, <stale>) for state changes and the disk UUID for components moved'''
+
+	__slots__ = ('kind', 'objectUuid', 'componentUuid', 'old', 'new')
+
+	def __init__(self, kind: str, objectUuid: str, componentUuid: str = None, old=None, new=None):
+		self.kind = kind
+		self.objectUuid = objectUuid
+		self.componentUuid = componentUuid
+		self.old = old
+		self.new = new
+
+
+class NameCache:
+	'''On-disk cache for resolving the names of objects with a TTL, so repeated runs only have to query CMMDS for new and expired entries
+	groupUuids['<object-uuid>'] = (<groupUuid or None>, <timestamp>)
+	names['<groupUuid>'] = (<ufn or None>, <timestamp>)
+	None is cached as well, i.e. that there's no groupUuid or DOM_NAME entry'''
+
+	def __init__(self, cacheFile: str = nameCacheFile, ttl: float = nameCacheTtl):
+		'''Arguments:
+			cacheFile: path to the cache file, it's read right away if it exists
+			ttl: number of seconds an entry is valid'''
+
+		self.cacheFile = cacheFile
+		self.ttl = ttl
+		self.groupUuids = dict()
+		self.names = dict()
+		self.changed = False
+		self.load()
+
+	def load(self) -> bool:
+		'''Read the cache file, an unreadable or outdated cache file is ignored'''
+
+		try:
+			with open(self.cacheFile, 'r') as f:
+				cache = json.load(f)
+			if cache.get('version') != nameCacheVersion:
+				return False
+			self.groupUuids = dict((key, tuple(value)) for key, value in cache['groupUuids'].items())
+			self.names = dict((key, tuple(value)) for key, value in cache['names'].items())
+		except (OSError, ValueError, KeyError, TypeError, AttributeError):
+			return False
+
+		return True
+
+	def save(self) -> bool:
+		'''Write the cache file without the expired entries, if anything changed'''
+
+		if not self.changed:
+			return True
+
+		timeNow = time.time()
+		cache = {'version': nameCacheVersion,
+				'groupUuids': dict((key, value) for key, value in self.groupUuids.items() if timeNow - value[1] <= self.ttl),
+				'names': dict((key, value) for key, value in self.names.items() if timeNow - value[1] <= self.ttl)}
+
+		try:
+			cacheDir = os.path.dirname(os.path.abspath(self.cacheFile))
+			os.makedirs(cacheDir, exist_ok=True)
+			fd = os.open(self.cacheFile + '.tmp', os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+			with os.fdopen(fd, 'w') as f:
+				json.dump(cache, f)
+			os.replace(self.cacheFile + '.tmp', self.cacheFile)
+		except OSError:
+			return False
+
+		self.changed = False
+		return True
+
+	def get_group_uuid(self, objUuid: str) -> tuple:
+		'''Return (True, <groupUuid or None>) if the object is cached and not expired, (False, None) otherwise'''
+
+		entry = self.groupUuids.get(objUuid)
+		if entry is None or time.time() - entry[1] > self.ttl:
+			return False, None
+		return True, entry[0]
+
+	def get_name(self, groupUuid: str) -> tuple:
+		'''Return (True, <ufn or None>) if the name is cached and not expired, (False, None) otherwise'''
+
+		entry = self.names.get(groupUuid)
+		if entry is None or time.time() - entry[1] > self.ttl:
+			return False, None
+		return True, entry[0]
+
+	def set_group_uuid(self, objUuid: str, groupUuid: str):
+		self.groupUuids[objUuid] = (groupUuid, time.time())
+		self.changed = True
+
+	def set_name(self, groupUuid: str, ufn: str):
+		self.names[groupUuid] = (ufn, time.time())
+		self.changed = True
 
 
 #
 ## Functions
 #
 
-def fix_cmmds_dump(cmmdsDumpInput: str, cmmdsDumpOutput: str):
-	'''Reads in the CMMDS dump, removes the last "," character, and then writes a new CMMDS dump file, so it can be loaded into Python json
+def iter_cmmds_entries(cmmdsDump: str, chunkSize: int = cmmdsChunkSize):
+	'''Generator that parses a CMMDS dump (cmmds-tool find -f python) incrementally and yields one entry at a time.
+	The dump is a JSON list, apart from the trailing "," after the last entry, which is tolerated. Only a chunk of the dump is held in memory at a time.
 	Arguments:
-		cmmdsDumpInput: path to the original CMMDS dump
-		cmmdsDumpOutput: path to the new CMMDS dump file that will be created by this function'''
+		cmmdsDump: path to the CMMDS dump
+		chunkSize: number of characters to read at once
+	Yield:
+		dictionary with the next CMMDS entry
+	Raise:
+		ValueError if the CMMDS dump can't be parsed, as soon as a malformed entry is found'''
+
+	decoder = json.JSONDecoder()
+
+	with open(cmmdsDump, 'r') as f:
+		buffer = f.read(chunkSize)
+		offset = len(buffer)
+		buffer = buffer.lstrip()
+		offset -= len(buffer)
+		if not buffer.startswith('['):
+			raise ValueError('CMMDS dump doesn\'t start with "[": %s' % cmmdsDump)
+
+		position = 1
+		eof = False
+
+		while True:
+			# Skip whitespace and the separators between entries, including the trailing one
+			while position < len(buffer) and buffer[position] in ' \t\r\n,':
+				position += 1
+
+			if position < len(buffer) and buffer[position] == ']':
+				return
+
+			if position < len(buffer):
+				try:
+					entry, position = decoder.raw_decode(buffer, position)
+					yield entry
+					continue
+				except json.JSONDecodeError as e:
+					# Only an entry cut off at the end of the buffer is worth reading more for, anything else is malformed
+					if eof or (e.pos < len(buffer) - cmmdsIncompleteMargin and not e.msg.startswith('Unterminated string')):
+						raise ValueError('CMMDS dump can\'t be parsed at character %d (%s): %s' % (offset + e.pos, e.msg, cmmdsDump))
+
+			if eof:
+				raise ValueError('Unexpected end of CMMDS dump: %s' % cmmdsDump)
+
+			# Entry incomplete, read more. Reading at least as much as is buffered already avoids re-parsing large entries over and over
+			chunk = f.read(max(chunkSize, len(buffer) - position))
+			eof = not chunk
+			offset += position
+			buffer = buffer[position:] + chunk
+			position = 0
+
+
+def import_pycmmds():
+	'''Import pyCMMDS, which is only available on a live ESXi
+	Return:
+		pyCMMDS module, or None if it isn't available'''
 
-	if not os.path.isfile(cmmdsDumpInput):
-		print('CMMDS dump file not found: %s' % cmmdsDumpOrig)
-		return False
+	try:
+		import pyCMMDS
+	except ImportError:
+		return None
+
+	return pyCMMDS
 
-	fhCmmds = open(cmmdsDumpInput, 'r')
-	cmmdsContent = fhCmmds.readlines()
-	cmmdsContent[len(cmmdsContent)-2] = '}'
 
-	fhNewCmmds = open(cmmdsDumpOutput, 'w')
-	fhNewCmmds.writelines(cmmdsContent)
+def iter_pycmmds_entries(pyCMMDS, entryTypes: tuple = cmmdsEntryTypes):
+	'''Generator that queries the CMMDS entries of a live ESXi directly through pyCMMDS and yields them one at a time, in the same format as iter_cmmds_entries().
+	For each entry type, the first entry is looked up with a wildcard query and the following ones with CMMDS_FIND_FLAG_NEXT, starting after the previous entry.
+	Arguments:
+		pyCMMDS: pyCMMDS module (see import_pycmmds()) or any object providing the same interface, e.g. vsansimulation.FakePyCmmds
+		entryTypes: CMMDS entry types to query
+	Yield:
+		dictionary with the next CMMDS entry, the content already decoded as dictionary'''
 
-	os.chmod(cmmdsDumpOutput, 0o666)
-	fhCmmds.close()
-	fhNewCmmds.close()
+	for entryType in entryTypes:
+		query = pyCMMDS.CMMDSQuery()
+		query.type = getattr(pyCMMDS, 'CMMDS_TYPE_' + entryType)
+		query.wildcards = {'anyUUID': 1, 'anyOwner': 1, 'latestRevision': 1}
 
-	return True
+		entry = pyCMMDS.FindEntry(query, pyCMMDS.CMMDS_FIND_FLAG_NONE, True)
+		while entry is not None:
+			yield {'uuid': entry.uuid, 'owner': entry.owner, 'type': entryType, 'content': entry.content or dict()}
 
+			query.uuid = entry.uuid
+			entry = pyCMMDS.FindEntry(query, pyCMMDS.CMMDS_FIND_FLAG_NEXT, True)
 
-def get_dom_name(entryDomName: dict) -> tuple:
-	'''Get VM name from DOM_NAME entry in CMMDS
+
+def get_object_names(pyCMMDS, default: str = 'None found') -> dict:
+	'''Resolve the names (usually the VM names) of all vSAN objects in one bulk pass over the DOM_OBJECT and DOM_NAME entries, instead of two lookups per object
 	Arguments:
-		entryDomName: CMMDS entry to process
+		pyCMMDS: pyCMMDS module or a stand-in with the same interface
+		default: name for objects without groupUuid or DOM_NAME entry
 	Return:
-		tuple with DOM_NAME UUID and namespace object name'''
+		objectNames['<object-uuid>'] = '<name>' -> dictionary with the name of each DOM_OBJECT entry'''
 
-	regexDomName = re.compile('.*ufn": "(.+)", "cid": "' + UUID + '".*')
+	groupUuids = dict()
+	domNames = dict()
 
-	searchResult = re.search(regexDomName, entryDomName['content'])
+	for cmmdsEntry in iter_pycmmds_entries(pyCMMDS=pyCMMDS, entryTypes=('DOM_OBJECT', 'DOM_NAME')):
+		content = cmmdsEntry['content']
+		if not isinstance(content, dict):
+			continue
 
-	if not searchResult:
-		regexDomName = re.compile('.*ufn": "(.+)"}.*')
-		searchResult = re.search(regexDomName, entryDomName['content'])
+		if cmmdsEntry['type'] == 'DOM_OBJECT':
+			groupUuids[cmmdsEntry['uuid']] = get_entry_group_uuid(content)
+		elif 'ufn' in content:
+			domNames[cmmdsEntry['uuid']] = content['ufn']
 
-	if searchResult:
-		return (entryDomName['uuid'], searchResult.group(1))
+	return dict((objUuid, domNames.get(groupUuid, default)) for objUuid, groupUuid in groupUuids.items())
+
+
+def find_pycmmds_entry(pyCMMDS, entryType: str, uuid: str):
+	'''Look up a single CMMDS entry by type and UUID through pyCMMDS
+	Return:
+		the entry, or None if there's no such entry'''
+
+	query = pyCMMDS.CMMDSQuery()
+	query.uuid = uuid
+	query.type = getattr(pyCMMDS, 'CMMDS_TYPE_' + entryType)
+	query.wildcards = {'latestRevision': 1, 'anyOwner': 1}
+
+	try:
+		return pyCMMDS.FindEntry(query, pyCMMDS.CMMDS_FIND_FLAG_NONE, True)
+	except Exception:
+		return None
+
+
+def get_entry_group_uuid(content) -> str:
+	'''Return the groupUuid from the content of a DOM_OBJECT entry, None if there's none'''
+
+	try:
+		return content['attributes']['groupUuid']
+	except (KeyError, TypeError):
+		return None
+
+
+def get_entry_ufn(content) -> str:
+	'''Return the ufn (user friendly name) from the content of a DOM_NAME entry, None if there's none'''
+
+	try:
+		return content['ufn']
+	except (KeyError, TypeError):
+		return None
+
+
+def resolve_group_names(pyCMMDS, groupUuids, nameCache: NameCache) -> dict:
+	'''Resolve the ufn of namespaces (groupUuids), querying CMMDS only for the ones missing or expired in the name cache
+	Arguments:
+		pyCMMDS: pyCMMDS module or a stand-in with the same interface
+		groupUuids: iterable with the groupUuids
+		nameCache: NameCache, updated with the names queried
+	Return:
+		names['<groupUuid>'] = '<ufn>' or None if there's no DOM_NAME entry (or ufn) for it'''
+
+	names = dict()
+	missingUuids = list()
+
+	for groupUuid in set(groupUuids):
+		found, ufn = nameCache.get_name(groupUuid)
+		if found:
+			names[groupUuid] = ufn
+		else:
+			missingUuids.append(groupUuid)
+
+	if len(missingUuids) > nameCacheBulkThreshold:
+		fetchedNames = dict()
+		for cmmdsEntry in iter_pycmmds_entries(pyCMMDS=pyCMMDS, entryTypes=('DOM_NAME',)):
+			fetchedNames[cmmdsEntry['uuid']] = get_entry_ufn(cmmdsEntry['content'])
+			nameCache.set_name(cmmdsEntry['uuid'], fetchedNames[cmmdsEntry['uuid']])
+		for groupUuid in missingUuids:
+			names[groupUuid] = fetchedNames.get(groupUuid)
+			if groupUuid not in fetchedNames:
+				nameCache.set_name(groupUuid, None)
+		return names
+
+	for groupUuid in missingUuids:
+		entry = find_pycmmds_entry(pyCMMDS=pyCMMDS, entryType='DOM_NAME', uuid=groupUuid)
+		names[groupUuid] = get_entry_ufn(entry.content) if entry is not None else None
+		nameCache.set_name(groupUuid, names[groupUuid])
+
+	return names
+
+
+def resolve_object_names(pyCMMDS, objectUuids, nameCache: NameCache, default: str = 'None found') -> dict:
+	'''Resolve the names (usually the VM names) of vSAN objects, querying CMMDS only for the objects and namespaces missing or expired in the name cache.
+	With many misses (e.g. an empty cache), all DOM_OBJECT entries are fetched in one pass instead of looking up each object.
+	Arguments:
+		pyCMMDS: pyCMMDS module or a stand-in with the same interface
+		objectUuids: iterable with the object UUIDs
+		nameCache: NameCache, updated with the entries queried
+		default: name for objects without groupUuid or DOM_NAME entry
+	Return:
+		objectNames['<object-uuid>'] = '<name>' -> dictionary with the name of each object'''
+
+	groupUuids = dict()
+	missingUuids = list()
+
+	for objUuid in objectUuids:
+		found, groupUuid = nameCache.get_group_uuid(objUuid)
+		if found:
+			groupUuids[objUuid] = groupUuid
+		else:
+			missingUuids.append(objUuid)
+
+	if len(missingUuids) > nameCacheBulkThreshold:
+		fetchedGroupUuids = dict()
+		for cmmdsEntry in iter_pycmmds_entries(pyCMMDS=pyCMMDS, entryTypes=('DOM_OBJECT',)):
+			fetchedGroupUuids[cmmdsEntry['uuid']] = get_entry_group_uuid(cmmdsEntry['content'])
+			nameCache.set_group_uuid(cmmdsEntry['uuid'], fetchedGroupUuids[cmmdsEntry['uuid']])
+		for objUuid in missingUuids:
+			groupUuids[objUuid] = fetchedGroupUuids.get(objUuid)
+			if objUuid not in fetchedGroupUuids:
+				nameCache.set_group_uuid(objUuid, None)
+	else:
+		for objUuid in missingUuids:
+			entry = find_pycmmds_entry(pyCMMDS=pyCMMDS, entryType='DOM_OBJECT', uuid=objUuid)
+			groupUuids[objUuid] = get_entry_group_uuid(entry.content) if entry is not None else None
+			nameCache.set_group_uuid(objUuid, groupUuids[objUuid])
+
+	names = resolve_group_names(pyCMMDS=pyCMMDS, groupUuids=[groupUuid for groupUuid in groupUuids.values() if groupUuid is not None], nameCache=nameCache)
+
+	objectNames = dict()
+	for objUuid, groupUuid in groupUuids.items():
+		name = names.get(groupUuid) if groupUuid is not None else None
+		objectNames[objUuid] = name if name is not None else default
+
+	return objectNames
+
+
+def load_cmmds_dump(cmmdsDump: str, cmmdsModel: CmmdsModel = None, useCache: bool = False, cacheDir: str = None, jobs: int = 1) -> CmmdsModel:
+	'''Parse a CMMDS dump into a CmmdsModel.
+	With the cache enabled, the model is loaded from the snapshot cache file if it matches the current version of the dump. Otherwise the dump is parsed and the snapshot cache file is (re-)written.
+	Arguments:
+		cmmdsDump: path to the CMMDS dump
+		cmmdsModel: CmmdsModel to add the entries to, by default a new one
+		useCache: whether to use the snapshot cache
+		cacheDir: directory for the cache files, by default a hidden directory next to the CMMDS dump
+		jobs: number of worker processes to decode the entries with, if the dump has to be parsed
+	Return:
+		CmmdsModel with the DOM_OBJECT, DOM_NAME, HOSTNAME and DISK entries of the dump
+	Raise:
+		ValueError if the CMMDS dump can't be parsed'''
+
+	if cmmdsModel is None:
+		cmmdsModel = CmmdsModel()
+
+	if useCache and load_cmmds_cache(cmmdsDump=cmmdsDump, cmmdsModel=cmmdsModel, cacheDir=cacheDir):
+		return cmmdsModel
+
+	if jobs > 1:
+		cmmdsModel.load_parallel(iter_cmmds_entries(cmmdsDump=cmmdsDump), jobs=jobs)
 	else:
-		return (entryDomName['uuid'], 'Not found')
+		cmmdsModel.load(iter_cmmds_entries(cmmdsDump=cmmdsDump))
+
+	if useCache:
+		save_cmmds_cache(cmmdsDump=cmmdsDump, cmmdsModel=cmmdsModel, cacheDir=cacheDir)
+
+	return cmmdsModel
+
+
+def diff_cmmds_models(oldModel: CmmdsModel, newModel: CmmdsModel) -> list:
+	'''Compare the objects and components of two CmmdsModel with set operations on their UUIDs.
+	Components of objects that were added or removed are not reported individually, components that moved to another object are reported as removed and added.
+	Arguments:
+		oldModel: CmmdsModel before the changes, e.g. of the older CMMDS dump
+		newModel: CmmdsModel after the changes
+	Return:
+		list with a CmmdsChange for every difference, ordered by the kind of change (in the order of cmmdsChangeKinds) and UUIDs'''
+
+	changes = list()
+
+	oldObjects = oldModel.objects.keys()
+	newObjects = newModel.objects.keys()
+	changes += [CmmdsChange('Object added', uuid, new=newModel.objects[uuid]) for uuid in newObjects - oldObjects]
+	changes += [CmmdsChange('Object removed', uuid, old=oldModel.objects[uuid]) for uuid in oldObjects - newObjects]
+
+	commonObjects = oldObjects & newObjects
+	changes += [CmmdsChange('Owner changed', uuid, old=oldModel.objects[uuid].owner, new=newModel.objects[uuid].owner)
+			for uuid in commonObjects if oldModel.objects[uuid].owner != newModel.objects[uuid].owner]
+
+	# Components keyed by (object UUID, component UUID) of the objects in both models only
+	oldComponents = dict(((uuid, component.uuid), component) for uuid in commonObjects for component in oldModel.objects[uuid].components)
+	newComponents = dict(((uuid, component.uuid), component) for uuid in commonObjects for component in newModel.objects[uuid].components)
+	changes += [CmmdsChange('Component added', key[0], key[1], new=newComponents[key]) for key in newComponents.keys() - oldComponents.keys()]
+	changes += [CmmdsChange('Component removed', key[0], key[1], old=oldComponents[key]) for key in oldComponents.keys() - newComponents.keys()]
+
+	for key in oldComponents.keys() & newComponents.keys():
+		oldComponent = oldComponents[key]
+		newComponent = newComponents[key]
+		if oldComponent.state != newComponent.state or oldComponent.stale != newComponent.stale:
+			changes.append(CmmdsChange('State changed', key[0], key[1], old=(oldComponent.state, oldComponent.stale), new=(newComponent.state, newComponent.stale)))
+		if oldComponent.diskUuid != newComponent.diskUuid:
+			changes.append(CmmdsChange('Component moved', key[0], key[1], old=oldComponent.diskUuid, new=newComponent.diskUuid))
+
+	kindOrder = dict((kind, i) for i, kind in enumerate(cmmdsChangeKinds))
+	changes.sort(key=lambda change: (kindOrder[change.kind], change.objectUuid, change.componentUuid or ''))
+
+	return changes
+
+
+def get_cmmds_cache_file(cmmdsDump: str, cacheDir: str = None) -> str:
+	'''Return the path of the snapshot cache file for a CMMDS dump
+	Arguments:
+		cmmdsDump: path to the CMMDS dump
+		cacheDir: directory for the cache files, by default a hidden directory next to the CMMDS dump'''
+
+	cmmdsDump = os.path.abspath(cmmdsDump)
+	if not cacheDir:
+		cacheDir = os.path.join(os.path.dirname(cmmdsDump), cmmdsCacheDirName)
+
+	return os.path.join(cacheDir, hashlib.sha1(cmmdsDump.encode('utf-8')).hexdigest() + '.cmmdscache')
+
+
+def get_cmmds_cache_key(cmmdsDump: str) -> dict:
+	'''Return the identity of a CMMDS dump a cache file has to match: path, size, mtime and model version'''
+
+	fileStat = os.stat(cmmdsDump)
+	return {'path': os.path.abspath(cmmdsDump), 'size': fileStat.st_size, 'mtime': fileStat.st_mtime_ns, 'version': cmmdsModelVersion,
+			'byteorder': sys.byteorder, 'itemsize': array('i').itemsize}
+
+
+def save_cmmds_cache(cmmdsDump: str, cmmdsModel: CmmdsModel, cacheDir: str = None) -> bool:
+	'''Write a CmmdsModel into the snapshot cache file of a CMMDS dump.
+	The cache file consists of a magic string, the length of a JSON header and the header itself, followed by the columns:
+	all strings (UUIDs, names, ...) once each as NUL separated string, then the objects, components, DOM names, hosts and disks as flat arrays of integers.
+	Strings are stored as their index into the string column, the components of an object follow each other in the order of the objects.
+	Arguments:
+		cmmdsDump: path to the CMMDS dump
+		cmmdsModel: CmmdsModel parsed from the CMMDS dump
+		cacheDir: directory for the cache files
+	Return:
+		True if the cache file was written, False otherwise'''
+
+	cacheFile = get_cmmds_cache_file(cmmdsDump=cmmdsDump, cacheDir=cacheDir)
+
+	strings = list()
+	stringIdxs = dict()
+
+	def intern(string: str) -> int:
+		stringIdx = stringIdxs.get(string)
+		if stringIdx is None:
+			stringIdx = stringIdxs[string] = len(strings)
+			strings.append(string)
+		return stringIdx
+
+	objects = array('i')		# uuid, owner, groupUuid, objClass, number of components
+	components = array('i')		# uuid, type, state, stale, diskUuid
+	domNames = array('i')		# uuid, name
+	hosts = array('i')		# uuid, hostname
+	disks = array('i')		# uuid, owner, deviceId
+
+	for domObject in cmmdsModel.objects.values():
+		objects.extend((intern(domObject.uuid), intern(domObject.owner), intern(domObject.groupUuid), domObject.objClass, len(domObject.components)))
+		for component in domObject.components:
+			components.extend((intern(component.uuid), intern(component.type), component.state, int(component.stale), intern(component.diskUuid)))
+
+	for domName in cmmdsModel.domNames.values():
+		domNames.extend((intern(domName.uuid), intern(domName.name)))
+
+	for host in cmmdsModel.hosts.values():
+		hosts.extend((intern(host.uuid), intern(host.hostname)))
+
+	for disk in cmmdsModel.disks.values():
+		disks.extend((intern(disk.uuid), intern(disk.owner), intern(disk.deviceId)))
+
+	stringColumn = '\0'.join(strings)
+	if stringColumn.count('\0') != max(len(strings) - 1, 0):
+		return False
+
+	columns = [stringColumn.encode('utf-8'), objects.tobytes(), components.tobytes(), domNames.tobytes(), hosts.tobytes(), disks.tobytes()]
+
+	header = get_cmmds_cache_key(cmmdsDump)
+	header['strings'] = len(strings)
+	header['columns'] = [len(column) for column in columns]
+	header = json.dumps(header).encode('utf-8')
+
+	try:
+		os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+		with open(cacheFile + '.tmp', 'wb') as f:
+			f.write(cmmdsCacheMagic + struct.pack('<I', len(header)) + header)
+			for column in columns:
+				f.write(column)
+		os.replace(cacheFile + '.tmp', cacheFile)
+	except OSError:
+		return False
 
 	return True
 
 
-def get_object_info(entryDomObject: dict) -> tuple:
-	'''Get objcet info like group UUID, object class, etc.
+def load_cmmds_cache(cmmdsDump: str, cmmdsModel: CmmdsModel, cacheDir: str = None) -> bool:
+	'''Load a CmmdsModel from the snapshot cache file of a CMMDS dump
 	Arguments:
-		entryDomObject: CMMDS entry to process
+		cmmdsDump: path to the CMMDS dump
+		cmmdsModel: CmmdsModel to add the cached entries to. It's left untouched if there's no valid cache file
+		cacheDir: directory for the cache files
 	Return:
-		tuple with object UUID and dictionary with object details'''
+		True if the model was loaded from the cache file, False if there's no valid cache file for the current version of the CMMDS dump'''
+
+	cacheFile = get_cmmds_cache_file(cmmdsDump=cmmdsDump, cacheDir=cacheDir)
 
-	objectDetails = dict()
-	objectDetails['owner'] = entryDomObject['owner']
+	try:
+		with open(cacheFile, 'rb') as f:
+			if f.read(len(cmmdsCacheMagic)) != cmmdsCacheMagic:
+				return False
+			headerLen = struct.unpack('<I', f.read(4))[0]
+			header = json.loads(f.read(headerLen).decode('utf-8'))
 
-	regexObjInfo = re.compile('"([^"]+)": ["]{0,1}([^",\}]+)')
-	resultObjInfo = re.findall(regexObjInfo, entryDomObject['content'])
+			cacheKey = get_cmmds_cache_key(cmmdsDump)
+			if any(header.get(key) != value for key, value in cacheKey.items()):
+				return False
 
-	objectDetails = parse_dom_object_details(objDetails=resultObjInfo, vsanObject=objectDetails)
+			columns = [f.read(columnLen) for columnLen in header['columns']]
+	except (OSError, ValueError, struct.error):
+		return False
 
-	return (entryDomObject['uuid'], objectDetails)
+	if len(columns) != 6 or any(len(column) != columnLen for column, columnLen in zip(columns, header['columns'])):
+		return False
 
+	strings = columns[0].decode('utf-8').split('\0') if header['strings'] else list()
+	if len(strings) != header['strings']:
+		return False
+
+	tables = list()
+	for column, stride in zip(columns[1:], (5, 5, 2, 2, 3)):
+		table = array('i')
+		table.frombytes(column)
+		if len(table) % stride:
+			return False
+		tables.append(iter(table))
+	objects, components, domNames, hosts, disks = tables
+
+	# zip() over the same iterator repeatedly yields the consecutive fields of each row.
+	# None of the records created reference each other in cycles, so the garbage collector (which would otherwise run over and over while creating them) is paused
+	gcEnabled = gc.isenabled()
+	gc.disable()
+	try:
+		componentRows = zip(components, components, components, components, components)
+		domObjects = [CmmdsDomObject(strings[uuid], strings[owner], strings[groupUuid], objClass,
+				[CmmdsComponent(strings[cUuid], strings[cType], state, stale == 1, strings[diskUuid]) for cUuid, cType, state, stale, diskUuid in islice(componentRows, componentCount)])
+				for uuid, owner, groupUuid, objClass, componentCount in zip(objects, objects, objects, objects, objects)]
+		records = [CmmdsDomName(strings[uuid], strings[name]) for uuid, name in zip(domNames, domNames)]
+		records += [CmmdsHost(strings[uuid], strings[hostname]) for uuid, hostname in zip(hosts, hosts)]
+		records += [CmmdsDisk(strings[uuid], strings[owner], strings[deviceId]) for uuid, owner, deviceId in zip(disks, disks, disks)]
+	except IndexError:
+		return False
+	finally:
+		if gcEnabled:
+			gc.enable()
 
-def parse_dom_object_details(objDetails: list, vsanObject: dict) -> dict:
-	'''Get the groupUuid, objClass, component UUIDs, and component states from the DOM_OBJECT content values
+	if next(componentRows, None) is not None:
+		return False
+
+	for domObject in domObjects:
+		cmmdsModel.objects[domObject.uuid] = domObject
+	for record in records:
+		cmmdsModel.add(record)
+
+	return True
+
+
+def clear_cmmds_cache(cmmdsDump: str, cacheDir: str = None) -> bool:
+	'''Remove the snapshot cache file of a CMMDS dump
 	Arguments:
-		objDetails: dictionary with all object details
-		vsanObject: dictionary to popluate with details in nice format
+		cmmdsDump: path to the CMMDS dump
+		cacheDir: directory for the cache files
 	Return:
-		dictionary with pupulated details in nice format'''
+		True if a cache file was removed, False if there was none'''
 
-	staleCsn = False
-	vsanObject['components'] = dict()
+	try:
+		os.remove(get_cmmds_cache_file(cmmdsDump=cmmdsDump, cacheDir=cacheDir))
+	except FileNotFoundError:
+		return False
 
-	for keyValuePair in objDetails:
-		if keyValuePair[0] == 'groupUuid':
-			vsanObject['groupUuid'] = keyValuePair[1]
-			continue
+	return True
 
-		if keyValuePair[0] == 'objClass':
-			vsanObject['objClass'] = keyValuePair[1]
-			continue
 
-		if keyValuePair[0] == 'componentState':
-			componentState = keyValuePair[1]
+def iter_cmmds_entry_batches(cmmdsEntries, entryTypes: tuple = cmmdsEntryTypes, batchSize: int = cmmdsDecodeBatchSize):
+	'''Generator that groups the CMMDS entries of interest into batches for the worker processes, with only the fields needed for decoding them
+	Arguments:
+		cmmdsEntries: iterable with CMMDS entries, e.g. from iter_cmmds_entries()
+		entryTypes: CMMDS entry types to decode, all others are skipped
+		batchSize: number of entries per batch
+	Yield:
+		list with the dictionaries of up to batchSize CMMDS entries'''
+
+	batch = list()
+	for cmmdsEntry in cmmdsEntries:
+		if cmmdsEntry['type'] not in entryTypes:
 			continue
 
-		if keyValuePair[0] == 'staleCsn':
-			staleCsn = True
-			continue
+		batch.append({'type': cmmdsEntry['type'], 'uuid': cmmdsEntry['uuid'], 'owner': cmmdsEntry['owner'], 'content': cmmdsEntry['content']})
+		if len(batch) >= batchSize:
+			yield batch
+			batch = list()
 
-		if keyValuePair[0] == 'componentUuid':
-			componentUuid = keyValuePair[1]
-			continue
+	if batch:
+		yield batch
+
+
+def decode_cmmds_entry_batch(batch: list) -> list:
+	'''Decode a batch of CMMDS entries in a worker process. The records are returned as tuples, which are a lot cheaper to send back to the parent process
+	Arguments:
+		batch: list with CMMDS entries
+	Return:
+		list with ('DOM_OBJECT', uuid, owner, groupUuid, objClass, ((uuid, type, state, stale, diskUuid), ...)), ('DOM_NAME', uuid, name),
+		('HOSTNAME', uuid, hostname) or ('DISK', uuid, owner, deviceId) for each entry decoded'''
+
+	rows = list()
+	for cmmdsEntry in batch:
+		record = decode_cmmds_entry(cmmdsEntry)
+		if isinstance(record, CmmdsDomObject):
+			rows.append(('DOM_OBJECT', record.uuid, record.owner, record.groupUuid, record.objClass,
+					tuple((component.uuid, component.type, component.state, component.stale, component.diskUuid) for component in record.components)))
+		elif isinstance(record, CmmdsDomName):
+			rows.append(('DOM_NAME', record.uuid, record.name))
+		elif isinstance(record, CmmdsHost):
+			rows.append(('HOSTNAME', record.uuid, record.hostname))
+		elif isinstance(record, CmmdsDisk):
+			rows.append(('DISK', record.uuid, record.owner, record.deviceId))
+
+	return rows
+
+
+def decode_cmmds_entry(cmmdsEntry: dict):
+	'''Decode a CMMDS entry into a record. The content is decoded once, with a JSON parse where it's valid JSON and with precompiled patterns otherwise.
+	Arguments:
+		cmmdsEntry: CMMDS entry with (at least) the keys type, uuid, owner and content. The content can be a string or an already decoded dictionary, as returned by pyCMMDS
+	Return:
+		CmmdsDomObject, CmmdsDomName, CmmdsHost or CmmdsDisk; None for other entry types'''
 
-		if keyValuePair[0] == 'diskUuid':
-			diskUuid = keyValuePair[1]
-			vsanObject['components'][componentUuid] = dict()
-			vsanObject['components'][componentUuid]['componentState'] = componentState
-			vsanObject['components'][componentUuid]['stale'] = staleCsn
-			vsanObject['components'][componentUuid]['diskUuid'] = diskUuid
+	entryType = cmmdsEntry['type']
+	if entryType not in cmmdsEntryTypes:
+		return None
+
+	content = cmmdsEntry['content']
+	if isinstance(content, str):
+		try:
+			content = json.loads(content)
+		except ValueError:
+			pass
+
+	if entryType == 'DOM_OBJECT':
+		if isinstance(content, dict):
+			return decode_dom_object(uuid=cmmdsEntry['uuid'], owner=cmmdsEntry['owner'], content=content)
+		return decode_dom_object_text(uuid=cmmdsEntry['uuid'], owner=cmmdsEntry['owner'], content=content)
+
+	if entryType == 'DOM_NAME':
+		if isinstance(content, dict):
+			return CmmdsDomName(uuid=cmmdsEntry['uuid'], name=get_dom_name_from_ufn(content.get('ufn')))
+		return decode_dom_name_text(uuid=cmmdsEntry['uuid'], content=content)
+
+	if entryType == 'HOSTNAME':
+		if isinstance(content, dict):
+			return CmmdsHost(uuid=cmmdsEntry['uuid'], hostname=content.get('hostname', 'Not found'))
+		searchResult = regexHostname.search(content)
+		return CmmdsHost(uuid=cmmdsEntry['uuid'], hostname=searchResult.group(1) if searchResult else 'Not found')
+
+	if isinstance(content, dict):
+		return CmmdsDisk(uuid=cmmdsEntry['uuid'], owner=cmmdsEntry['owner'], deviceId=content.get('devName', 'Not found'))
+
+	for key, value in regexKeyValue.findall(content):
+		if key == 'devName':
+			return CmmdsDisk(uuid=cmmdsEntry['uuid'], owner=cmmdsEntry['owner'], deviceId=value)
+
+	return CmmdsDisk(uuid=cmmdsEntry['uuid'], owner=cmmdsEntry['owner'])
+
+
+def decode_dom_object(uuid: str, owner: str, content: dict) -> CmmdsDomObject:
+	'''Decode the JSON content of a DOM_OBJECT entry: groupUuid and objClass from the top level attributes, the components from the leaves of the RAID tree.
+	A component UUID that appears more than once is kept once, in the place it first appears with the values it last appears with
+	Arguments:
+		uuid: object UUID
+		owner: UUID of the DOM owner
+		content: decoded content of the entry
+	Return:
+		CmmdsDomObject'''
+
+	attributes = content.get('attributes', {})
+	domObject = CmmdsDomObject(uuid=uuid, owner=sys.intern(owner), groupUuid=sys.intern(attributes.get('groupUuid', 'Not found')), objClass=int(attributes.get('objClass', 0)))
+	components = dict()
+
+	def walk(node: dict):
+		for key, child in node.items():
+			if not key.startswith('child-') or not isinstance(child, dict):
+				continue
+
+			if 'componentUuid' in child:
+				childAttributes = child.get('attributes', {})
+				components[child['componentUuid']] = CmmdsComponent(uuid=child['componentUuid'], type=sys.intern(child.get('type', 'Component')), state=int(childAttributes.get('componentState', 0)),
+						stale='staleCsn' in childAttributes, diskUuid=sys.intern(child.get('diskUuid', '00000000-0000-0000-0000-000000000000')))
+			else:
+				walk(child)
+
+	walk(content)
+	domObject.components = list(components.values())
+	return domObject
+
+
+def decode_dom_object_text(uuid: str, owner: str, content: str) -> CmmdsDomObject:
+	'''Decode the content of a DOM_OBJECT entry that isn't valid JSON, going through the "key": value pairs in order.
+	Duplicate component UUIDs are handled like in decode_dom_object()
+	Arguments:
+		uuid: object UUID
+		owner: UUID of the DOM owner
+		content: content of the entry
+	Return:
+		CmmdsDomObject'''
+
+	domObject = CmmdsDomObject(uuid=uuid, owner=sys.intern(owner))
+	components = dict()
+	componentType = 'Component'
+	componentState = 0
+	componentUuid = None
+	staleCsn = False
+
+	for key, value in regexKeyValue.findall(content):
+		if key == 'groupUuid':
+			domObject.groupUuid = sys.intern(value)
+		elif key == 'objClass':
+			domObject.objClass = int(value)
+		elif key == 'type':
+			componentType = sys.intern(value)
+		elif key == 'componentState':
+			componentState = int(value)
+		elif key == 'staleCsn':
+			staleCsn = True
+		elif key == 'componentUuid':
+			componentUuid = value
+		elif key == 'diskUuid' and componentUuid is not None:
+			components[componentUuid] = CmmdsComponent(uuid=componentUuid, type=componentType, state=componentState, stale=staleCsn, diskUuid=sys.intern(value))
 			componentState = 0
 			staleCsn = False
 
-	if not 'groupUuid' in vsanObject.keys():
-		vsanObject['groupUuid'] = 'Not found'
+	domObject.components = list(components.values())
+	return domObject
+
+
+def get_dom_name_from_ufn(ufn) -> str:
+	'''Return the name to show for the ufn (user friendly name) of a DOM_NAME entry'''
+
+	if ufn is None:
+		return 'Not found'
+	if ufn == '':
+		return '<none>'
+	return ufn
 
-	if not 'objClass' in vsanObject.keys():
-		vsanObject['objClass'] = 0
 
-	return vsanObject
+def decode_dom_name_text(uuid: str, content: str) -> CmmdsDomName:
+	'''Decode the content of a DOM_NAME entry that isn't valid JSON
+	Arguments:
+		uuid: UUID of the namespace
+		content: content of the entry
+	Return:
+		CmmdsDomName'''
+
+	if regexDomNameEmpty.search(content):
+		return CmmdsDomName(uuid=uuid, name='<none>')
+
+	searchResult = regexDomNameCid.search(content)
+	if not searchResult:
+		searchResult = regexDomNameNoCid.search(content)
+
+	if searchResult:
+		return CmmdsDomName(uuid=uuid, name=searchResult.group(1))
+
+	return CmmdsDomName(uuid=uuid, name='Not found')
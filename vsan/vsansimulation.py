@@ -0,0 +1,319 @@
+#!/bin/python3
+#
+# Module to simulate vSAN clusters of arbitrary size, for benchmarking and testing the scripts in this repo on any Linux box
+#
+# Written by Manuel Moser (moserm)
+
+import sys, os, json, time, types, random
+
+#
+## General variables
+#
+
+objClassCount = 11			# Number of object classes, see objClass in vsan-objects-overview.py
+compStateActive = 5
+compStatesNotActive = [6, 7, 8, 9]	# Absent, Stale, Resyncing, Degraded
+cmmdsTypes = ['HOSTNAME', 'DISK', 'DOM_NAME', 'DOM_OBJECT']
+simulationEnvVar = 'VSAN_SIMULATION'	# e.g. VSAN_SIMULATION="objects=20000,vms=5000,hosts=8,latency=0.001", see install_from_environment()
+domOwnersPath = '/vmkModules/vsan/dom/owners/'
+
+
+#
+## Classes
+#
+class SyntheticCluster:
+	'''Synthetic vSAN cluster with HOSTNAME, DISK, DOM_NAME and DOM_OBJECT entries that look like the ones from cmmds-tool.
+	The cluster is generated from a seed, so iterating over the entries again yields exactly the same entries, without keeping them in memory.'''
+
+	def __init__(self, objects: int = 1000, vms: int = 100, hosts: int = 8, disksPerHost: int = 4, componentsPerObject: int = 3, notActiveRatio: float = 0.05, seed: int = 0):
+		'''Arguments:
+			objects: number of DOM_OBJECT entries
+			vms: number of DOM_NAME entries (namespaces), the objects are distributed across them
+			hosts: number of hosts
+			disksPerHost: number of capacity disks per host
+			componentsPerObject: number of data components per object, plus one witness
+			notActiveRatio: share of data components that are not in an active state
+			seed: seed for the random number generator'''
+
+		self.objects = objects
+		self.vms = vms
+		self.hosts = hosts
+		self.disksPerHost = disksPerHost
+		self.componentsPerObject = componentsPerObject
+		self.notActiveRatio = notActiveRatio
+		self.seed = seed
+
+		rng = random.Random(seed)
+		self.hostUuids = [generate_uuid(rng) for i in range(hosts)]
+		self.diskUuids = [generate_uuid(rng) for i in range(hosts * disksPerHost)]
+		self.groupUuids = [generate_uuid(rng) for i in range(vms)]
+
+	def __len__(self) -> int:
+		return self.hosts + len(self.diskUuids) + self.vms + self.objects
+
+	def iter_entries(self):
+		'''Generator that yields the CMMDS entries of the cluster, with the content as JSON string like in a CMMDS dump'''
+
+		for i, hostUuid in enumerate(self.hostUuids):
+			yield {'uuid': hostUuid, 'owner': hostUuid, 'type': 'HOSTNAME', 'content': json.dumps({'hostname': 'esx{:03d}.sim.local'.format(i + 1)})}
+
+		for i, diskUuid in enumerate(self.diskUuids):
+			yield {'uuid': diskUuid, 'owner': self.hostUuids[i // self.disksPerHost], 'type': 'DISK',
+					'content': json.dumps({'capacity': 1920383410176, 'iops': 100, 'devName': 'naa.5000c500{:08x}:2'.format(i), 'isSsd': 0})}
+
+		for i, groupUuid in enumerate(self.groupUuids):
+			yield {'uuid': groupUuid, 'owner': self.hostUuids[i % self.hosts], 'type': 'DOM_NAME', 'content': json.dumps({'ufn': 'simVM{:05d}'.format(i + 1), 'cid': groupUuid})}
+
+		rng = random.Random(self.seed + 1)
+		for i in range(self.objects):
+			objUuid = generate_uuid(rng)
+			yield {'uuid': objUuid, 'owner': rng.choice(self.hostUuids), 'type': 'DOM_OBJECT', 'content': json.dumps(self.generate_dom_object_content(rng, objUuid, i))}
+
+	def generate_dom_object_content(self, rng, objUuid: str, objIdx: int) -> dict:
+		'''Generate the content of a DOM_OBJECT entry: a RAID_1 with the data components and a witness'''
+
+		objClass = rng.randrange(objClassCount)
+		raid = {'type': 'RAID_1', 'attributes': {'scope': 3}}
+
+		for i in range(self.componentsPerObject + 1):
+			isWitness = i == self.componentsPerObject
+			componentState = compStateActive
+			if not isWitness and rng.random() < self.notActiveRatio:
+				componentState = rng.choice(compStatesNotActive)
+
+			attributes = {'capacity': 273804165120, 'addressSpace': 273804165120, 'componentState': componentState, 'componentStateTS': 1620000000, 'objClass': objClass}
+			if componentState != compStateActive:
+				attributes['staleCsn'] = 1
+
+			raid['child-{}'.format(i + 1)] = {'type': 'Witness' if isWitness else 'Component', 'attributes': attributes,
+					'componentUuid': generate_uuid(rng), 'diskUuid': rng.choice(self.diskUuids)}
+
+		attributes = {'CSN': 12, 'addressSpace': 273804165120, 'groupUuid': self.groupUuids[objIdx % self.vms], 'compositeUuid': objUuid, 'objClass': objClass}
+		return {'type': 'Configuration', 'attributes': attributes, 'child-1': raid}
+
+	def write_cmmds_dump(self, cmmdsDump: str) -> int:
+		'''Write the cluster into a file in the format of "cmmds-tool find -f python", including the trailing "," after the last entry
+		Arguments:
+			cmmdsDump: path to write the CMMDS dump to
+		Return:
+			number of entries written'''
+
+		written = 0
+		with open(cmmdsDump, 'w') as f:
+			f.write('[\n')
+			for entry in self.iter_entries():
+				f.write('{\n')
+				f.write('   "uuid": {},\n   "owner": {},\n   "health": "Healthy",\n   "revision": "3",\n   "type": {},\n   "content": {},\n   "errorStr": "(null)"\n'.format(
+						json.dumps(entry['uuid']), json.dumps(entry['owner']), json.dumps(entry['type']), json.dumps(entry['content'])))
+				f.write('},\n')
+				written += 1
+			f.write(']\n')
+
+		return written
+
+
+class FakeCmmdsQuery:
+	'''Query as created by pyCMMDS.CMMDSQuery()'''
+
+	def __init__(self):
+		self.uuid = None
+		self.owner = None
+		self.type = None
+		self.wildcards = dict()
+
+
+class FakeCmmdsEntry:
+	'''Entry as returned by pyCMMDS.FindEntry(), with the content decoded as dictionary'''
+
+	__slots__ = ('uuid', 'owner', 'type', 'revision', 'content')
+
+	def __init__(self, uuid: str, owner: str, type: int, content: dict):
+		self.uuid = uuid
+		self.owner = owner
+		self.type = type
+		self.revision = 3
+		self.content = content
+
+
+class FakePyCmmds:
+	'''Stand-in for the pyCMMDS module of a live ESXi, answering queries from a SyntheticCluster.
+	Supports lookups of a single entry by type and UUID, and iterating over all entries of a type with the wildcard anyUUID and CMMDS_FIND_FLAG_NEXT.'''
+
+	CMMDS_FIND_FLAG_NONE = 0
+	CMMDS_FIND_FLAG_NEXT = 1
+
+	CMMDSQuery = FakeCmmdsQuery
+
+	def __init__(self, cluster: SyntheticCluster, latency: float = 0.0):
+		'''Arguments:
+			cluster: SyntheticCluster to answer the queries from
+			latency: number of seconds each call to FindEntry takes'''
+
+		self.cluster = cluster
+		self.latency = latency
+		self.findCalls = 0
+
+		for typeId, cmmdsType in enumerate(cmmdsTypes):
+			setattr(self, 'CMMDS_TYPE_' + cmmdsType, typeId)
+
+		# Per type: list of the entries in order and the position of each UUID in it
+		self.entries = [list() for cmmdsType in cmmdsTypes]
+		self.positions = [dict() for cmmdsType in cmmdsTypes]
+
+		for entry in cluster.iter_entries():
+			typeId = cmmdsTypes.index(entry['type'])
+			self.positions[typeId][entry['uuid']] = len(self.entries[typeId])
+			self.entries[typeId].append(FakeCmmdsEntry(uuid=entry['uuid'], owner=entry['owner'], type=typeId, content=json.loads(entry['content'])))
+
+	def FindEntry(self, query: FakeCmmdsQuery, flags: int, latestRevision: bool = True):
+		'''Return the entry matching the query, or None if there's none
+		Arguments:
+			query: FakeCmmdsQuery with at least the type set
+			flags: CMMDS_FIND_FLAG_NONE for the first matching entry, CMMDS_FIND_FLAG_NEXT for the one following the entry with the UUID of the query
+			latestRevision: ignored, there's only one revision of each entry'''
+
+		self.findCalls += 1
+		if self.latency:
+			time.sleep(self.latency)
+
+		entries = self.entries[query.type]
+		positions = self.positions[query.type]
+
+		if flags == self.CMMDS_FIND_FLAG_NEXT:
+			position = positions.get(query.uuid)
+			if position is None or position + 1 >= len(entries):
+				return None
+			return entries[position + 1]
+
+		if query.wildcards.get('anyUUID'):
+			return entries[0] if entries else None
+
+		position = positions.get(query.uuid)
+		return entries[position] if position is not None else None
+
+
+class FakeVsiError(Exception):
+	'''Raised by FakeVsi for nodes that don't exist, like vsi does on a live ESXi'''
+
+
+class FakeVsi:
+	'''Stand-in for the vmware.vsi module of a live ESXi, serving the DOM owner nodes of the objects of a SyntheticCluster owned by one of its hosts.
+	The stats counters of each object grow at a constant, randomly chosen rate from the moment the FakeVsi is created.'''
+
+	def __init__(self, cluster: SyntheticCluster, latency: float = 0.0, hostIdx: int = 0):
+		'''Arguments:
+			cluster: SyntheticCluster to serve
+			latency: number of seconds each call to list and get takes
+			hostIdx: index of the host the script runs on, only the objects it's the DOM owner of are listed'''
+
+		self.latency = latency
+		self.calls = 0
+		self.timeStart = time.time()
+
+		hostUuid = cluster.hostUuids[hostIdx % len(cluster.hostUuids)]
+		rng = random.Random(cluster.seed + 2)
+
+		# Per object owned by the host: rates of the stats counters per second
+		self.rates = dict()
+		for entry in cluster.iter_entries():
+			if entry['type'] != 'DOM_OBJECT' or entry['owner'] != hostUuid:
+				continue
+			readOps, writeOps, unmapOps = rng.expovariate(1 / 50), rng.expovariate(1 / 50), rng.expovariate(1 / 5)
+			self.rates[entry['uuid']] = {'readCount': readOps, 'writeCount': writeOps, 'unmapCount': unmapOps,
+					'readBytes': readOps * 32768, 'writeBytes': writeOps * 32768, 'unmapBytes': unmapOps * 1048576,
+					'latencyRead': readOps * rng.uniform(200, 2000), 'latencyWrite': writeOps * rng.uniform(500, 5000)}
+
+	def list(self, path: str) -> list:
+		self.calls += 1
+		if self.latency:
+			time.sleep(self.latency)
+
+		if path.rstrip('/') + '/' != domOwnersPath:
+			raise FakeVsiError('Not found: {}'.format(path))
+		return list(self.rates.keys())
+
+	def get(self, path: str) -> dict:
+		self.calls += 1
+		if self.latency:
+			time.sleep(self.latency)
+
+		nodes = path[len(domOwnersPath):].strip('/').split('/')
+		if not path.startswith(domOwnersPath) or len(nodes) != 2 or nodes[1] != 'stats' or nodes[0] not in self.rates:
+			raise FakeVsiError('Not found: {}'.format(path))
+
+		elapsed = time.time() - self.timeStart + 3600
+		return dict((key, int(rate * elapsed)) for key, rate in self.rates[nodes[0]].items())
+
+
+#
+## Functions
+#
+def install_fake_pycmmds(cluster: SyntheticCluster, latency: float = 0.0) -> FakePyCmmds:
+	'''Make "import pyCMMDS" return a FakePyCmmds for the cluster, so the scripts can be run against it on any Linux box'''
+
+	fakePyCmmds = sys.modules['pyCMMDS'] = FakePyCmmds(cluster=cluster, latency=latency)
+	return fakePyCmmds
+
+
+def install_fake_vsi(cluster: SyntheticCluster, latency: float = 0.0) -> FakeVsi:
+	'''Make "import vmware.vsi" return a FakeVsi for the cluster'''
+
+	fakeVsi = FakeVsi(cluster=cluster, latency=latency)
+	vmwareModule = sys.modules.get('vmware') or types.ModuleType('vmware')
+	vmwareModule.vsi = fakeVsi
+	sys.modules['vmware'] = vmwareModule
+	sys.modules['vmware.vsi'] = fakeVsi
+	return fakeVsi
+
+
+def parse_simulation_spec(spec: str) -> dict:
+	'''Parse a simulation spec like "objects=20000,vms=5000,hosts=8,latency=0.001"
+	Keys: objects, vms, hosts, disksPerHost, componentsPerObject, notActiveRatio, seed (SyntheticCluster) and latency (seconds per call)
+	Return:
+		dictionary with the values, converted to int or float
+	Raise:
+		ValueError for unknown keys or invalid values'''
+
+	intKeys = ('objects', 'vms', 'hosts', 'disksPerHost', 'componentsPerObject', 'seed')
+	floatKeys = ('notActiveRatio', 'latency')
+
+	values = dict()
+	for item in spec.split(','):
+		if not item.strip():
+			continue
+		key, sep, value = item.partition('=')
+		key = key.strip()
+		if key in intKeys:
+			values[key] = int(value)
+		elif key in floatKeys:
+			values[key] = float(value)
+		else:
+			raise ValueError('unknown key in simulation spec: {}'.format(key))
+
+	return values
+
+
+def install_from_environment() -> bool:
+	'''Install FakeVsi and FakePyCmmds for a synthetic cluster as described by the environment variable VSAN_SIMULATION, if it's set.
+	Used by the host-side scripts, so they can be run and benchmarked on any Linux box, e.g.
+		VSAN_SIMULATION="objects=20000,vms=5000,hosts=8,latency=0.001" ./get-unmap-stats.py
+	Return:
+		True if the simulation was installed, False if the environment variable isn't set'''
+
+	spec = os.environ.get(simulationEnvVar)
+	if not spec:
+		return False
+
+	values = parse_simulation_spec(spec)
+	latency = values.pop('latency', 0.0)
+	cluster = SyntheticCluster(**values)
+
+	install_fake_vsi(cluster=cluster, latency=latency)
+	install_fake_pycmmds(cluster=cluster, latency=latency)
+	return True
+
+
+def generate_uuid(rng) -> str:
+	'''Generate a vSAN style UUID from a random number generator'''
+
+	return '{:08x}-{:04x}-{:04x}-{:04x}-{:012x}'.format(rng.getrandbits(32), rng.getrandbits(16), rng.getrandbits(16), rng.getrandbits(16), rng.getrandbits(48))
@@ -4,14 +4,236 @@
 #
 # Written by Manuel Moser (moserm)
 
-import sys, os
-import mimetypes
+import sys, os, re, json
+import datetime, functools, gzip, hashlib, mimetypes, mmap, multiprocessing, struct, subprocess, tempfile, time
+from array import array
+from collections import Counter
 from glob import glob
 
 
+#
+## General variables
+#
+traceChunkSize = 4 * 1024 * 1024		# Size hint in bytes for the chunks of lines read in at once from a vSAN trace file
+traceRangeSize = 256 * 1024 * 1024		# Plain text trace files larger than this are split into byte ranges of this size for parallel scanning
+
+rmwAnalyzerVersion = 1				# Increase whenever the results of scan_rmw_io() change, this invalidates all cache files
+rmwCacheMagic = b'VSANRMWC'
+rmwCacheDirName = '.vsan-unaligned-io-cache'
+
+vsanTraceReaderPaths = ['vsanTraceReader', '../../../usr/lib/vmware/vsan/bin/vsanTraceReader']	# Where to look for vsanTraceReader, relative to the vSAN trace directory
+
+usPerDay = 86400 * 1000000
+epochOrdinal = datetime.date(1970, 1, 1).toordinal()
+dateCacheSize = 64
+dateCache = dict()				# Structure: dateCache['YYYY-MM-DD'] = <microseconds since the epoch at midnight UTC>
+dateStrCache = dict()				# Structure: dateStrCache[<days since the epoch>] = 'YYYY-MM-DD'
+
+UUID = '[0-9a-z]{8}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{4}-[0-9a-z]{12}'
+rmwMarker = 'writeWithBlkAttr5'		# Literal every trace message of interest for RMW IO contains, used to prefilter lines before running any regex
+regexRmw = re.compile(r'\[(?P<opId>[0-9a-z]+) p:[A-Z]+ p:writeWithBlkAttr5 c:[A-Z]+ c:readModifyWrite.+length-[0-9]{2}.: (?P<length>[0-9]+)\}')
+regexRmwStartEnd = re.compile(r'(?P<ts>[0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{6}).+?\[(?P<opId>[0-9a-z]+) [^\]]*writeWithBlkAttr5.+DOMTraceOperationSendRequestToServer(?P<completed>Completed)?:.+objUuid.: .(?P<object>' + UUID + ')')
+
+
+#
+## Classes
+#
+class RmwOp:
+	'''State of a single writeWithBlkAttr5 operation while scanning the vSAN traces
+	length: length of the RMW (readModifyWrite) IO, None as long as no RMW was found for the operation
+	start: timestamp of DOMTraceOperationSendRequestToServer in microseconds since the epoch
+	end: timestamp of DOMTraceOperationSendRequestToServerCompleted in microseconds since the epoch
+	obj: vSAN object UUID
+	rmw: trace message of the RMW IO, only kept if asked for'''
+
+	__slots__ = ('length', 'start', 'end', 'obj', 'rmw')
+
+	def __init__(self):
+		self.length = None
+		self.start = None
+		self.end = None
+		self.obj = None
+		self.rmw = None
+
+	def __getstate__(self):
+		return (self.length, self.start, self.end, self.obj, self.rmw)
+
+	def __setstate__(self, state):
+		self.length, self.start, self.end, self.obj, self.rmw = state
+
+	def is_complete(self) -> bool:
+		'''Whether the operation is a RMW IO for which both the start and the completion were found'''
+
+		return self.length is not None and self.start is not None and self.end is not None
+
+	def merge(self, other):
+		'''Merge the state found for the same operation in a later part of the vSAN traces into this one.
+		Like for a single scan over all the traces, values from the later part take precedence.
+		Arguments:
+			other: RmwOp from the later part of the vSAN traces'''
+
+		if other.length is not None:
+			self.length = other.length
+			self.rmw = other.rmw
+
+		if other.start is not None:
+			self.start = other.start
+
+		if other.end is not None:
+			self.end = other.end
+
+		if other.obj is not None:
+			self.obj = other.obj
+
+		return True
+
+
+class RmwIoStore:
+	'''Compact column-oriented store for the RMW IO found in the vSAN traces.
+	Each IO is a row, i.e. an index into the columns. Object UUIDs are interned into an integer table, so every UUID is only stored once.
+	opIds: list with the opIDs
+	lengths: array with the IO lengths
+	objIdxs: array with the index of the object UUID in objUuids
+	starts|ends: arrays with the start and end timestamps in microseconds since the epoch
+	rawMessages: list with the RMW trace messages, only populated if keepRaw is set'''
+
+	def __init__(self, keepRaw: bool = False):
+		self.opIds = list()
+		self.lengths = array('q')
+		self.objIdxs = array('l')
+		self.starts = array('q')
+		self.ends = array('q')
+		self.objUuids = list()
+		self.objUuidIdxs = dict()
+		self.keepRaw = keepRaw
+		self.rawMessages = list()
+
+	def __len__(self) -> int:
+		return len(self.opIds)
+
+	def intern_object(self, objUuid: str) -> int:
+		'''Return the index of an object UUID in the object table, adding it if it's not in there yet'''
+
+		objIdx = self.objUuidIdxs.get(objUuid)
+		if objIdx is None:
+			objIdx = self.objUuidIdxs[objUuid] = len(self.objUuids)
+			self.objUuids.append(objUuid)
+
+		return objIdx
+
+	def add(self, opId: str, length: int, objUuid: str, start: int, end: int, rmw: str = None) -> int:
+		'''Add an IO to the store and return its row'''
+
+		self.opIds.append(opId)
+		self.lengths.append(length)
+		self.objIdxs.append(self.intern_object(objUuid))
+		self.starts.append(start)
+		self.ends.append(end)
+		if self.keepRaw:
+			self.rawMessages.append(rmw)
+
+		return len(self.opIds) - 1
+
+	def add_rmw_ops(self, rmwOps: dict) -> int:
+		'''Add all operations from a scan that are complete RMW IO, i.e. for which the RMW message, start and completion were found
+		Arguments:
+			rmwOps['<opID>'] = RmwOp -> dictionary as returned by scan_rmw_io()
+		Return:
+			number of IO added'''
+
+		added = 0
+		for opId, rmwOp in rmwOps.items():
+			if rmwOp.is_complete():
+				self.add(opId, rmwOp.length, rmwOp.obj, rmwOp.start, rmwOp.end, rmwOp.rmw)
+				added += 1
+
+		return added
+
+	def obj(self, row: int) -> str:
+		return self.objUuids[self.objIdxs[row]]
+
+	def latency(self, row: int) -> int:
+		return self.ends[row] - self.starts[row]
+
+	def is_unaligned(self, row: int) -> bool:
+		'''Whether the IO in a row is not 4K aligned'''
+
+		return self.lengths[row] % 4096 != 0
+
+	def rows(self, unalignedOnly: bool = False) -> list:
+		'''Return the rows of all IO, or only of the unaligned IO'''
+
+		if unalignedOnly:
+			lengths = self.lengths
+			return [row for row in range(len(lengths)) if lengths[row] % 4096 != 0]
+
+		return list(range(len(self.opIds)))
+
+	def sorted_rows(self, rows: list, sortBy: str = 'start', reverse: bool = False) -> list:
+		'''Sort rows by start timestamp (sortBy="start") or latency (sortBy="lat")'''
+
+		if sortBy == 'lat':
+			starts = self.starts
+			ends = self.ends
+			return sorted(rows, key=lambda row: ends[row] - starts[row], reverse=reverse)
+
+		return sorted(rows, key=self.starts.__getitem__, reverse=reverse)
+
+	def top_objects(self, rows: list, top: int) -> list:
+		'''Return the objects with the most IO within the given rows
+		Return:
+			list with (object UUID, number of IO) tuples, highest number of IO first'''
+
+		objIdxs = self.objIdxs
+		objCounts = Counter(objIdxs[row] for row in rows)
+		return [(self.objUuids[objIdx], amount) for objIdx, amount in objCounts.most_common(top)]
+
+
 #
 ## Functions
 #
+def parse_trace_timestamp(timestamp: str) -> int:
+	'''Convert a vSAN trace timestamp in the fixed format YYYY-MM-DDTHH:MM:SS.ffffff (UTC) into microseconds since the epoch.
+	The date portion only changes rarely within the traces, so it's cached.
+	Arguments:
+		timestamp: timestamp string, only the first 26 characters are looked at
+	Return:
+		integer with the microseconds since the epoch'''
+
+	dateUs = dateCache.get(timestamp[0:10])
+	if dateUs is None:
+		if len(dateCache) >= dateCacheSize:
+			dateCache.clear()
+		dateUs = (datetime.date(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10])).toordinal() - epochOrdinal) * usPerDay
+		dateCache[timestamp[0:10]] = dateUs
+
+	return dateUs + ((int(timestamp[11:13]) * 60 + int(timestamp[14:16])) * 60 + int(timestamp[17:19])) * 1000000 + int(timestamp[20:26])
+
+
+def format_trace_timestamp(timestampUs: int, separator: str = 'T') -> str:
+	'''Convert microseconds since the epoch back into the vSAN trace timestamp format YYYY-MM-DDTHH:MM:SS.ffffff (UTC)
+	Arguments:
+		timestampUs: microseconds since the epoch
+		separator: character between the date and time portion
+	Return:
+		timestamp string'''
+
+	days, us = divmod(timestampUs, usPerDay)
+
+	dateStr = dateStrCache.get(days)
+	if dateStr is None:
+		if len(dateStrCache) >= dateCacheSize:
+			dateStrCache.clear()
+		dateStr = datetime.date.fromordinal(days + epochOrdinal).isoformat()
+		dateStrCache[days] = dateStr
+
+	seconds, us = divmod(us, 1000000)
+	minutes, seconds = divmod(seconds, 60)
+	hours, minutes = divmod(minutes, 60)
+
+	return '%s%s%02d:%02d:%02d.%06d' % (dateStr, separator, hours, minutes, seconds, us)
+
+
 def process_trace_file_arg(vsanTraceArg, traceFilePrefix: str) -> dict:
 	'''Return dictionary with vSAN trace files.
 	Arguments:
@@ -26,7 +248,7 @@ def process_trace_file_arg(vsanTraceArg, traceFilePrefix: str) -> dict:
 		vsanTraceFiles[vsanTraceArg] = list()
 	else:
 		traceFileFormat = '{prefix}*.{ending}'
-		traceFileEndings = ['txt', 'log']
+		traceFileEndings = ['txt', 'log', 'txt.gz', 'log.gz']
 
 		print('Directory specified, looking for vSAN trace files in the format of:')
 		for ending in traceFileEndings:
@@ -68,8 +290,467 @@ def process_trace_dir(vsanTraceDir: str, vsanTraceFiles: dict, traceFilePrefix:
 	return vsanTraceFiles
 
 
+def check_vsan_trace_file(vsanTraceFile: str) -> bool:
+	'''Checks whether a vSAN trace file has been decoded into text format, either plain or gzip-compressed
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+	Return:
+		True if the file is a (gzip-compressed) text file, False otherwise'''
+
+	mime = mimetypes.guess_type(vsanTraceFile)
+	if mime[0] == 'text/plain':
+		return True
+
+	# mimetypes doesn't know about .log files
+	if vsanTraceFile.endswith('.log') or vsanTraceFile.endswith('.log.gz'):
+		return True
+
+	return False
+
+
+def is_gzip_file(vsanTraceFile: str) -> bool:
+	'''Checks the magic number of a file to see whether it's gzip-compressed'''
+
+	with open(vsanTraceFile, 'rb') as f:
+		magic = f.read(2)
+
+	return magic == b'\x1f\x8b'
+
+
+def open_vsan_trace_file(vsanTraceFile: str):
+	'''Open a decoded vSAN trace file for reading, transparently decompressing it if it's gzip-compressed
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+	Return:
+		file object in text mode'''
+
+	if is_gzip_file(vsanTraceFile):
+		return gzip.open(vsanTraceFile, 'rt', errors='replace')
+
+	return open(vsanTraceFile, 'r', errors='replace')
+
+
+def iter_vsan_trace_chunks(vsanTraceFile: str, chunkSize: int = traceChunkSize):
+	'''Generator that reads a vSAN trace file in chunks of complete lines, so only one chunk is held in memory at a time
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+		chunkSize: size hint in bytes for each chunk
+	Yield:
+		list with the lines of the next chunk'''
+
+	if not check_vsan_trace_file(vsanTraceFile):
+		sys.exit('Provided vSAN trace file is not in text format: %s' % (vsanTraceFile))
+
+	with open_vsan_trace_file(vsanTraceFile) as f:
+		while True:
+			chunk = f.readlines(chunkSize)
+			if not chunk:
+				break
+			yield chunk
+
+
+def iter_vsan_trace_lines(vsanTraceFile: str):
+	'''Generator that yields the lines of a single vSAN trace file
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+	Yield:
+		next line of the vSAN trace file'''
+
+	for chunk in iter_vsan_trace_chunks(vsanTraceFile):
+		yield from chunk
+
+
+def iter_vsan_trace_files(vsanTraceFiles: dict):
+	'''Generator that goes through the vSAN trace files one by one without reading them in completely
+	Arguments:
+		vsanTraceFiles['<filename>'] = list() -> dictionary with the vSAN trace files as keys
+	Yield:
+		tuple with the file name and a generator for the lines of that file'''
+
+	for vsanTraceFile in vsanTraceFiles.keys():
+		yield (vsanTraceFile, iter_vsan_trace_lines(vsanTraceFile))
+
+
+def split_vsan_trace_files(vsanTraceFiles: dict, rangeSize: int = traceRangeSize) -> list:
+	'''Split the vSAN trace files into byte ranges that can be scanned independently. Gzip-compressed files can't be split and always make up a single range.
+	Arguments:
+		vsanTraceFiles['<filename>'] = list() -> dictionary with the vSAN trace files as keys
+		rangeSize: maximum size of a byte range in bytes
+	Return:
+		list with (filename, start offset, end offset) tuples in the order of the vSAN trace files; an end offset of None means until the end of the file'''
+
+	traceRanges = list()
+
+	for vsanTraceFile in vsanTraceFiles.keys():
+		if not check_vsan_trace_file(vsanTraceFile):
+			sys.exit('Provided vSAN trace file is not in text format: %s' % (vsanTraceFile))
+
+		fileSize = os.path.getsize(vsanTraceFile)
+		if fileSize <= rangeSize or is_gzip_file(vsanTraceFile):
+			traceRanges.append((vsanTraceFile, 0, None))
+			continue
+
+		for rangeStart in range(0, fileSize, rangeSize):
+			traceRanges.append((vsanTraceFile, rangeStart, min(rangeStart + rangeSize, fileSize)))
+
+	return traceRanges
+
+
+def iter_vsan_trace_range(vsanTraceFile: str, rangeStart: int, rangeEnd: int, chunkSize: int = traceChunkSize):
+	'''Generator that yields the lines starting within a byte range of a plain text vSAN trace file.
+	A line crossing the end of the range belongs to this range, a line crossing the start of the range belongs to the previous one.
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+		rangeStart: start offset of the byte range
+		rangeEnd: end offset of the byte range, None for the whole file
+		chunkSize: size hint in bytes for the chunks of lines read at once
+	Yield:
+		next line of the byte range'''
+
+	if rangeEnd is None:
+		yield from iter_vsan_trace_lines(vsanTraceFile)
+		return
+
+	with open(vsanTraceFile, 'rb') as f:
+		position = rangeStart
+		if rangeStart > 0:
+			# Skip the line that started in the previous range. If the previous byte is a newline, this only reads the newline
+			f.seek(rangeStart - 1)
+			position = rangeStart - 1 + len(f.readline())
+
+		while position < rangeEnd:
+			chunk = f.readlines(chunkSize)
+			if not chunk:
+				break
+
+			for line in chunk:
+				if position >= rangeEnd:
+					break
+				position += len(line)
+				yield line.decode('utf-8', errors='replace')
+
+
+def iter_vsan_trace_marker_lines(vsanTraceFile: str, marker: str = rmwMarker, rangeStart: int = 0, rangeEnd: int = None, chunkSize: int = traceChunkSize):
+	'''Generator that yields only the lines of a vSAN trace file that contain a literal marker.
+	The marker is searched for in the raw bytes and only matching lines are decoded, which saves decoding every single line.
+	Plain text files are memory-mapped, gzip-compressed files are decompressed and searched in chunks.
+	Like for iter_vsan_trace_range(), only the lines starting within the byte range are looked at.
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+		marker: literal string a line has to contain
+		rangeStart: start offset of the byte range
+		rangeEnd: end offset of the byte range, None for the whole file
+		chunkSize: size in bytes of the chunks searched at once for gzip-compressed files
+	Yield:
+		next line containing the marker'''
+
+	markerBytes = marker.encode('utf-8')
+
+	if is_gzip_file(vsanTraceFile):
+		with gzip.open(vsanTraceFile, 'rb') as f:
+			remainder = b''
+			while True:
+				chunk = f.read(chunkSize)
+				if not chunk:
+					if remainder and markerBytes in remainder:
+						yield remainder.decode('utf-8', errors='replace')
+					break
+
+				# Only search up to the last complete line, the rest is prepended to the next chunk
+				chunk = remainder + chunk
+				lastNewline = chunk.rfind(b'\n') + 1
+				remainder = chunk[lastNewline:]
+
+				position = chunk.find(markerBytes, 0, lastNewline)
+				while position != -1:
+					lineStart = chunk.rfind(b'\n', 0, position) + 1
+					lineEnd = chunk.find(b'\n', position) + 1
+					yield chunk[lineStart:lineEnd].decode('utf-8', errors='replace')
+					position = chunk.find(markerBytes, lineEnd, lastNewline)
+		return
+
+	if os.path.getsize(vsanTraceFile) == 0:
+		return
+
+	with open(vsanTraceFile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+		if rangeEnd is None:
+			rangeEnd = len(mm)
+
+		position = mm.find(markerBytes, rangeStart)
+		while position != -1:
+			lineStart = mm.rfind(b'\n', 0, position) + 1
+			if lineStart >= rangeEnd:
+				break
+
+			lineEnd = mm.find(b'\n', position) + 1
+			if lineEnd == 0:
+				lineEnd = len(mm)
+
+			# A line crossing the start of the range belongs to the previous range
+			if lineStart >= rangeStart:
+				yield mm[lineStart:lineEnd].decode('utf-8', errors='replace')
+
+			position = mm.find(markerBytes, lineEnd)
+
+
+def scan_rmw_io_range(traceRange: tuple, keepRaw: bool = False, scanBytes: bool = True) -> dict:
+	'''Worker function: scan a byte range of a vSAN trace file for RMW IO
+	Arguments:
+		traceRange: (filename, start offset, end offset) tuple as returned by split_vsan_trace_files()
+		keepRaw: whether to keep the RMW trace messages
+		scanBytes: search for the writeWithBlkAttr5 marker in the raw bytes and only decode matching lines, instead of decoding every line
+	Return:
+		rmwOps['<opID>'] = RmwOp -> dictionary with the writeWithBlkAttr5 operations found in the byte range'''
+
+	vsanTraceFile, rangeStart, rangeEnd = traceRange
+
+	if scanBytes:
+		vsanTraceMessages = iter_vsan_trace_marker_lines(vsanTraceFile, marker=rmwMarker, rangeStart=rangeStart, rangeEnd=rangeEnd)
+	else:
+		vsanTraceMessages = iter_vsan_trace_range(vsanTraceFile, rangeStart, rangeEnd)
+
+	return scan_rmw_io(vsanTraceMessages=vsanTraceMessages, keepRaw=keepRaw)
+
+
+def merge_rmw_ops(rmwOps: dict, partialRmwOps: dict) -> dict:
+	'''Merge the operations found in a later part of the vSAN traces into the ones found so far.
+	This stitches together operations whose RMW message, start and completion are in different files or byte ranges.
+	Arguments:
+		rmwOps: dictionary with the operations found so far
+		partialRmwOps: dictionary with the operations found in the later part
+	Return:
+		rmwOps['<opID>'] = RmwOp -> merged dictionary'''
+
+	for opId, partialRmwOp in partialRmwOps.items():
+		rmwOp = rmwOps.get(opId)
+		if rmwOp is None:
+			rmwOps[opId] = partialRmwOp
+		else:
+			rmwOp.merge(partialRmwOp)
+
+	return rmwOps
+
+
+def get_rmw_cache_file(vsanTraceFile: str, cacheDir: str = None) -> str:
+	'''Return the path of the cache file for a vSAN trace file
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+		cacheDir: directory for the cache files, by default a hidden directory next to the vSAN trace file'''
+
+	vsanTraceFile = os.path.abspath(vsanTraceFile)
+	if not cacheDir:
+		cacheDir = os.path.join(os.path.dirname(vsanTraceFile), rmwCacheDirName)
+
+	return os.path.join(cacheDir, hashlib.sha1(vsanTraceFile.encode('utf-8')).hexdigest() + '.rmwcache')
+
+
+def get_rmw_cache_key(vsanTraceFile: str) -> dict:
+	'''Return the identity of a vSAN trace file a cache file has to match: path, size, mtime and analyzer version'''
+
+	fileStat = os.stat(vsanTraceFile)
+	return {'path': os.path.abspath(vsanTraceFile), 'size': fileStat.st_size, 'mtime': fileStat.st_mtime_ns, 'version': rmwAnalyzerVersion, 'byteorder': sys.byteorder}
+
+
+def save_rmw_cache(vsanTraceFile: str, rmwOps: dict, cacheDir: str = None) -> bool:
+	'''Write the operations found in a vSAN trace file into its cache file.
+	The cache file consists of a magic string, the length of a JSON header and the header itself, followed by the columns:
+	opIDs and object UUIDs as newline separated strings, lengths/object indexes/start/end as arrays of 64 bit integers (-1 if not found)
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+		rmwOps['<opID>'] = RmwOp -> dictionary with the operations found in the vSAN trace file
+		cacheDir: directory for the cache files
+	Return:
+		True if the cache file was written, False otherwise'''
+
+	cacheFile = get_rmw_cache_file(vsanTraceFile=vsanTraceFile, cacheDir=cacheDir)
+
+	objUuids = list()
+	objUuidIdxs = dict()
+	lengths = array('q')
+	objIdxs = array('q')
+	starts = array('q')
+	ends = array('q')
+
+	for rmwOp in rmwOps.values():
+		lengths.append(-1 if rmwOp.length is None else rmwOp.length)
+		starts.append(-1 if rmwOp.start is None else rmwOp.start)
+		ends.append(-1 if rmwOp.end is None else rmwOp.end)
+
+		if rmwOp.obj is None:
+			objIdxs.append(-1)
+			continue
+
+		objIdx = objUuidIdxs.get(rmwOp.obj)
+		if objIdx is None:
+			objIdx = objUuidIdxs[rmwOp.obj] = len(objUuids)
+			objUuids.append(rmwOp.obj)
+		objIdxs.append(objIdx)
+
+	columns = ['\n'.join(rmwOps.keys()).encode('utf-8'), '\n'.join(objUuids).encode('utf-8'), lengths.tobytes(), objIdxs.tobytes(), starts.tobytes(), ends.tobytes()]
+
+	header = get_rmw_cache_key(vsanTraceFile)
+	header['count'] = len(rmwOps)
+	header['columns'] = [len(column) for column in columns]
+	header = json.dumps(header).encode('utf-8')
+
+	try:
+		os.makedirs(os.path.dirname(cacheFile), exist_ok=True)
+		with open(cacheFile + '.tmp', 'wb') as f:
+			f.write(rmwCacheMagic + struct.pack('<I', len(header)) + header)
+			for column in columns:
+				f.write(column)
+		os.replace(cacheFile + '.tmp', cacheFile)
+	except OSError:
+		return False
+
+	return True
+
+
+def load_rmw_cache(vsanTraceFile: str, cacheDir: str = None) -> dict:
+	'''Read the operations found in a vSAN trace file from its cache file
+	Arguments:
+		vsanTraceFile: path to the vSAN trace file
+		cacheDir: directory for the cache files
+	Return:
+		rmwOps['<opID>'] = RmwOp -> dictionary with the operations found in the vSAN trace file, or None if there's no valid cache file for the current version of the vSAN trace file'''
+
+	cacheFile = get_rmw_cache_file(vsanTraceFile=vsanTraceFile, cacheDir=cacheDir)
+
+	try:
+		with open(cacheFile, 'rb') as f:
+			if f.read(len(rmwCacheMagic)) != rmwCacheMagic:
+				return None
+			headerLen = struct.unpack('<I', f.read(4))[0]
+			header = json.loads(f.read(headerLen).decode('utf-8'))
+
+			cacheKey = get_rmw_cache_key(vsanTraceFile)
+			if any(header.get(key) != value for key, value in cacheKey.items()):
+				return None
+
+			columns = [f.read(columnLen) for columnLen in header['columns']]
+	except (OSError, ValueError, struct.error):
+		return None
+
+	if header['count'] == 0:
+		return dict()
+
+	opIds = columns[0].decode('utf-8').split('\n')
+	objUuids = columns[1].decode('utf-8').split('\n')
+	lengths, objIdxs, starts, ends = array('q'), array('q'), array('q'), array('q')
+	lengths.frombytes(columns[2])
+	objIdxs.frombytes(columns[3])
+	starts.frombytes(columns[4])
+	ends.frombytes(columns[5])
+
+	if not len(opIds) == len(lengths) == len(objIdxs) == len(starts) == len(ends) == header['count']:
+		return None
+
+	rmwOps = dict()
+	for i in range(header['count']):
+		rmwOp = rmwOps[opIds[i]] = RmwOp()
+		if lengths[i] != -1:
+			rmwOp.length = lengths[i]
+		if starts[i] != -1:
+			rmwOp.start = starts[i]
+		if ends[i] != -1:
+			rmwOp.end = ends[i]
+		if objIdxs[i] != -1:
+			rmwOp.obj = objUuids[objIdxs[i]]
+
+	return rmwOps
+
+
+def clear_rmw_cache(vsanTraceFiles: dict, cacheDir: str = None) -> int:
+	'''Remove the cache files of the vSAN trace files
+	Arguments:
+		vsanTraceFiles['<filename>'] = list() -> dictionary with the vSAN trace files as keys
+		cacheDir: directory for the cache files
+	Return:
+		number of cache files removed'''
+
+	removed = 0
+	for vsanTraceFile in vsanTraceFiles.keys():
+		try:
+			os.remove(get_rmw_cache_file(vsanTraceFile=vsanTraceFile, cacheDir=cacheDir))
+			removed += 1
+		except FileNotFoundError:
+			pass
+
+	return removed
+
+
+def scan_rmw_io_files(vsanTraceFiles: dict, jobs: int = 1, rangeSize: int = traceRangeSize, keepRaw: bool = False, useCache: bool = False, cacheDir: str = None, scanBytes: bool = True) -> dict:
+	'''Scan the vSAN trace files for RMW IO.
+	With more than one job a pool of worker processes is used, each scanning one file or byte range of a large file at a time.
+	The partial results are merged in the order of the trace files, so the result is the same as for a single scan over all the files.
+	With the cache enabled, files with a valid cache file aren't scanned at all and the results of the scanned files are written to the cache.
+	Arguments:
+		vsanTraceFiles['<filename>'] = list() -> dictionary with the vSAN trace files as keys
+		jobs: number of worker processes
+		rangeSize: maximum size of a byte range in bytes
+		keepRaw: whether to keep the RMW trace messages. The cache doesn't contain them, so it's not used in that case
+		useCache: whether to use the cache
+		cacheDir: directory for the cache files, by default a hidden directory next to each vSAN trace file
+		scanBytes: search for the writeWithBlkAttr5 marker in the raw bytes and only decode matching lines, instead of decoding every line
+	Return:
+		rmwOps['<opID>'] = RmwOp -> dictionary with all writeWithBlkAttr5 operations found'''
+
+	rmwOps = dict()
+	useCache = useCache and not keepRaw
+
+	cachedRmwOps = dict()
+	if useCache:
+		for vsanTraceFile in vsanTraceFiles.keys():
+			fileRmwOps = load_rmw_cache(vsanTraceFile=vsanTraceFile, cacheDir=cacheDir)
+			if fileRmwOps is not None:
+				cachedRmwOps[vsanTraceFile] = fileRmwOps
+
+	if cachedRmwOps:
+		print('Using cached results for {} of {} vSAN trace files'.format(len(cachedRmwOps), len(vsanTraceFiles)))
+
+	filesToScan = dict((vsanTraceFile, list()) for vsanTraceFile in vsanTraceFiles.keys() if vsanTraceFile not in cachedRmwOps)
+	if jobs > 1:
+		traceRanges = split_vsan_trace_files(vsanTraceFiles=filesToScan, rangeSize=rangeSize)
+	else:
+		traceRanges = split_vsan_trace_files(vsanTraceFiles=filesToScan, rangeSize=float('inf'))
+
+	pool = None
+	scanRange = functools.partial(scan_rmw_io_range, keepRaw=keepRaw, scanBytes=scanBytes)
+	if jobs > 1 and traceRanges:
+		pool = multiprocessing.Pool(processes=jobs)
+		rangeResults = pool.imap(scanRange, traceRanges)
+	else:
+		rangeResults = map(scanRange, traceRanges)
+
+	try:
+		rangeIdx = 0
+		cacheWriteFailed = False
+		for vsanTraceFile in vsanTraceFiles.keys():
+			if vsanTraceFile in cachedRmwOps:
+				merge_rmw_ops(rmwOps=rmwOps, partialRmwOps=cachedRmwOps.pop(vsanTraceFile))
+				continue
+
+			# The results for the byte ranges come in the order of the trace files
+			fileRmwOps = dict()
+			while rangeIdx < len(traceRanges) and traceRanges[rangeIdx][0] == vsanTraceFile:
+				merge_rmw_ops(rmwOps=fileRmwOps, partialRmwOps=next(rangeResults))
+				rangeIdx += 1
+
+			if useCache and not save_rmw_cache(vsanTraceFile=vsanTraceFile, rmwOps=fileRmwOps, cacheDir=cacheDir) and not cacheWriteFailed:
+				print('Unable to write cache file {}'.format(get_rmw_cache_file(vsanTraceFile=vsanTraceFile, cacheDir=cacheDir)))
+				cacheWriteFailed = True
+
+			merge_rmw_ops(rmwOps=rmwOps, partialRmwOps=fileRmwOps)
+	finally:
+		if pool:
+			pool.terminate()
+
+	return rmwOps
+
+
 def read_in_vsan_trace_files(vsanTraceFiles: dict) -> dict:
 	'''Reads in all vSAN trace files in dictionary "vsanTraceFiles"
+	Note: this keeps the content of all trace files in memory, use iter_vsan_trace_files() for large amounts of vSAN traces
 
 	Arguments:
 		vsanTraceFiles['<filename>'] = list() -> dictionary with the vSAN trace files as keys
@@ -78,11 +759,152 @@ def read_in_vsan_trace_files(vsanTraceFiles: dict) -> dict:
 		vsanTraceFiles['<filename>'] = list() -> dictionary with the vSAN trace files as keys. The list() contains the lines read in from the trace file.'''
 
 	for vsanTraceFile in vsanTraceFiles.keys():
-		mime = mimetypes.guess_type(vsanTraceFile)
-		if not mime[0] == 'text/plain':
+		if not check_vsan_trace_file(vsanTraceFile):
 			sys.exit('Provided vSAN trace file is not in text format: %s' % (vsanTraceFile))
 
-		with open(vsanTraceFile, 'r') as f:
+		with open_vsan_trace_file(vsanTraceFile) as f:
 			vsanTraceFiles[vsanTraceFile] = f.readlines()
 
 	return vsanTraceFiles
+
+
+def scan_rmw_io(vsanTraceMessages, rmwOps: dict = None, keepRaw: bool = False) -> dict:
+	'''Single pass over vSAN trace messages, recording RMW (readModifyWrite) IO created from writeWithBlkAttr5 as well as the start and completion of the writeWithBlkAttr5 operations.
+	Operations are tracked by opId, so the order of the RMW message and the start/completion messages doesn't matter.
+	Arguments:
+		vsanTraceMessages: iterable with vSAN trace messages
+		rmwOps: dictionary to add the operations to, e.g. from a previous call for another trace file
+		keepRaw: whether to keep the RMW trace messages
+	Return:
+		rmwOps['<opID>'] = RmwOp -> dictionary with all writeWithBlkAttr5 operations found, use RmwOp.is_complete() to get the RMW IO'''
+
+	if rmwOps is None:
+		rmwOps = dict()
+
+	for vsanTraceMessage in vsanTraceMessages:
+		if not rmwMarker in vsanTraceMessage:
+			continue
+
+		if 'readModifyWrite' in vsanTraceMessage:
+			resultRmw = regexRmw.search(vsanTraceMessage)
+			if resultRmw:
+				rmwOp = rmwOps.get(resultRmw.group('opId'))
+				if rmwOp is None:
+					rmwOp = rmwOps[resultRmw.group('opId')] = RmwOp()
+				rmwOp.length = int(resultRmw.group('length'))
+				if keepRaw:
+					rmwOp.rmw = vsanTraceMessage
+
+		if 'DOMTraceOperationSendRequestToServer' in vsanTraceMessage:
+			resultStartEnd = regexRmwStartEnd.search(vsanTraceMessage)
+			if resultStartEnd:
+				rmwOp = rmwOps.get(resultStartEnd.group('opId'))
+				if rmwOp is None:
+					rmwOp = rmwOps[resultStartEnd.group('opId')] = RmwOp()
+
+				if resultStartEnd.group('completed'):
+					rmwOp.end = parse_trace_timestamp(resultStartEnd.group('ts'))
+				else:
+					rmwOp.start = parse_trace_timestamp(resultStartEnd.group('ts'))
+
+				rmwOp.obj = resultStartEnd.group('object')
+
+	return rmwOps
+
+
+def find_vsan_trace_dirs(baseDir: str) -> list:
+	'''Find the directories with binary vSAN traces: the base directory itself and var/log/vsantraces of all extracted ESXi log bundles (esx-*) in it
+	Arguments:
+		baseDir: directory to look in
+	Return:
+		list with the vSAN trace directories'''
+
+	vsanTraceDirs = list()
+
+	if glob(os.path.join(baseDir, 'vsantraces*.gz')):
+		vsanTraceDirs.append(baseDir)
+
+	for bundle in sorted(glob(os.path.join(baseDir, 'esx-*'))):
+		vsanTraceDir = os.path.join(bundle, 'var', 'log', 'vsantraces')
+		if os.path.isdir(vsanTraceDir):
+			vsanTraceDirs.append(vsanTraceDir)
+
+	return vsanTraceDirs
+
+
+def find_vsan_trace_reader(vsanTraceDir: str) -> str:
+	'''Find vsanTraceReader for a vSAN trace directory, either in the directory itself or in the ESXi log bundle the directory is part of
+	Arguments:
+		vsanTraceDir: path to the vSAN trace directory
+	Return:
+		path to vsanTraceReader, None if not found'''
+
+	for vsanTraceReaderPath in vsanTraceReaderPaths:
+		# An absolute path, as a bare name like "vsanTraceReader" would be looked up on PATH by subprocess
+		vsanTraceReader = os.path.abspath(os.path.join(vsanTraceDir, vsanTraceReaderPath))
+		if os.path.isfile(vsanTraceReader):
+			if not os.access(vsanTraceReader, os.X_OK):
+				os.chmod(vsanTraceReader, 0o775)
+			return vsanTraceReader
+
+	return None
+
+
+def get_decoded_trace_file(vsanTraceArchive: str) -> str:
+	'''Return the path of the decoded text file for a binary vSAN trace file, i.e. everything up to the first "." plus ".txt"'''
+
+	vsanTraceDir, vsanTraceName = os.path.split(vsanTraceArchive)
+	return os.path.join(vsanTraceDir, vsanTraceName.split('.')[0] + '.txt')
+
+
+def is_decoded_trace_up_to_date(vsanTraceArchive: str, decodedTraceFile: str) -> bool:
+	'''Checks whether the decoded text file of a binary vSAN trace file exists and is newer than the binary vSAN trace file'''
+
+	try:
+		return os.path.getmtime(decodedTraceFile) >= os.path.getmtime(vsanTraceArchive)
+	except OSError:
+		return False
+
+
+def decode_vsan_trace_file(vsanTraceArchive: str, decodedTraceFile: str, vsanTraceReader: str) -> tuple:
+	'''Decode a binary vSAN trace file (vsantraces*.gz) with "gzip -d | vsanTraceReader".
+	The output is written to a temporary file first and only renamed once the decoding has completed, so there are never any truncated text files.
+	Arguments:
+		vsanTraceArchive: path to the binary vSAN trace file
+		decodedTraceFile: path to the decoded text file to write
+		vsanTraceReader: path to vsanTraceReader, or any other executable decoding stdin to stdout
+	Return:
+		tuple with the input size in bytes, the output size in bytes and the duration in seconds
+	Raise:
+		RuntimeError if gzip or vsanTraceReader fail'''
+
+	tmpTraceFile = decodedTraceFile + '.tmp'
+	timeStart = time.time()
+
+	try:
+		# The stderr of gzip goes to a temporary file, as a pipe only read once vsanTraceReader exits could fill up (e.g. with warnings about a damaged archive) and block gzip
+		with open(tmpTraceFile, 'wb') as fhOutput, tempfile.TemporaryFile() as fhGzipErr:
+			procGzip = subprocess.Popen(['gzip', '-d', '-c', vsanTraceArchive], stdout=subprocess.PIPE, stderr=fhGzipErr)
+			try:
+				procReader = subprocess.Popen([vsanTraceReader], stdin=procGzip.stdout, stdout=fhOutput, stderr=subprocess.PIPE)
+			except OSError:
+				procGzip.kill()
+				procGzip.communicate()
+				raise
+			procGzip.stdout.close()		# So gzip gets SIGPIPE if vsanTraceReader exits early
+			readerErr = procReader.communicate()[1]
+			procGzip.wait()
+			fhGzipErr.seek(0)
+			gzipErr = fhGzipErr.read()
+
+		if procReader.returncode != 0:
+			raise RuntimeError('{} failed with exit code {}: {}'.format(vsanTraceReader, procReader.returncode, readerErr.decode('utf-8', errors='replace').strip()))
+		if procGzip.returncode != 0:
+			raise RuntimeError('gzip failed with exit code {}: {}'.format(procGzip.returncode, gzipErr.decode('utf-8', errors='replace').strip()))
+
+		os.replace(tmpTraceFile, decodedTraceFile)
+	finally:
+		if os.path.exists(tmpTraceFile):
+			os.remove(tmpTraceFile)
+
+	return (os.path.getsize(vsanTraceArchive), os.path.getsize(decodedTraceFile), time.time() - timeStart)